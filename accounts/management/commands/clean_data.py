@@ -1,22 +1,121 @@
-from django.core.management.base import BaseCommand
-from accounts import models as accounts_models
-from waste_management import models as waste_models
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.purge import DEFAULT_CHUNK_SIZE, PurgeError, Purger, dependency_order
+from waste_management.aggregation import SOURCE_FIELDS, mark_months, rows_months
+from waste_management.cache import bump
+from waste_management.sync import SYNCED_MODELS, record_deletions
+
+# Applications purgées par défaut
+APP_LABELS = ['waste_management', 'accounts']
 
-# Correction: use getattr(module, attr), not getattr(list, attr)
-waste_list = [attr for attr in dir(waste_models) if isinstance(getattr(waste_models, attr), type)]
-accounts_list = [attr for attr in dir(accounts_models) if isinstance(getattr(accounts_models, attr), type)]
 
 class Command(BaseCommand):
-    help = "Supprime toutes les données du modèle MonModel"
-
-    def handle(self, *args, **kwargs):
-        for model_name in waste_list:
-            model = getattr(waste_models, model_name)
-            if hasattr(model, 'objects'):
-                count, _ = model.objects.all().delete()
-                self.stdout.write(self.style.SUCCESS(f"{count} objets supprimés de {model_name}."))
-        for model_name in accounts_list:
-            model = getattr(accounts_models, model_name)
-            if hasattr(model, 'objects'):
-                count, _ = model.objects.all().delete()
-        self.stdout.write(self.style.SUCCESS(f"{count} objets supprimés."))
+    help = "Supprime les données des applications par lots, sans charger les objets en mémoire"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            default=[],
+            help='Limiter la purge à un modèle (ex. Report ou waste_management.Report), répétable',
+        )
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            metavar='DAYS',
+            help="Ne supprimer que les lignes créées il y a plus de DAYS jours (modèles avec created_at)",
+        )
+        parser.add_argument(
+            '--filter',
+            action='append',
+            default=[],
+            metavar='MODEL.FIELD=VALUE',
+            help='Filtre supplémentaire par modèle (ex. Report.status=resolved), répétable',
+        )
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        model_list = self.get_models(options['model'])
+        filters = self.parse_filters(options['filter'], model_list)
+        cutoff = None
+        if options['older_than'] is not None:
+            cutoff = timezone.now() - timedelta(days=options['older_than'])
+
+        purger = Purger(
+            chunk_size=options['chunk_size'], progress=self.report_progress, on_change=self.record_change
+        )
+        total = 0
+        for model in dependency_order(model_list):
+            queryset = model._base_manager.filter(**filters.get(model, {}))
+            if cutoff is not None:
+                if not any(field.name == 'created_at' for field in model._meta.concrete_fields):
+                    continue
+                queryset = queryset.filter(created_at__lt=cutoff)
+            try:
+                count = purger.purge(queryset)
+            except PurgeError as exc:
+                raise CommandError(str(exc))
+            total += count
+            self.stdout.write(self.style.SUCCESS(f"{count} objets supprimés de {model.__name__}."))
+
+        cascaded = {
+            label: count for label, count in purger.deleted.items()
+            if apps.get_model(label) not in model_list
+        }
+        for label, count in cascaded.items():
+            self.stdout.write(f"{count} objets liés supprimés de {label}.")
+        # Sans signaux : invalidation des réponses et des validateurs (ETag) des modèles touchés
+        bump(*purger.changed)
+        self.stdout.write(self.style.SUCCESS(f"{sum(purger.deleted.values())} objets supprimés."))
+
+    def record_change(self, model, pks, deleted):
+        """
+        Ce que feraient les signaux de delete() et save() : traces de
+        suppression pour /api/sync/, mois de statistiques à recalculer
+        """
+        if deleted and model in {synced for _, synced, _ in SYNCED_MODELS}:
+            record_deletions(model, pks)
+        if model in SOURCE_FIELDS:
+            mark_months(rows_months(model, pks))
+
+    def get_models(self, names):
+        model_list = [
+            model for label in APP_LABELS
+            for model in apps.get_app_config(label).get_models()
+        ]
+        if not names:
+            return model_list
+
+        selected = []
+        for name in names:
+            matches = [
+                model for model in model_list
+                if name.lower() in (model.__name__.lower(), model._meta.label_lower)
+            ]
+            if not matches:
+                raise CommandError(f'Modèle inconnu : {name}')
+            selected.extend(match for match in matches if match not in selected)
+        return selected
+
+    def parse_filters(self, expressions, model_list):
+        filters = {}
+        for expression in expressions:
+            try:
+                target, value = expression.split('=', 1)
+                model_name, lookup = target.split('.', 1)
+            except ValueError:
+                raise CommandError(f'Filtre invalide : {expression} (attendu MODEL.FIELD=VALUE)')
+            matches = [model for model in model_list if model.__name__.lower() == model_name.lower()]
+            if not matches:
+                raise CommandError(f'Modèle inconnu dans le filtre : {model_name}')
+            filters.setdefault(matches[0], {})[lookup] = value
+        return filters
+
+    def report_progress(self, model, count, rate):
+        if self.verbosity > 1:
+            self.stdout.write(f"  {model.__name__}: {count} lignes ({rate:.0f} lignes/s)")
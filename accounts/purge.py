@@ -0,0 +1,156 @@
+"""
+Suppression en masse par lots, sans charger les objets liés en mémoire.
+
+Contrairement à QuerySet.delete(), qui collecte toutes les lignes dépendantes
+avant de supprimer, les lignes sont supprimées par lots de clés primaires.
+Les relations (CASCADE, SET_NULL, ...) sont appliquées lot par lot avec des
+requêtes ensemblistes.
+
+Aucun signal n'est émis : l'appelant reçoit chaque lot supprimé ou modifié
+via `on_change` (traces de suppression, invalidations, ...) et retrouve les
+modèles touchés dans `Purger.changed`.
+"""
+import time
+from collections import defaultdict
+
+from django.db import models, router, transaction
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.utils import timezone
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class PurgeError(Exception):
+    """
+    Suppression impossible (relation protégée ou règle non supportée)
+    """
+
+
+def dependency_order(model_list):
+    """
+    Trier les modèles pour supprimer les dépendants avant les modèles référencés.
+    Seules les relations CASCADE/PROTECT/RESTRICT imposent un ordre : les
+    relations SET_NULL sont mises à NULL au moment de la suppression, ce qui
+    rompt les cycles (par exemple Team.leader <-> User.team).
+    """
+    model_list = list(model_list)
+    targets = set(model_list)
+    blockers = {model: set() for model in model_list}
+    for model in model_list:
+        for related in get_candidate_relations_to_delete(model._meta):
+            dependant = related.related_model
+            on_delete = related.field.remote_field.on_delete
+            if dependant in targets and dependant is not model and on_delete in (
+                models.CASCADE, models.PROTECT, models.RESTRICT
+            ):
+                blockers[model].add(dependant)
+
+    ordered = []
+    remaining = list(model_list)
+    while remaining:
+        ready = [model for model in remaining if not (blockers[model] - set(ordered))]
+        if not ready:
+            # Cycle de relations strictes : la cascade par lots reste correcte
+            ready = remaining[:1]
+        for model in ready:
+            ordered.append(model)
+            remaining.remove(model)
+    return ordered
+
+
+class Purger:
+    """
+    Supprimer des querysets par lots de clés primaires.
+    on_change(model, pks, deleted) est appelé dans la transaction du lot :
+    avant la suppression (deleted=True), avant et après la mise à jour des
+    lignes dépendantes SET_NULL/SET_DEFAULT (deleted=False).
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, on_change=None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.on_change = on_change
+        self.deleted = defaultdict(int)
+        self.changed = set()
+
+    def purge(self, queryset):
+        """
+        Supprimer toutes les lignes du queryset (et leurs dépendants).
+        Retourne le nombre de lignes supprimées pour ce modèle.
+        """
+        model = queryset.model
+        before = self.deleted[model._meta.label]
+        started = time.perf_counter()
+        for pks in self._pk_chunks(queryset):
+            with transaction.atomic(using=router.db_for_write(model)):
+                self._delete_chunk(model, pks)
+            if self.progress:
+                count = self.deleted[model._meta.label] - before
+                elapsed = time.perf_counter() - started
+                self.progress(model, count, count / elapsed if elapsed else 0)
+        return self.deleted[model._meta.label] - before
+
+    def _pk_chunks(self, queryset):
+        # Pagination par clé : coût constant par lot, quelle que soit la table
+        last_pk = None
+        queryset = queryset.order_by('pk').values_list('pk', flat=True)
+        while True:
+            page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            pks = list(page[:self.chunk_size])
+            if not pks:
+                return
+            yield pks
+            last_pk = pks[-1]
+
+    def _delete_chunk(self, model, pks):
+        using = router.db_for_write(model)
+        chunk = model._base_manager.using(using).filter(pk__in=pks)
+
+        for related in get_candidate_relations_to_delete(model._meta):
+            field = related.field
+            on_delete = field.remote_field.on_delete
+            if on_delete is models.DO_NOTHING:
+                continue
+            dependants = related.related_model._base_manager.using(using).filter(
+                **{f'{field.name}__in': pks}
+            )
+            if on_delete is models.CASCADE:
+                for dependant_pks in self._pk_chunks(dependants):
+                    self._delete_chunk(related.related_model, dependant_pks)
+            elif on_delete is models.SET_NULL:
+                self._update(related.related_model, dependants, {field.name: None})
+            elif on_delete is models.SET_DEFAULT:
+                self._update(related.related_model, dependants, {field.name: field.get_default()})
+            elif on_delete in (models.PROTECT, models.RESTRICT):
+                if dependants.exists():
+                    raise PurgeError(
+                        f'{model._meta.label} est référencé par {related.related_model._meta.label}.{field.name}'
+                    )
+            else:
+                raise PurgeError(
+                    f'Règle on_delete non supportée pour {related.related_model._meta.label}.{field.name}'
+                )
+
+        if self.on_change:
+            self.on_change(model, pks, True)
+        deleted = chunk._raw_delete(using)
+        if deleted:
+            self.changed.add(model)
+        self.deleted[model._meta.label] += deleted
+
+    def _update(self, model, queryset, values):
+        # Comme save() : les champs auto_now (updated_at) suivent la modification
+        now = timezone.now()
+        values = {
+            **values,
+            **{field.name: now for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)},
+        }
+        if self.on_change is None:
+            if queryset.update(**values):
+                self.changed.add(model)
+            return
+        for pks in self._pk_chunks(queryset):
+            self.on_change(model, pks, False)
+            model._base_manager.using(queryset.db).filter(pk__in=pks).update(**values)
+            self.on_change(model, pks, False)
+            self.changed.add(model)
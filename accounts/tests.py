@@ -0,0 +1,99 @@
+"""
+Purge par lots : ordre des modèles, cascades, SET_NULL et effets de bord
+de clean_data (traces de suppression, mois à recalculer, invalidation)
+"""
+from datetime import time, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from waste_management.cache import get_response_cache
+from waste_management.models import CollectionPoint, Schedule, ScheduleRoute, StaleMonth, Team, Tombstone, Truck
+
+from .purge import Purger, dependency_order
+
+User = get_user_model()
+
+
+class PurgeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.team = Team.objects.create(name='Plateau')
+        cls.driver = User.objects.create_user(username='driver', team=cls.team)
+        Team.objects.filter(id=cls.team.id).update(leader=cls.driver)
+        cls.truck = Truck.objects.create(plate_number='DK-0001', driver=cls.driver)
+        cls.schedule = Schedule.objects.create(
+            team=cls.team, truck=cls.truck, date=timezone.localdate(),
+            start_time=time(7), estimated_end_time=time(15),
+        )
+        for order in range(5):
+            point = CollectionPoint.objects.create(
+                name=f'Point {order}', address='Dakar', type='bin', latitude=14.69, longitude=-17.44
+            )
+            ScheduleRoute.objects.create(schedule=cls.schedule, collection_point=point, order=order)
+
+    def test_dependants_are_deleted_first(self):
+        ordered = dependency_order([Team, CollectionPoint, Schedule, ScheduleRoute, Truck, User])
+        position = {model: index for index, model in enumerate(ordered)}
+        self.assertLess(position[ScheduleRoute], position[Schedule])
+        self.assertLess(position[ScheduleRoute], position[CollectionPoint])
+        self.assertLess(position[Schedule], position[Team])
+        self.assertLess(position[Schedule], position[Truck])
+        # Team.leader <-> User.team (SET_NULL) : pas de cycle bloquant
+        self.assertEqual(sorted(model.__name__ for model in ordered), sorted(model.__name__ for model in position))
+
+    def test_cascade_by_chunks(self):
+        changes = []
+        purger = Purger(chunk_size=2, on_change=lambda model, pks, deleted: changes.append((model, len(pks), deleted)))
+        self.assertEqual(purger.purge(Truck.objects.all()), 1)
+        self.assertEqual(dict(purger.deleted), {
+            'waste_management.Truck': 1, 'waste_management.Schedule': 1, 'waste_management.ScheduleRoute': 5,
+        })
+        self.assertEqual(changes, [
+            (ScheduleRoute, 2, True), (ScheduleRoute, 2, True), (ScheduleRoute, 1, True),
+            (Schedule, 1, True), (Truck, 1, True),
+        ])
+        self.assertEqual(purger.changed, {Truck, Schedule, ScheduleRoute})
+        self.assertEqual(CollectionPoint.objects.count(), 5)
+
+    def test_set_null_advances_updated_at(self):
+        before = timezone.now()
+        purger = Purger()
+        purger.purge(User.objects.filter(id=self.driver.id))
+        truck = Truck.objects.get(id=self.truck.id)
+        team = Team.objects.get(id=self.team.id)
+        self.assertIsNone(truck.driver_id)
+        self.assertIsNone(team.leader_id)
+        self.assertGreaterEqual(truck.updated_at, before)
+        self.assertGreaterEqual(team.updated_at, before)
+        self.assertTrue({Truck, Team, User} <= purger.changed)
+
+    def test_clean_data_records_side_effects(self):
+        route_ids = sorted(ScheduleRoute.objects.values_list('id', flat=True))
+        versions = get_response_cache().backend.get_versions(['waste_management.schedule'])
+        StaleMonth.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('clean_data', model=['Schedule'], chunk_size=2, stdout=StringIO())
+
+        self.assertFalse(Schedule.objects.exists())
+        self.assertEqual(
+            list(Tombstone.objects.filter(model='waste_management.schedule').values_list('object_id', flat=True)),
+            [self.schedule.id],
+        )
+        self.assertEqual(sorted(
+            Tombstone.objects.filter(model='waste_management.scheduleroute').values_list('object_id', flat=True)
+        ), route_ids)
+        self.assertEqual(list(StaleMonth.objects.values_list('month', flat=True)), [timezone.localdate().replace(day=1)])
+        self.assertNotEqual(get_response_cache().backend.get_versions(['waste_management.schedule']), versions)
+
+    def test_older_than_keeps_recent_rows(self):
+        call_command('clean_data', model=['Schedule'], older_than=1, stdout=StringIO())
+        self.assertTrue(Schedule.objects.exists())
+        Schedule.objects.update(created_at=timezone.now() - timedelta(days=2))
+        call_command('clean_data', model=['Schedule'], older_than=1, stdout=StringIO())
+        self.assertFalse(Schedule.objects.exists())
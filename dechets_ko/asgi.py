@@ -0,0 +1,19 @@
+"""
+ASGI config for dechets_ko project.
+Sert le flux temps réel (/api/live/), par exemple :
+uvicorn dechets_ko.asgi:application
+En production l'API est servie en WSGI (dechets_ko.wsgi) et ce processus ne
+reçoit que le flux, avec LIVE_BROKER=waste_management.live.DatabaseBroker.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dechets_ko.settings')
+
+django_application = get_asgi_application()
+
+from waste_management.live import DisconnectMiddleware  # noqa: E402 (après le chargement de Django)
+
+application = DisconnectMiddleware(django_application)
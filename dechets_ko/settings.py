@@ -72,6 +72,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'dechets_ko.wsgi.application'
+ASGI_APPLICATION = 'dechets_ko.asgi.application'
 
 # Database
 """DATABASES = {
@@ -141,6 +142,36 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache Django : versions du cache de réponses (et ses entrées avec DjangoCacheBackend).
+# Partagé entre workers et commandes planifiées : table de la base par défaut
+# (manage.py createcachetable), ou Redis avec
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache et CACHE_LOCATION=redis://...
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'django_cache'),
+    }
+}
+
+# Cache des réponses publiques (waste_management.cache)
+# Entrées partagées entre workers : 'waste_management.cache.DjangoCacheBackend'
+RESPONSE_CACHE = {
+    'BACKEND': os.environ.get('RESPONSE_CACHE_BACKEND', 'waste_management.cache.LRUBackend'),
+    'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 60)),
+    'OPTIONS': {},
+}
+
+# Broker du flux temps réel (/api/live/) : en mémoire du processus ASGI par défaut,
+# waste_management.live.DatabaseBroker quand l'API et le flux sont servis par des processus distincts
+LIVE_BROKER = os.environ.get('LIVE_BROKER', 'waste_management.live.InProcessBroker')
+
+# Regroupement des signalements en double (waste_management.dedup) : même type,
+# à moins de REPORT_DUPLICATE_RADIUS_M mètres d'un signalement ouvert de moins de N heures
+REPORT_DUPLICATE_RADIUS_M = float(os.environ.get('REPORT_DUPLICATE_RADIUS_M', 50))
+REPORT_DUPLICATE_WINDOW_HOURS = float(os.environ.get('REPORT_DUPLICATE_WINDOW_HOURS', 6))
+# Rayon (mètres) pour rattacher un signalement au point de collecte le plus proche
+REPORT_POINT_RADIUS_M = float(os.environ.get('REPORT_POINT_RADIUS_M', 30))
+
 # JWT Settings
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -0,0 +1,230 @@
+"""
+Calcul des statistiques mensuelles à partir des plannings et signalements.
+
+Chaque écriture sur une donnée source (signalement, planning, point de
+route) enregistre les mois concernés dans StaleMonth : le mois de l'ancien
+état et celui du nouveau, pour qu'une collecte annulée, un planning
+supprimé ou un signalement rouvert corrige aussi le mois qu'il quitte.
+Les signaux couvrent save() et delete() ; les écritures groupées appellent
+mark_months() elles-mêmes. refresh_statistics() recalcule ces mois.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import Report, Schedule, ScheduleRoute, StaleMonth, Statistics
+
+RESOLVED_STATUSES = ['resolved', 'closed']
+
+# Marques gardées après un calcul : écritures validées pendant celui-ci (comme sync.SYNC_LAG)
+STALE_MONTH_LAG = timedelta(seconds=5)
+
+# Champs dont dépendent les statistiques, par modèle source
+SOURCE_FIELDS = {
+    Report: ('status', 'duplicate_of_id', 'resolved_at', 'updated_at'),
+    Schedule: ('date',),
+    ScheduleRoute: ('completed_at', 'schedule__date'),
+}
+
+
+def period_label(month):
+    return f'{month:%Y-%m}'
+
+
+def _as_month(value):
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month):
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+
+def _month_start(month):
+    return timezone.make_aware(datetime.combine(month, time.min))
+
+
+def _resolution_time():
+    return Coalesce('resolved_at', 'updated_at')
+
+
+def resolved_reports():
+    """
+    Signalements résolus ; les doublons (fermés à la réception, voir dedup.py)
+    ne sont pas des résolutions
+    """
+    return Report.objects.filter(status__in=RESOLVED_STATUSES, duplicate_of__isnull=True)
+
+
+def source_months(model, values):
+    """
+    Mois dont les statistiques dépendent d'une ligne source (valeurs de SOURCE_FIELDS)
+    """
+    if model is Report:
+        if values['status'] not in RESOLVED_STATUSES or values['duplicate_of_id'] is not None:
+            return set()
+        dates = [values['resolved_at'] or values['updated_at']]
+    elif model is Schedule:
+        dates = [values['date']]
+    else:
+        dates = [values['completed_at'], values['schedule__date']]
+    return {_as_month(value) for value in dates if value is not None}
+
+
+def stored_months(model, pk):
+    """
+    Mois dont dépend l'état enregistré d'une ligne (aucun si elle n'existe pas)
+    """
+    if pk is None:
+        return set()
+    values = model.objects.filter(pk=pk).values(*SOURCE_FIELDS[model]).first()
+    return source_months(model, values) if values else set()
+
+
+def rows_months(model, pks):
+    """
+    Mois dont dépend l'état enregistré d'un lot de lignes (écritures en masse)
+    """
+    months = set()
+    for values in model._base_manager.filter(pk__in=pks).values(*SOURCE_FIELDS[model]):
+        months |= source_months(model, values)
+    return months
+
+
+def mark_months(values):
+    """
+    Marquer à recalculer les mois de ces dates (date, datetime ou mois)
+    """
+    months = {_as_month(value) for value in values if value is not None}
+    if not months:
+        return
+    now = timezone.now()
+    StaleMonth.objects.bulk_create(
+        [StaleMonth(month=month, marked_at=now) for month in months],
+        update_conflicts=True, unique_fields=['month'], update_fields=['marked_at'],
+    )
+
+
+def touched_months():
+    """
+    Mois ayant des données : collectes, plannings, signalements résolus
+    """
+    completions = ScheduleRoute.objects.filter(completed_at__isnull=False)
+    schedules = Schedule.objects.all()
+    reports = resolved_reports()
+
+    months = set()
+    months.update(
+        completions.annotate(month=TruncMonth('completed_at'))
+        .values_list('month', flat=True).distinct()
+    )
+    months.update(
+        schedules.annotate(month=TruncMonth('date'))
+        .values_list('month', flat=True).distinct()
+    )
+    months.update(
+        reports.annotate(month=TruncMonth(_resolution_time()))
+        .values_list('month', flat=True).distinct()
+    )
+    return sorted({_as_month(month) for month in months if month is not None})
+
+
+def compute_months(months):
+    """
+    Agréger les indicateurs des mois donnés, une requête groupée par source.
+    Retourne {mois: {champ: valeur}}
+    """
+    if not months:
+        return {}
+    start, end = months[0], _next_month(months[-1])
+    results = {
+        month: {
+            'total_collections': 0,
+            'recycling_rate': 0,
+            'efficiency': 0,
+            'reports_resolved': 0,
+            'average_response_time': 0,
+        }
+        for month in months
+    }
+
+    collections = (
+        ScheduleRoute.objects
+        .filter(completed=True, completed_at__gte=_month_start(start), completed_at__lt=_month_start(end))
+        .annotate(month=TruncMonth('completed_at'))
+        .values('month')
+        .annotate(
+            total=Count('id'),
+            recycling=Count('id', filter=Q(collection_point__type='recycling')),
+        )
+    )
+    for row in collections:
+        month = _as_month(row['month'])
+        if month in results:
+            results[month]['total_collections'] = row['total']
+            results[month]['recycling_rate'] = round(100 * row['recycling'] / row['total'], 1)
+
+    planned = (
+        ScheduleRoute.objects
+        .filter(schedule__date__gte=start, schedule__date__lt=end)
+        .exclude(schedule__status='cancelled')
+        .annotate(month=TruncMonth('schedule__date'))
+        .values('month')
+        .annotate(total=Count('id'), done=Count('id', filter=Q(completed=True)))
+    )
+    for row in planned:
+        month = _as_month(row['month'])
+        if month in results and row['total']:
+            results[month]['efficiency'] = round(100 * row['done'] / row['total'], 1)
+
+    resolved = (
+        resolved_reports()
+        .annotate(resolved_on=_resolution_time())
+        .filter(resolved_on__gte=_month_start(start), resolved_on__lt=_month_start(end))
+        .annotate(month=TruncMonth('resolved_on'))
+        .values('month')
+        .annotate(
+            total=Count('id'),
+            response_time=Avg(ExpressionWrapper(F('resolved_on') - F('created_at'), output_field=DurationField())),
+        )
+    )
+    for row in resolved:
+        month = _as_month(row['month'])
+        if month in results:
+            results[month]['reports_resolved'] = row['total']
+            if row['response_time'] is not None:
+                hours = row['response_time'].total_seconds() / 3600
+                results[month]['average_response_time'] = round(hours, 1)
+
+    return results
+
+
+def refresh_statistics(full=False):
+    """
+    Recalculer les statistiques des mois marqués (StaleMonth), ou de tous
+    les mois au premier calcul et avec full=True.
+    Retourne la liste des périodes écrites.
+    """
+    started_at = timezone.now()
+    months = set(StaleMonth.objects.values_list('month', flat=True))
+    if full or not Statistics.objects.exists():
+        months.update(touched_months())
+        months.add(_as_month(started_at))
+    months = sorted(months)
+
+    results = compute_months(months)
+    with transaction.atomic():
+        for month, values in results.items():
+            Statistics.objects.update_or_create(
+                period=period_label(month),
+                defaults={**values, 'computed_at': started_at},
+            )
+        # Une marque récente peut venir d'une écriture validée après la lecture
+        StaleMonth.objects.filter(month__in=months, marked_at__lt=started_at - STALE_MONTH_LAG).delete()
+    return [period_label(month) for month in months]
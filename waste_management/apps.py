@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class WasteManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'waste_management'
-    verbose_name = 'Gestion des déchets'
\ No newline at end of file
+    verbose_name = 'Gestion des déchets'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401 (checks : enregistrement)
+        signals.connect()
@@ -0,0 +1,279 @@
+"""
+Cache des réponses des endpoints publics en lecture.
+
+La clé d'une réponse contient l'endpoint, les paramètres de requête et le
+numéro de version de chaque modèle dont elle dépend. Toute écriture sur un
+modèle incrémente sa version : les anciennes entrées ne sont plus jamais lues
+et disparaissent par éviction LRU ou expiration.
+
+Les versions sont gardées dans un cache Django partagé (CacheVersions ; base
+de données par défaut, ou Redis) : une écriture faite par un worker ou par
+une commande planifiée (refresh_eta, forecast_fill, ...) invalide les
+réponses de tous les processus. Un cache local au processus est refusé
+(checks.py). Le backend par défaut garde les entrées dans un LRU en
+mémoire, propre à chaque processus ; DjangoCacheBackend partage aussi les
+entrées.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.http import parse_http_date
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+from .conditional import model_versions, not_modified
+
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified')
+
+DEFAULT_SETTINGS = {
+    'BACKEND': 'waste_management.cache.LRUBackend',
+    'TIMEOUT': 60,
+    'OPTIONS': {},
+}
+
+
+class CacheVersions:
+    """
+    Numéro de version de chaque modèle, dans un cache Django
+    """
+
+    def __init__(self, alias='default', key_prefix='response'):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+
+    def get(self, names):
+        keys = [f'{self.key_prefix}:version:{name}' for name in names]
+        found = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            # Première version ou version perdue (éviction, redémarrage) : horloge,
+            # pas 0, pour qu'un ETag émis avant ne corresponde pas à d'autres données
+            for key in missing:
+                self.cache.add(key, time.time_ns(), None)
+            found.update(self.cache.get_many(missing))
+        return [found.get(key, 0) for key in keys]
+
+    def bump(self, name):
+        # Nouvelle valeur d'horloge plutôt que incr() (lecture puis écriture
+        # sur DatabaseCache) : deux invalidations concurrentes donnent deux
+        # versions distinctes, aucune n'est perdue
+        self.cache.set(f'{self.key_prefix}:version:{name}', time.time_ns(), None)
+
+
+class LRUBackend:
+    """
+    Cache LRU en mémoire du processus ; versions dans le cache Django `versions_alias`
+    """
+
+    def __init__(self, max_entries=2048, versions_alias='default'):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.versions = CacheVersions(versions_alias)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_versions(self, names):
+        return self.versions.get(names)
+
+    def bump_version(self, name):
+        self.versions.bump(name)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class DjangoCacheBackend:
+    """
+    Cache partagé entre processus via un cache Django (settings.CACHES)
+    """
+
+    def __init__(self, alias='default', key_prefix='response'):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+        self.versions = CacheVersions(alias, key_prefix)
+
+    def get(self, key):
+        return self.cache.get(f'{self.key_prefix}:{key}')
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(f'{self.key_prefix}:{key}', value, timeout)
+
+    def get_versions(self, names):
+        return self.versions.get(names)
+
+    def bump_version(self, name):
+        self.versions.bump(name)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ResponseCache:
+    """
+    Façade : construction des clés, versions par modèle et statistiques
+    """
+
+    def __init__(self, backend, timeout):
+        self.backend = backend
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def build_key(self, endpoint, params, models, extra='', versions=None):
+        names = [model._meta.label_lower for model in models]
+        if versions is None:
+            versions = self.backend.get_versions(names)
+        query = urlencode(sorted(params.lists()), doseq=True)
+        version_part = ','.join(f'{name}={version}' for name, version in zip(names, versions))
+        return f'{endpoint}?{query}|{version_part}|{extra}'
+
+    def get(self, endpoint, key):
+        value = self.backend.get(key)
+        with self.lock:
+            self.stats[endpoint]['hits' if value is not None else 'misses'] += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.timeout)
+
+    def bump(self, *models):
+        for model in models:
+            self.backend.bump_version(model._meta.label_lower)
+
+    def metrics(self):
+        with self.lock:
+            endpoints = {
+                endpoint: {**counts, 'hit_rate': _rate(counts)}
+                for endpoint, counts in sorted(self.stats.items())
+            }
+        hits = sum(counts['hits'] for counts in endpoints.values())
+        misses = sum(counts['misses'] for counts in endpoints.values())
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': _rate({'hits': hits, 'misses': misses}),
+            'endpoints': endpoints,
+        }
+
+
+def _rate(counts):
+    total = counts['hits'] + counts['misses']
+    return round(counts['hits'] / total, 4) if total else 0.0
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                config = {**DEFAULT_SETTINGS, **getattr(settings, 'RESPONSE_CACHE', {})}
+                backend = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+                _response_cache = ResponseCache(backend, config['TIMEOUT'])
+    return _response_cache
+
+
+def bump(*models):
+    """
+    Invalider les réponses dépendant de ces modèles. Appelé par les signaux
+    post_save/post_delete et, explicitement, après les écritures en masse
+    (QuerySet.update, bulk_create, bulk_update) qui n'émettent pas de signaux.
+    Dans une transaction, l'invalidation attend le commit : une lecture
+    concurrente ne peut pas remettre en cache l'état d'avant l'écriture
+    sous la nouvelle version.
+    """
+    transaction.on_commit(lambda: get_response_cache().bump(*models))
+
+
+class CachedResponseMixin:
+    """
+    Mixin de ViewSet : met en cache les réponses de list/retrieve.
+    - cache_models : modèles dont dépend la réponse (versions dans la clé)
+    - les écritures réussies via l'API invalident le modèle du ViewSet
+    """
+    cache_actions = ('list', 'retrieve')
+    cache_models = ()
+
+    def get_cache_models(self):
+        return self.cache_models or (self.queryset.model,)
+
+    def get_cache_key_extra(self):
+        return ''
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        # self.action est connu ici ; le handler s'exécute après les permissions
+        if self.action in self.cache_actions and request.method == 'GET':
+            self.get = self._cached_handler(self.get)
+        return request
+
+    def _cached_handler(self, handler):
+        def cached(request, *args, **kwargs):
+            cache = get_response_cache()
+            endpoint = f'{self.basename}-{self.action}'
+            models = self.get_cache_models()
+            key = cache.build_key(
+                f"{endpoint}:{kwargs.get(self.lookup_url_kwarg or self.lookup_field, '')}",
+                request.query_params,
+                models,
+                self.get_cache_key_extra(),
+                # Lues une fois par requête, réutilisées par le validateur ETag
+                versions=model_versions(self, models),
+            )
+            entry = cache.get(endpoint, key)
+            if entry is not None:
+                data, headers = entry
+                # Validateurs mémorisés avec la réponse : 304 sans autre requête SQL
+                response = not_modified(
+                    request._request, headers.get('ETag'), headers.get('Last-Modified-Timestamp')
+                ) or Response(data)
+                for header in VALIDATOR_HEADERS:
+                    if header in headers:
+                        response[header] = headers[header]
+                response['X-Cache'] = 'HIT'
+                return response
+
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200 and hasattr(response, 'data'):
+                headers = {header: response[header] for header in VALIDATOR_HEADERS if header in response}
+                if 'Last-Modified' in response:
+                    headers['Last-Modified-Timestamp'] = parse_http_date(response['Last-Modified'])
+                cache.set(key, (response.data, headers))
+                response['X-Cache'] = 'MISS'
+            return response
+        return cached
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            bump(self.queryset.model)
+        return super().finalize_response(request, response, *args, **kwargs)
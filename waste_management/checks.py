@@ -0,0 +1,27 @@
+"""
+Vérifications de configuration (manage.py check, migrate, commandes)
+"""
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+from .cache import get_response_cache
+
+
+@register(Tags.caches)
+def check_shared_cache_versions(app_configs, **kwargs):
+    """
+    Les versions du cache de réponses doivent être dans un cache partagé :
+    les écritures viennent aussi d'autres processus (workers, commandes
+    planifiées refresh_eta, forecast_fill, plan_schedules, ...), qui sinon
+    n'invalident que leur propre mémoire
+    """
+    versions_cache = get_response_cache().backend.versions.cache
+    if isinstance(versions_cache, (LocMemCache, DummyCache)):
+        return [Error(
+            f'Cache local au processus ({type(versions_cache).__name__}) pour les versions du cache de '
+            'réponses : les écritures des autres workers et des commandes planifiées ne les invalident pas.',
+            hint='Définir CACHE_BACKEND / CACHE_LOCATION vers un cache partagé (base de données, Redis).',
+            id='waste_management.E001',
+        )]
+    return []
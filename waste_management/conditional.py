@@ -0,0 +1,103 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) pour les lectures.
+
+Les validateurs d'une réponse viennent des versions partagées du cache de
+réponses (cache.py), lues une fois par requête, sans agrégat SQL :
+- ETag : chemin complet (filtres, curseur) et version de chaque modèle
+  dont dépend la réponse ; toute écriture sur l'un d'eux le change ;
+- Last-Modified : date de la dernière écriture sur ces modèles (une
+  version est l'horloge, en nanosecondes, de la dernière invalidation).
+Un client qui renvoie If-None-Match ou If-Modified-Since reçoit 304 si
+rien n'a changé.
+"""
+import hashlib
+import math
+import time
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def model_versions(view, models):
+    """
+    Versions de ces modèles, lues une seule fois par requête (mémorisées sur la vue)
+    """
+    from .cache import get_response_cache
+
+    names = [model._meta.label_lower for model in models]
+    known = view.__dict__.setdefault('_model_versions', {})
+    missing = [name for name in names if name not in known]
+    if missing:
+        known.update(zip(missing, get_response_cache().backend.get_versions(missing)))
+    return [known[name] for name in names]
+
+
+def compute_validators(path, models, versions, extra=''):
+    """
+    (etag, last_modified) pour une réponse dépendant de ces modèles.
+    last_modified est un timestamp en secondes, arrondi au-dessus ; None
+    tant que cette seconde n'est pas écoulée : une écriture dans la même
+    seconde ne changerait pas l'en-tête (précision HTTP d'une seconde).
+    """
+    names = [model._meta.label_lower for model in models]
+    parts = [path, extra] + [f'{name}={version}' for name, version in zip(names, versions)]
+    digest = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+    last_modified = math.ceil(max(versions, default=0) / 1e9) or None
+    if last_modified is not None and last_modified > time.time():
+        last_modified = None
+    return f'W/{quote_etag(digest)}', last_modified
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Réponse 304 si les validateurs envoyés par le client correspondent, sinon None
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None and response.status_code == 304:
+        return response
+    return None
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Mixin de ViewSet : ETag et Last-Modified sur list/retrieve, 304 sans
+    sérialisation. Les modèles des validateurs sont ceux du cache de réponses
+    (get_cache_models) quand la vue en a un, sinon le modèle du ViewSet.
+    """
+    conditional_actions = ('list', 'retrieve')
+
+    def get_validator_models(self):
+        if hasattr(self, 'get_cache_models'):
+            return self.get_cache_models()
+        return (self.queryset.model,)
+
+    def get_validators(self, request, kwargs):
+        extra = self.get_cache_key_extra() if hasattr(self, 'get_cache_key_extra') else ''
+        models = self.get_validator_models()
+        return compute_validators(request.get_full_path(), models, model_versions(self, models), extra)
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if self.action in self.conditional_actions and request.method == 'GET':
+            self.get = self._conditional_handler(self.get)
+        return request
+
+    def _conditional_handler(self, handler):
+        def conditional(request, *args, **kwargs):
+            etag, last_modified = self.get_validators(request, kwargs)
+            response = not_modified(request._request, etag, last_modified)
+            if response is not None:
+                return set_validators(response, etag, last_modified)
+
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                set_validators(response, etag, last_modified)
+            return response
+        return conditional
@@ -0,0 +1,176 @@
+"""
+Détection des signalements en double à la réception.
+
+Un nouveau signalement est comparé aux signalements ouverts du même type,
+créés dans la fenêtre de temps et situés dans le rayon configuré. S'il en
+trouve un, il lui est rattaché (duplicate_of) et le compteur du signalement
+principal est incrémenté : les coordinateurs ne traitent qu'un signalement
+par incident.
+
+Les signalements principaux récents sont indexés en mémoire dans une grille
+dont la maille est le rayon : une recherche ne lit que 9 cellules. L'index
+est complété à chaque réception par les lignes créées depuis la lecture
+précédente (y compris par les autres processus), en une requête sur
+created_at. Les identifiants ne sont pas validés dans l'ordre : la lecture
+reprend SYNC_LAG plus tôt, comme /api/sync/, et les lignes déjà indexées sont
+ignorées. Le coût d'une réception ne dépend donc pas du volume reçu.
+"""
+import math
+import threading
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .geo import EARTH_RADIUS_KM, haversine_km
+from .models import Report
+
+# Statuts d'un signalement auquel rattacher les nouveaux signalements
+OPEN_STATUSES = ('pending', 'in_progress')
+# Statut des signalements rattachés
+DUPLICATE_STATUS = 'closed'
+
+
+def duplicate_radius_m():
+    return getattr(settings, 'REPORT_DUPLICATE_RADIUS_M', 50)
+
+
+def duplicate_window():
+    return timedelta(hours=getattr(settings, 'REPORT_DUPLICATE_WINDOW_HOURS', 6))
+
+
+class ReportIndex:
+    """
+    Grille (type, ligne, colonne) -> signalements principaux récents
+    """
+
+    def __init__(self, radius_m, window):
+        self.radius_km = radius_m / 1000
+        self.window = window
+        self.cell_degrees = self.radius_km / (math.pi * EARTH_RADIUS_KM / 180)
+        self.cells = {}
+        # Toutes les entrées par ordre de création : expiration en tête de file
+        self.entries = deque()
+        self.indexed = set()
+        self.synced_at = None
+        self.lock = threading.Lock()
+
+    def _cell(self, latitude, longitude):
+        # La maille en longitude s'élargit avec la latitude pour couvrir le rayon
+        lon_degrees = self.cell_degrees / max(math.cos(math.radians(latitude)), 0.01)
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / lon_degrees)
+
+    def add(self, report_id, report_type, latitude, longitude, created_at):
+        if report_id in self.indexed:
+            return
+        self.indexed.add(report_id)
+        row, column = self._cell(latitude, longitude)
+        key = (report_type, row, column)
+        self.cells.setdefault(key, deque()).append((created_at, report_id, latitude, longitude))
+        self.entries.append((created_at, report_id, key))
+
+    def expire(self, now):
+        """
+        Retirer les entrées sorties de la fenêtre : la mémoire reste bornée
+        par le nombre de signalements reçus pendant la fenêtre
+        """
+        oldest = now - self.window
+        while self.entries and self.entries[0][0] < oldest:
+            _, report_id, key = self.entries.popleft()
+            self.indexed.discard(report_id)
+            cell = self.cells.get(key)
+            # Les cellules sont aussi dans l'ordre de création : purge par la gauche
+            while cell and cell[0][0] < oldest:
+                cell.popleft()
+            if not cell:
+                self.cells.pop(key, None)
+
+    def discard(self, report_id):
+        self.indexed.discard(report_id)
+
+    def nearby(self, report_type, latitude, longitude, now):
+        """
+        Signalements principaux du même type dans le rayon et la fenêtre,
+        du plus proche au plus éloigné : [(distance_km, id), ...]
+        """
+        oldest = now - self.window
+        row, column = self._cell(latitude, longitude)
+        found = []
+        for d_row in (-1, 0, 1):
+            for d_column in (-1, 0, 1):
+                entries = self.cells.get((report_type, row + d_row, column + d_column), ())
+                for created_at, report_id, lat, lon in entries:
+                    if created_at < oldest or report_id not in self.indexed:
+                        continue
+                    distance = haversine_km(latitude, longitude, lat, lon)
+                    if distance <= self.radius_km:
+                        found.append((distance, report_id))
+        return sorted(found)
+
+    def sync(self, now):
+        """
+        Ajouter les signalements principaux ouverts créés depuis la lecture
+        précédente, avec une marge de SYNC_LAG ; au premier appel du processus,
+        ceux de toute la fenêtre
+        """
+        from .sync import SYNC_LAG
+
+        with self.lock:
+            since = now - self.window if self.synced_at is None else self.synced_at - SYNC_LAG
+        rows = list(Report.objects.filter(
+            created_at__gte=since, status__in=OPEN_STATUSES, duplicate_of__isnull=True,
+        ).order_by('created_at', 'id').values_list('id', 'type', 'latitude', 'longitude', 'created_at'))
+
+        with self.lock:
+            self.expire(now)
+            for report_id, report_type, latitude, longitude, created_at in rows:
+                self.add(report_id, report_type, latitude, longitude, created_at)
+            self.synced_at = max(self.synced_at or now, now)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ReportIndex(duplicate_radius_m(), duplicate_window())
+    return _index
+
+
+def create_report(**fields):
+    """
+    Créer un signalement, rattaché au signalement ouvert le plus proche
+    s'il en existe un. Le signalement retourné porte duplicate_of_id et,
+    s'il est rattaché, `cluster_count` (taille du groupe).
+    """
+    index = get_index()
+    now = timezone.now()
+    index.sync(now)
+    with index.lock:
+        candidates = index.nearby(fields['type'], fields['latitude'], fields['longitude'], now)
+
+    for _, primary_id in candidates:
+        with transaction.atomic():
+            # Le signalement principal a pu être résolu entre-temps (autre processus)
+            attached = Report.objects.filter(
+                id=primary_id, status__in=OPEN_STATUSES, duplicate_of__isnull=True
+            ).update(duplicate_count=F('duplicate_count') + 1, updated_at=now)
+            if attached:
+                report = Report.objects.create(
+                    duplicate_of_id=primary_id, **{**fields, 'status': DUPLICATE_STATUS}
+                )
+                report.cluster_count = Report.objects.values_list(
+                    'duplicate_count', flat=True
+                ).get(id=primary_id) + 1
+                return report
+        with index.lock:
+            index.discard(primary_id)
+
+    return Report.objects.create(**fields)
@@ -0,0 +1,240 @@
+"""
+Affectation automatique des signalements aux équipes.
+
+Chaque équipe active reçoit un score pour un signalement :
+
+    score = SPECIALIZATION_WEIGHT * adéquation spécialisation / type
+          + DISTANCE_WEIGHT * proximité (camion disponible le plus proche)
+          + WORKLOAD_WEIGHT * disponibilité (signalements ouverts de l'équipe)
+
+Les équipes, leurs camions et leur charge sont chargés en trois requêtes ;
+le score de toutes les équipes est ensuite calculé sur des tableaux NumPy
+(matrice signalements x camions pour les distances). L'affectation de la
+file d'attente complète met à jour la charge au fil des affectations et
+enregistre le tout dans une transaction, avec un UPDATE par équipe.
+"""
+from collections import namedtuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.utils import timezone
+
+from .cache import bump
+from .geo import EARTH_RADIUS_KM
+from .models import Team, Truck, Report
+
+SPECIALIZATION_WEIGHT = 0.5
+DISTANCE_WEIGHT = 0.3
+WORKLOAD_WEIGHT = 0.2
+
+# Distance (km) à laquelle la proximité vaut 0.5
+DISTANCE_SCALE_KM = 3.0
+# Nombre de signalements ouverts pour lequel la disponibilité vaut 0.5
+WORKLOAD_SCALE = 5.0
+
+# Adéquation d'une spécialisation d'équipe à un type de signalement (0 à 1)
+SPECIALIZATION_MATCH = {
+    'overflow': {'general': 1.0, 'recycling': 0.7, 'organic': 0.7, 'hazardous': 0.3},
+    'damage': {'general': 1.0, 'recycling': 0.6, 'organic': 0.6, 'hazardous': 0.5},
+    'illegal_dump': {'general': 0.8, 'recycling': 0.5, 'organic': 0.5, 'hazardous': 1.0},
+    'missed_collection': {'general': 1.0, 'recycling': 0.8, 'organic': 0.8, 'hazardous': 0.3},
+    'other': {'general': 1.0, 'recycling': 0.5, 'organic': 0.5, 'hazardous': 0.5},
+}
+DEFAULT_MATCH = 0.5
+
+# Camions pouvant intervenir
+AVAILABLE_TRUCK_STATUSES = ('available', 'collecting')
+OPEN_STATUSES = ('pending', 'in_progress')
+PRIORITY_ORDER = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+# Signalements traités par bloc dans la matrice des distances
+CHUNK_SIZE = 256
+# Identifiants par UPDATE (nombre de paramètres SQL borné)
+SAVE_BATCH_SIZE = 500
+
+Suggestion = namedtuple('Suggestion', [
+    'team_id', 'team_name', 'score', 'specialization', 'distance_km', 'open_reports',
+])
+
+
+class Fleet:
+    """
+    Équipes actives, camions disponibles et charge ouverte, sous forme de tableaux
+    """
+
+    def __init__(self):
+        teams = list(Team.objects.filter(status='active').order_by('id').values_list(
+            'id', 'name', 'specialization'
+        ))
+        self.team_ids = np.array([team[0] for team in teams], dtype=np.int64)
+        self.team_names = [team[1] for team in teams]
+        self.specializations = [team[2] for team in teams]
+        position = {team_id: index for index, team_id in enumerate(self.team_ids.tolist())}
+
+        trucks = [
+            row for row in Truck.objects.filter(
+                status__in=AVAILABLE_TRUCK_STATUSES, driver__team_id__in=list(position)
+            ).values_list('driver__team_id', 'current_latitude', 'current_longitude')
+            # Position par défaut (0, 0) : camion jamais localisé
+            if row[1] or row[2]
+        ]
+        # Camions triés par équipe : chaque équipe occupe une plage contiguë de colonnes
+        trucks.sort(key=lambda row: position[row[0]])
+        truck_teams = np.array([position[row[0]] for row in trucks], dtype=np.int64)
+        self.truck_latitudes = np.radians(np.array([row[1] for row in trucks], dtype=float))
+        self.truck_longitudes = np.radians(np.array([row[2] for row in trucks], dtype=float))
+        self.equipped, self.truck_starts = np.unique(truck_teams, return_index=True)
+
+        self.workload = np.zeros(len(teams))
+        for team_id, count in Report.objects.filter(
+            assigned_team_id__in=list(position), status__in=OPEN_STATUSES
+        ).values_list('assigned_team_id').annotate(count=Count('id')).order_by():
+            self.workload[position[team_id]] = count
+
+    def __len__(self):
+        return len(self.team_ids)
+
+    def match(self, report_types):
+        """
+        Matrice signalements x équipes de l'adéquation spécialisation / type
+        """
+        table = {
+            report_type: np.array([
+                SPECIALIZATION_MATCH.get(report_type, {}).get(specialization, DEFAULT_MATCH)
+                for specialization in self.specializations
+            ])
+            for report_type in set(report_types)
+        }
+        return np.array([table[report_type] for report_type in report_types]).reshape(-1, len(self))
+
+    def distances(self, latitudes, longitudes):
+        """
+        Matrice signalements x équipes de la distance (km) au camion disponible
+        le plus proche de chaque équipe (inf si l'équipe n'en a pas)
+        """
+        result = np.full((len(latitudes), len(self)), np.inf)
+        if not len(self.equipped):
+            return result
+        lat = np.radians(np.asarray(latitudes, dtype=float))[:, None]
+        lon = np.radians(np.asarray(longitudes, dtype=float))[:, None]
+        a = (
+            np.sin((self.truck_latitudes[None, :] - lat) / 2) ** 2
+            + np.cos(lat) * np.cos(self.truck_latitudes[None, :])
+            * np.sin((self.truck_longitudes[None, :] - lon) / 2) ** 2
+        )
+        per_truck = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+        # Minimum sur la plage de colonnes de chaque équipe
+        result[:, self.equipped] = np.minimum.reduceat(per_truck, self.truck_starts, axis=1)
+        return result
+
+    def suggestion(self, index, score, distance):
+        return Suggestion(
+            team_id=int(self.team_ids[index]),
+            team_name=self.team_names[index],
+            score=round(float(score), 3),
+            specialization=self.specializations[index],
+            distance_km=round(float(distance), 2) if np.isfinite(distance) else None,
+            open_reports=int(self.workload[index]),
+        )
+
+    def static_scores(self, reports):
+        """
+        Parts du score indépendantes de la charge, et distances : reports = [(type, lat, lon), ...]
+        """
+        match = self.match([report[0] for report in reports])
+        distance = self.distances([report[1] for report in reports], [report[2] for report in reports])
+        proximity = DISTANCE_SCALE_KM / (DISTANCE_SCALE_KM + distance)
+        return SPECIALIZATION_WEIGHT * match + DISTANCE_WEIGHT * proximity, distance
+
+    def availability(self):
+        return WORKLOAD_SCALE / (WORKLOAD_SCALE + self.workload)
+
+
+def suggest(report, limit=5, fleet=None):
+    """
+    Équipes classées par score décroissant pour un signalement
+    """
+    if fleet is None:
+        fleet = Fleet()
+    if not len(fleet):
+        return []
+    static, distance = fleet.static_scores([(report.type, report.latitude, report.longitude)])
+    scores = static[0] + WORKLOAD_WEIGHT * fleet.availability()
+    ranked = np.argsort(-scores, kind='stable')[:limit]
+    return [fleet.suggestion(index, scores[index], distance[0, index]) for index in ranked]
+
+
+def priority_rank():
+    """
+    Expression SQL : rang de la priorité (PRIORITY_ORDER), urgent d'abord
+    """
+    return Case(
+        *(When(priority=priority, then=Value(rank)) for priority, rank in PRIORITY_ORDER.items()),
+        default=Value(len(PRIORITY_ORDER)),
+        output_field=IntegerField(),
+    )
+
+
+def assign_backlog(queryset=None, limit=None, dry_run=False):
+    """
+    Affecter les signalements en attente sans équipe, du plus prioritaire au
+    plus ancien. La charge de chaque équipe augmente à chaque affectation.
+    Retourne [(report_id, Suggestion), ...].
+    """
+    if limit is not None and limit < 0:
+        raise ValueError(f'limit doit être positif ou nul : {limit}')
+    if queryset is None:
+        queryset = Report.objects.filter(
+            status='pending', assigned_team__isnull=True, duplicate_of__isnull=True
+        )
+    # Tri et limite dans la base : seuls les signalements traités sont lus
+    queryset = queryset.annotate(priority_rank=priority_rank()).order_by('priority_rank', 'created_at', 'id')
+    if limit is not None:
+        queryset = queryset[:limit]
+    rows = list(queryset.values_list('id', 'type', 'latitude', 'longitude'))
+
+    fleet = Fleet()
+    if not rows or not len(fleet):
+        return []
+
+    assignments = []
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        static, distance = fleet.static_scores([(row[1], row[2], row[3]) for row in chunk])
+        for position, row in enumerate(chunk):
+            scores = static[position] + WORKLOAD_WEIGHT * fleet.availability()
+            index = int(np.argmax(scores))
+            assignments.append((row[0], fleet.suggestion(index, scores[index], distance[position, index])))
+            fleet.workload[index] += 1
+
+    if not dry_run:
+        save_assignments(assignments)
+    return assignments
+
+
+def save_assignments(assignments):
+    """
+    Enregistrer les affectations (signalements encore en attente) dans une
+    seule transaction : un UPDATE par équipe, à valeurs constantes
+    """
+    by_team = {}
+    for report_id, team in assignments:
+        by_team.setdefault((team.team_id, team.team_name), []).append(report_id)
+
+    updated = 0
+    now = timezone.now()
+    with transaction.atomic():
+        for (team_id, team_name), report_ids in by_team.items():
+            for start in range(0, len(report_ids), SAVE_BATCH_SIZE):
+                updated += Report.objects.filter(
+                    id__in=report_ids[start:start + SAVE_BATCH_SIZE], status='pending'
+                ).update(
+                    assigned_team_id=team_id,
+                    assigned_to=team_name,
+                    status='in_progress',
+                    updated_at=now,
+                )
+    if updated:
+        bump(Report)
+    return updated
@@ -0,0 +1,321 @@
+"""
+Estimation automatique du temps d'arrivée (ETA) des camions au prochain
+point de collecte non collecté de leur tournée du jour.
+
+ETA = distance jusqu'au prochain arrêt / vitesse observée récente
+      + délais des incidents actifs proches du trajet.
+
+La géométrie des tournées (arrêts restants, distance restante cumulée) est
+gardée en mémoire et invalidée par les compteurs de version des plannings et
+points de route (voir cache.py). Un rafraîchissement de toute la flotte est
+donc un calcul NumPy sur des tableaux, suivi d'un seul UPDATE.
+
+La vitesse observée est suivie par le processus qui reçoit la télémétrie et
+enregistrée dans Truck.speed_kmh : la tâche planifiée (refresh_eta), lancée
+dans un autre processus, repart de cette valeur. Les camions sans vitesse
+connue ni position reçue (0, 0 par défaut) sont laissés de côté par le
+rafraîchissement de la flotte.
+"""
+import math
+import threading
+from collections import namedtuple
+
+import numpy as np
+from django.db.models import Case, F, FloatField, When, Value, IntegerField
+from django.utils import timezone
+
+from .cache import bump, get_response_cache
+from .geo import EARTH_RADIUS_KM, haversine_km
+from .models import Truck, ScheduleRoute, Incident
+
+# Vitesse utilisée tant qu'aucune vitesse n'a été observée (km/h)
+DEFAULT_SPEED_KMH = 18.0
+MIN_SPEED_KMH = 5.0
+MAX_SPEED_KMH = 60.0
+# Poids d'une nouvelle mesure dans la moyenne glissante de la vitesse
+SPEED_SMOOTHING = 0.3
+# Intervalle minimal entre deux positions pour mesurer une vitesse (secondes)
+MIN_SAMPLE_SECONDS = 5
+# Rapport distance routière / distance à vol d'oiseau en ville
+DETOUR_FACTOR = 1.3
+# Distance maximale (km) entre un incident actif et le trajet pour compter son délai
+INCIDENT_RADIUS_KM = 0.5
+
+ACTIVE_SCHEDULE_STATUSES = ('in_progress', 'planned')
+
+Eta = namedtuple('Eta', [
+    'truck_id', 'route_point_id', 'collection_point_id', 'minutes',
+    'distance_km', 'remaining_km', 'speed_kmh', 'incident_delay',
+])
+
+
+class SpeedTracker:
+    """
+    Vitesse observée de chaque camion (moyenne glissante exponentielle),
+    mise à jour à chaque nouvelle position
+    """
+
+    def __init__(self):
+        self.last = {}
+        self.speeds = {}
+        self.lock = threading.Lock()
+
+    def observe(self, truck_id, timestamp, latitude, longitude):
+        with self.lock:
+            previous = self.last.get(truck_id)
+            if previous is not None:
+                elapsed = (timestamp - previous[0]).total_seconds()
+                if elapsed < MIN_SAMPLE_SECONDS:
+                    return
+                speed = haversine_km(previous[1], previous[2], latitude, longitude) * DETOUR_FACTOR / (elapsed / 3600)
+                speed = min(max(speed, MIN_SPEED_KMH), MAX_SPEED_KMH)
+                current = self.speeds.get(truck_id)
+                self.speeds[truck_id] = speed if current is None else (
+                    SPEED_SMOOTHING * speed + (1 - SPEED_SMOOTHING) * current
+                )
+            if previous is None or timestamp > previous[0]:
+                self.last[truck_id] = (timestamp, latitude, longitude)
+
+    def observed(self, truck_id):
+        """
+        Vitesse mesurée par ce processus, None si aucune
+        """
+        return self.speeds.get(truck_id)
+
+
+speeds = SpeedTracker()
+
+
+class RouteGeometry:
+    """
+    Arrêts restants d'une tournée, dans l'ordre, et distance restante
+    (km) depuis chaque arrêt jusqu'à la fin de la tournée
+    """
+
+    def __init__(self, stops):
+        self.route_point_ids = [stop[0] for stop in stops]
+        self.collection_point_ids = [stop[1] for stop in stops]
+        self.latitudes = np.array([stop[2] for stop in stops], dtype=float)
+        self.longitudes = np.array([stop[3] for stop in stops], dtype=float)
+        legs = _haversine(
+            self.latitudes[:-1], self.longitudes[:-1], self.latitudes[1:], self.longitudes[1:]
+        ) * DETOUR_FACTOR
+        self.remaining_km = np.concatenate([np.cumsum(legs[::-1])[::-1], [0.0]])
+
+
+class GeometryCache:
+    """
+    Tournées du jour par camion, rechargées uniquement après une écriture
+    sur les plannings ou les points de route
+    """
+
+    def __init__(self):
+        self.key = None
+        self.routes = {}
+        self.incidents = None
+        self.lock = threading.Lock()
+
+    def _check(self):
+        versions = get_response_cache().backend.get_versions([
+            'waste_management.schedule', 'waste_management.scheduleroute', 'waste_management.incident'
+        ])
+        key = (timezone.now().date(), tuple(versions))
+        if key != self.key:
+            self.key = key
+            self.routes = {}
+            self.incidents = None
+
+    def routes_for(self, truck_ids):
+        with self.lock:
+            self._check()
+            missing = [truck_id for truck_id in truck_ids if truck_id not in self.routes]
+            if missing:
+                self.routes.update(load_routes(missing))
+            return {truck_id: self.routes[truck_id] for truck_id in truck_ids}
+
+    def active_incidents(self):
+        with self.lock:
+            self._check()
+            if self.incidents is None:
+                rows = list(Incident.objects.filter(status='active').values_list(
+                    'latitude', 'longitude', 'estimated_delay'
+                ))
+                self.incidents = np.array(rows, dtype=float).reshape(-1, 3)
+            return self.incidents
+
+
+geometry = GeometryCache()
+
+
+def load_routes(truck_ids):
+    """
+    Tournée active du jour de chaque camion (en cours de préférence, sinon
+    la prochaine planifiée), en une requête. {truck_id: RouteGeometry ou None}
+    """
+    rows = ScheduleRoute.objects.filter(
+        schedule__truck_id__in=truck_ids,
+        schedule__date=timezone.now().date(),
+        schedule__status__in=ACTIVE_SCHEDULE_STATUSES,
+        completed=False,
+    ).order_by('schedule__start_time', 'schedule_id', 'order').values_list(
+        'schedule__truck_id', 'schedule_id', 'schedule__status', 'id', 'collection_point_id',
+        'collection_point__latitude', 'collection_point__longitude',
+    )
+
+    schedules = {}
+    for truck_id, schedule_id, schedule_status, route_point_id, point_id, latitude, longitude in rows:
+        candidates = schedules.setdefault(truck_id, {})
+        candidates.setdefault((schedule_id, schedule_status), []).append(
+            (route_point_id, point_id, latitude, longitude)
+        )
+
+    routes = {truck_id: None for truck_id in truck_ids}
+    for truck_id, candidates in schedules.items():
+        # Les tournées sont triées par heure de début : la première en cours, sinon la première
+        chosen = next(
+            (stops for (_, schedule_status), stops in candidates.items() if schedule_status == 'in_progress'),
+            next(iter(candidates.values())),
+        )
+        routes[truck_id] = RouteGeometry(chosen)
+    return routes
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _incident_delays(start_lat, start_lon, end_lat, end_lon, incidents):
+    """
+    Somme des délais (minutes) des incidents à moins de INCIDENT_RADIUS_KM
+    de chaque segment départ -> arrivée. Projection équirectangulaire locale,
+    matrice segments x incidents.
+    """
+    if not len(incidents) or not len(start_lat):
+        return np.zeros(len(start_lat))
+    km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+    scale = np.cos(np.radians(start_lat))[:, None] * km_per_degree
+
+    ax, ay = start_lon[:, None] * scale, start_lat[:, None] * km_per_degree
+    bx, by = end_lon[:, None] * scale, end_lat[:, None] * km_per_degree
+    px, py = incidents[None, :, 1] * scale, incidents[None, :, 0] * km_per_degree
+
+    dx, dy = bx - ax, by - ay
+    length2 = dx ** 2 + dy ** 2
+    t = np.where(length2 > 0, ((px - ax) * dx + (py - ay) * dy) / np.where(length2 > 0, length2, 1), 0)
+    t = np.clip(t, 0, 1)
+    distance = np.hypot(ax + t * dx - px, ay + t * dy - py)
+    return (distance <= INCIDENT_RADIUS_KM) @ incidents[:, 2]
+
+
+def has_position(latitude, longitude):
+    """
+    Faux pour la position par défaut (0, 0) d'un camion qui n'a jamais émis
+    """
+    return not (latitude == 0 and longitude == 0)
+
+
+def truck_speed(truck_id, stored=None):
+    """
+    Vitesse du camion : mesurée par ce processus, sinon enregistrée
+    (Truck.speed_kmh), sinon DEFAULT_SPEED_KMH
+    """
+    observed = speeds.observed(truck_id)
+    if observed is not None:
+        return observed
+    return stored if stored is not None else DEFAULT_SPEED_KMH
+
+
+def compute_etas(positions, stored_speeds=None):
+    """
+    ETA de chaque camion : positions = {truck_id: (latitude, longitude)},
+    stored_speeds = {truck_id: Truck.speed_kmh}.
+    Retourne {truck_id: Eta ou None (pas d'arrêt restant)}
+    """
+    stored_speeds = stored_speeds or {}
+    routes = geometry.routes_for(list(positions))
+    active = [
+        truck_id for truck_id, route in routes.items()
+        if route is not None and len(route.route_point_ids)
+    ]
+    etas = {truck_id: None for truck_id in positions}
+    if not active:
+        return etas
+
+    truck_lat = np.array([positions[truck_id][0] for truck_id in active], dtype=float)
+    truck_lon = np.array([positions[truck_id][1] for truck_id in active], dtype=float)
+    stop_lat = np.array([routes[truck_id].latitudes[0] for truck_id in active])
+    stop_lon = np.array([routes[truck_id].longitudes[0] for truck_id in active])
+    speed = np.array([truck_speed(truck_id, stored_speeds.get(truck_id)) for truck_id in active])
+
+    distance = _haversine(truck_lat, truck_lon, stop_lat, stop_lon) * DETOUR_FACTOR
+    delay = _incident_delays(truck_lat, truck_lon, stop_lat, stop_lon, geometry.active_incidents())
+    minutes = np.ceil(distance / speed * 60 + delay).astype(int)
+
+    for index, truck_id in enumerate(active):
+        route = routes[truck_id]
+        etas[truck_id] = Eta(
+            truck_id=truck_id,
+            route_point_id=route.route_point_ids[0],
+            collection_point_id=route.collection_point_ids[0],
+            minutes=int(minutes[index]),
+            distance_km=round(float(distance[index]), 3),
+            remaining_km=round(float(distance[index] + route.remaining_km[0]), 3),
+            speed_kmh=round(float(speed[index]), 1),
+            incident_delay=int(delay[index]),
+        )
+    return etas
+
+
+def refresh_etas(truck_ids=None):
+    """
+    Recalculer et enregistrer Truck.estimated_time, ainsi que les vitesses
+    mesurées par ce processus (un seul UPDATE pour les valeurs modifiées).
+    truck_ids=None : toute la flotte, sauf les camions sans vitesse connue.
+    Les camions sans position reçue sont toujours ignorés.
+    Retourne {truck_id: Eta ou None} des camions recalculés
+    """
+    queryset = Truck.objects.all()
+    if truck_ids is not None:
+        queryset = queryset.filter(id__in=list(truck_ids))
+    rows = list(queryset.values_list(
+        'id', 'current_latitude', 'current_longitude', 'estimated_time', 'speed_kmh'
+    ))
+
+    stored_speeds = {truck_id: stored for truck_id, _, _, _, stored in rows}
+    observed = {
+        truck_id: round(speeds.observed(truck_id), 1)
+        for truck_id in stored_speeds if speeds.observed(truck_id) is not None
+    }
+    speed_changes = {
+        truck_id: speed for truck_id, speed in observed.items() if speed != stored_speeds[truck_id]
+    }
+    rows = [
+        row for row in rows
+        if has_position(row[1], row[2])
+        and (truck_ids is not None or row[0] in observed or row[4] is not None)
+    ]
+    etas = compute_etas(
+        {truck_id: (latitude, longitude) for truck_id, latitude, longitude, _, _ in rows}, stored_speeds
+    )
+
+    changed = {
+        truck_id: (etas[truck_id].minutes if etas[truck_id] else None)
+        for truck_id, _, _, current, _ in rows
+        if (etas[truck_id].minutes if etas[truck_id] else None) != current
+    }
+    if changed or speed_changes:
+        Truck.objects.filter(id__in=set(changed) | set(speed_changes)).update(
+            estimated_time=Case(
+                *[When(id=truck_id, then=Value(minutes)) for truck_id, minutes in changed.items()],
+                default=F('estimated_time'), output_field=IntegerField(),
+            ),
+            speed_kmh=Case(
+                *[When(id=truck_id, then=Value(speed)) for truck_id, speed in speed_changes.items()],
+                default=F('speed_kmh'), output_field=FloatField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        bump(Truck)
+    return etas
@@ -0,0 +1,167 @@
+"""
+Mises à jour groupées des équipes de terrain : arrêts de tournée complétés
+et statuts des points de collecte, en une requête et une transaction.
+
+Chaque élément est validé séparément et reçoit un code de résultat, dans
+l'ordre de la requête. Les éléments valides sont écrits en deux UPDATE
+groupés (arrêts, puis points). Compléter un arrêt vide le point de collecte
+lié (statut « vide », last_collection). Les événements d'un même point sont
+appliqués dans l'ordre chronologique ; un statut plus ancien que le dernier
+changement ou la dernière collecte connus du point n'est pas appliqué
+(« stale »). Un élément rejoué à l'identique n'est appliqué qu'une fois.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import eta, forecast, live
+from .aggregation import mark_months
+from .cache import bump
+from .models import CollectionPoint, ScheduleRoute
+from .telemetry import parse_timestamp
+
+# Nombre maximal d'éléments (arrêts + points) par requête
+MAX_ITEMS_PER_REQUEST = 1000
+
+# Codes de résultat par élément
+OK = 'ok'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+STALE = 'stale'
+
+STATUSES = dict(CollectionPoint.STATUS_CHOICES)
+
+
+class FieldworkError(ValueError):
+    """
+    Corps de requête invalide (lot entier refusé)
+    """
+
+
+def parse_stop(item):
+    """
+    {"id": 12, "completed": true, "at": "..."} -> (id, completed, at)
+    """
+    completed = item.get('completed', True)
+    if not isinstance(completed, bool):
+        raise ValueError(completed)
+    return int(item['id']), completed, parse_timestamp(item.get('at'))
+
+
+def parse_point(item):
+    """
+    {"id": 5, "status": "full", "at": "..."} -> (id, status, at)
+    """
+    if item.get('status') not in STATUSES:
+        raise ValueError(item.get('status'))
+    return int(item['id']), item['status'], parse_timestamp(item.get('at'))
+
+
+def _parse(items, parser):
+    """
+    Retourne ({position: élément analysé}, [code, ...]) ; code None : valide
+    """
+    parsed = {}
+    results = [None] * len(items)
+    for position, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError(item)
+            parsed[position] = parser(item)
+        except (KeyError, TypeError, ValueError):
+            results[position] = INVALID
+    return parsed, results
+
+
+def apply_updates(stops=(), points=(), limit=MAX_ITEMS_PER_REQUEST):
+    """
+    Appliquer un lot d'arrêts et de statuts (limit=None : sans limite de taille).
+    Retourne {'stops': [code, ...], 'points': [code, ...], 'applied': n}.
+    """
+    if not isinstance(stops, list) or not isinstance(points, list):
+        raise FieldworkError('stops et points doivent être des listes')
+    if limit is not None and len(stops) + len(points) > limit:
+        raise FieldworkError(f'Au plus {limit} éléments par requête')
+
+    stop_items, stop_results = _parse(stops, parse_stop)
+    point_items, point_results = _parse(points, parse_point)
+
+    routes = {
+        row[0]: row for row in ScheduleRoute.objects.filter(
+            id__in={item[0] for item in stop_items.values()}
+        ).values_list('id', 'completed', 'collection_point_id', 'schedule__truck_id', 'completed_at', 'schedule__date')
+    }
+    for position, (route_id, _, _) in stop_items.items():
+        if route_id not in routes:
+            stop_results[position] = NOT_FOUND
+
+    # Dernier état de chaque arrêt, dans l'ordre chronologique
+    stop_states = {}
+    for position in sorted(stop_items, key=lambda position: stop_items[position][2]):
+        if stop_results[position] is None:
+            route_id, completed, at = stop_items[position]
+            stop_states[route_id] = (completed, at)
+            stop_results[position] = OK
+
+    now = timezone.now()
+    updated_routes = []
+    # Mois des statistiques touchés : ancienne et nouvelle date de collecte, date du planning
+    months = []
+    # (date, position dans `points` ou None pour une collecte, point, statut)
+    events = []
+    for route_id, (completed, at) in stop_states.items():
+        _, was_completed, point_id, _, completed_at, schedule_date = routes[route_id]
+        if completed == was_completed:
+            # Élément rejoué (réseau instable) : déjà appliqué
+            continue
+        updated_routes.append(ScheduleRoute(
+            id=route_id, completed=completed, completed_at=at if completed else None,
+            completion_changed_at=at, updated_at=now,
+        ))
+        months += [completed_at, at if completed else None, schedule_date]
+        if completed:
+            events.append((at, None, point_id, 'empty'))
+    for position, (point_id, point_status, at) in point_items.items():
+        events.append((at, position, point_id, point_status))
+
+    collection_points = CollectionPoint.objects.in_bulk({event[2] for event in events})
+    changes = []
+    for at, position, point_id, point_status in sorted(events, key=lambda event: event[0]):
+        point = collection_points.get(point_id)
+        if point is None:
+            if position is not None:
+                point_results[position] = NOT_FOUND
+            continue
+        known = max(filter(None, (point.status_changed_at, point.last_collection)), default=None)
+        if known is not None and at == known and point.status == point_status:
+            # Élément rejoué : déjà appliqué
+            if position is not None:
+                point_results[position] = OK
+            continue
+        stale = known is not None and at < known
+        if position is not None:
+            point_results[position] = STALE if stale else OK
+            if stale:
+                continue
+        if not stale:
+            point.status = point_status
+            point.status_changed_at = at
+        # Collecte en retard : historique et last_collection, statut inchangé
+        changes.append((point, point_status, at))
+
+    with transaction.atomic():
+        if updated_routes:
+            ScheduleRoute.objects.bulk_update(updated_routes, ['completed', 'completed_at', 'completion_changed_at', 'updated_at'])
+            mark_months(months)
+        forecast.observe(changes, fields=('status',))
+        for point in {point.id: point for point, _, _ in changes}.values():
+            live.publish(live.collection_point_event(point))
+        if updated_routes:
+            eta.refresh_etas({routes[route.id][3] for route in updated_routes})
+    if updated_routes:
+        bump(ScheduleRoute)
+
+    return {
+        'stops': stop_results,
+        'points': point_results,
+        'applied': len(updated_routes) + len(changes),
+    }
@@ -0,0 +1,105 @@
+from functools import reduce
+import math
+import operator
+
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .geo import EARTH_RADIUS_KM, geohash_cover, bbox_around, is_valid_position
+
+# Rayon par défaut (km) pour une recherche "near" sans rayon explicite
+DEFAULT_RADIUS_KM = 1.0
+MAX_RADIUS_KM = 50.0
+
+
+def _parse_floats(value, count, name):
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except (TypeError, ValueError):
+        numbers = []
+    if len(numbers) != count or not all(math.isfinite(number) for number in numbers):
+        raise ValidationError({name: f'{count} nombres séparés par des virgules attendus'})
+    return numbers
+
+
+def within_bbox(queryset, min_lat, min_lon, max_lat, max_lon):
+    """
+    Restreindre un queryset de points de collecte à une boîte englobante.
+    Les préfixes geohash servent au parcours d'index, les bornes exactes
+    éliminent les points des cellules en bordure.
+    """
+    prefixes = geohash_cover(min_lat, min_lon, max_lat, max_lon)
+    cover = reduce(operator.or_, (Q(geohash__startswith=prefix) for prefix in prefixes))
+    return queryset.filter(cover).filter(
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lon, longitude__lte=max_lon,
+    )
+
+
+def distance_km(latitude, longitude):
+    """
+    Expression SQL : distance orthodromique (km) entre une position et
+    les colonnes latitude / longitude (formule de haversine, geo.haversine_km)
+    """
+    phi = math.radians(latitude)
+    half_d_phi = (Radians('latitude') - Value(phi)) / 2
+    half_d_lambda = (Radians('longitude') - Value(math.radians(longitude))) / 2
+    a = Power(Sin(half_d_phi), 2) + Value(math.cos(phi)) * Cos(Radians('latitude')) * Power(Sin(half_d_lambda), 2)
+    # Arrondis : sqrt(a) peut dépasser 1 de très peu pour des points antipodaux
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Least(Sqrt(a), Value(1.0)), output_field=FloatField())
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Restreindre un queryset de points de collecte à un cercle : boîte
+    englobante sur index, puis distance exacte dans la même requête
+    """
+    candidates = within_bbox(queryset, *bbox_around(latitude, longitude, radius_km))
+    return candidates.alias(distance_km=distance_km(latitude, longitude)).filter(distance_km__lte=radius_km)
+
+
+def nearest_point(queryset, latitude, longitude, radius_km):
+    """
+    Identifiant du point de collecte le plus proche dans le rayon, ou None
+    """
+    return within_radius(queryset, latitude, longitude, radius_km).order_by(
+        'distance_km', 'id'
+    ).values_list('id', flat=True).first()
+
+
+class SpatialFilterBackend(BaseFilterBackend):
+    """
+    Filtres spatiaux pour les points de collecte :
+    - ?bbox=min_lat,min_lon,max_lat,max_lon
+    - ?near=lat,lon&radius=km
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        bbox = request.query_params.get('bbox')
+        near = request.query_params.get('near')
+
+        if bbox:
+            min_lat, min_lon, max_lat, max_lon = _parse_floats(bbox, 4, 'bbox')
+            if (
+                not is_valid_position(min_lat, min_lon) or not is_valid_position(max_lat, max_lon)
+                or min_lat > max_lat or min_lon > max_lon
+            ):
+                raise ValidationError({'bbox': 'Boîte englobante invalide'})
+            queryset = within_bbox(queryset, min_lat, min_lon, max_lat, max_lon)
+
+        if near:
+            latitude, longitude = _parse_floats(near, 2, 'near')
+            if not is_valid_position(latitude, longitude):
+                raise ValidationError({'near': 'Position invalide'})
+            radius = request.query_params.get('radius', DEFAULT_RADIUS_KM)
+            try:
+                radius = float(radius)
+            except (TypeError, ValueError):
+                raise ValidationError({'radius': 'Rayon invalide'})
+            if not 0 < radius <= MAX_RADIUS_KM:
+                raise ValidationError({'radius': f'Le rayon doit être compris entre 0 et {MAX_RADIUS_KM} km'})
+            queryset = within_radius(queryset, latitude, longitude, radius)
+
+        return queryset
@@ -0,0 +1,292 @@
+"""
+Prévision du remplissage des points de collecte.
+
+Chaque point a une durée de remplissage (heures entre une collecte et le
+statut « plein »), exposée sous forme de taux (fill_rate, fraction par heure).
+Elle est apprise des observations :
+- les changements de statut : « à moitié plein », « plein » ou « débordement »
+  observé t heures après la dernière collecte donne une durée t / niveau ;
+- les signalements de débordement rattachés au point (niveau plein).
+
+Chaque observation met à jour la durée du point (moyenne glissante
+exponentielle, comme la vitesse des camions dans eta.py) et sa prévision au
+moment où elle est reçue. next_collection est la date prévue du remplissage,
+éventuellement passée (point en retard).
+
+Le recalcul de tous les points (commande forecast_fill) est vectorisé avec
+NumPy et n'écrit que les prévisions modifiées. forecast_fill --rebuild
+réapprend les durées depuis tout l'historique, également par tableaux.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .cache import bump
+from .models import CollectionPoint, CollectionPointStatusChange, Report
+
+# Niveau de remplissage associé à chaque statut (1 = plein)
+STATUS_LEVELS = {'empty': 0.0, 'half': 0.5, 'full': 1.0, 'overflow': 1.0}
+
+# Durée de remplissage a priori (heures) par type de point
+PRIOR_FILL_HOURS = {'bin': 48.0, 'container': 72.0, 'recycling': 120.0}
+DEFAULT_FILL_HOURS = 72.0
+# Poids d'une nouvelle observation dans la moyenne glissante de la durée
+FILL_SMOOTHING = 0.3
+# Observations trop proches de la collecte pour mesurer une durée (heures)
+MIN_ELAPSED_HOURS = 0.5
+MIN_FILL_HOURS = 2.0
+MAX_FILL_HOURS = 30 * 24.0
+
+# Historique relu par forecast_fill --rebuild
+HISTORY_DAYS = 60
+# Écart en dessous duquel une prévision n'est pas réécrite
+MIN_CHANGE = timedelta(minutes=1)
+# Points par UPDATE
+SAVE_BATCH_SIZE = 500
+
+Forecast = namedtuple('Forecast', ['collection_point_id', 'fill_rate', 'next_collection'])
+
+
+def _hours(moments):
+    return np.array([np.nan if moment is None else moment.timestamp() / 3600 for moment in moments], dtype=float)
+
+
+def _moment(hours):
+    return datetime.fromtimestamp(float(hours) * 3600, tz=dt_timezone.utc)
+
+
+def prior_hours(point_type):
+    return PRIOR_FILL_HOURS.get(point_type, DEFAULT_FILL_HOURS)
+
+
+def fill_hours(point):
+    return 1 / point.fill_rate if point.fill_rate else prior_hours(point.type)
+
+
+def learn(hours, anchor, observed_at, level):
+    """
+    Nouvelle durée de remplissage après une observation de `level` à
+    `observed_at`, le cycle ayant commencé à `anchor`
+    """
+    if anchor is None or level <= 0:
+        return hours
+    elapsed = (observed_at - anchor).total_seconds() / 3600
+    if elapsed < MIN_ELAPSED_HOURS:
+        return hours
+    duration = min(max(elapsed / level, MIN_FILL_HOURS), MAX_FILL_HOURS)
+    return FILL_SMOOTHING * duration + (1 - FILL_SMOOTHING) * hours
+
+
+def predict(hours, cycle_start, observations):
+    """
+    Date de remplissage prévue (heures) : fin du cycle au rythme appris,
+    avancée par les niveaux observés depuis la collecte.
+    observations = [(heures, niveaux), ...] en tableaux, NaN si absente.
+    """
+    full_at = cycle_start + hours
+    for observed_at, level in observations:
+        current = ~np.isnan(observed_at) & (observed_at >= cycle_start) & (level > 0)
+        full_at = np.where(current, np.minimum(full_at, observed_at + (1 - level) * hours), full_at)
+    return full_at
+
+
+def _last_overflows(point_ids=None):
+    """
+    {point_id: date du dernier débordement signalé depuis la dernière collecte}
+    """
+    reports = Report.objects.filter(
+        type='overflow', collection_point__isnull=False, duplicate_of__isnull=True,
+        created_at__gt=F('collection_point__last_collection'),
+    )
+    if point_ids is not None:
+        reports = reports.filter(collection_point_id__in=list(point_ids))
+    return dict(reports.values_list('collection_point_id').annotate(last=Max('created_at')).order_by())
+
+
+def _predict_rows(rows, overflows):
+    """
+    rows = [(id, type, status, fill_rate, last_collection, created_at, status_changed_at), ...]
+    """
+    hours = np.array([1 / row[3] if row[3] else prior_hours(row[1]) for row in rows], dtype=float)
+    full_at = predict(
+        hours,
+        _hours([row[4] or row[5] for row in rows]),
+        [
+            # Statut sans date de changement (antérieur à l'historique) : date de création
+            (_hours([row[6] or row[5] for row in rows]), np.array([STATUS_LEVELS.get(row[2], 0.0) for row in rows])),
+            (_hours([overflows.get(row[0]) for row in rows]), np.ones(len(rows))),
+        ],
+    )
+    return [
+        Forecast(collection_point_id=row[0], fill_rate=round(1 / hours[index], 5), next_collection=_moment(full_at[index]))
+        for index, row in enumerate(rows)
+    ]
+
+
+def forecast_points(point_ids=None, dry_run=False):
+    """
+    Recalculer next_collection (point_ids=None : tous les points).
+    Seules les prévisions modifiées sont enregistrées. Retourne [Forecast, ...].
+    """
+    points = CollectionPoint.objects.all()
+    if point_ids is not None:
+        points = points.filter(id__in=list(point_ids))
+    rows = list(points.order_by('id').values_list(
+        'id', 'type', 'status', 'fill_rate', 'last_collection', 'created_at',
+        'status_changed_at', 'next_collection',
+    ))
+    if not rows:
+        return []
+    forecasts = _predict_rows(rows, _last_overflows(point_ids))
+    if not dry_run:
+        save_forecasts([
+            result for result, row in zip(forecasts, rows)
+            if row[7] is None or abs(row[7] - result.next_collection) >= MIN_CHANGE
+        ])
+    return forecasts
+
+
+def save_forecasts(forecasts, fields=('next_collection',)):
+    """
+    Enregistrer les prévisions (bulk_update par lots, une transaction)
+    """
+    if not forecasts:
+        return 0
+    now = timezone.now()
+    points = [
+        CollectionPoint(
+            id=result.collection_point_id, fill_rate=result.fill_rate,
+            next_collection=result.next_collection, updated_at=now,
+        )
+        for result in forecasts
+    ]
+    with transaction.atomic():
+        CollectionPoint.objects.bulk_update(points, list(fields) + ['updated_at'], batch_size=SAVE_BATCH_SIZE)
+    bump(CollectionPoint)
+    return len(points)
+
+
+def observe(changes, fields=()):
+    """
+    Enregistrer des changements de statut déjà appliqués aux points :
+    [(point, status, changed_at), ...], dans l'ordre chronologique. Un
+    passage à « vide » (collecte) avance last_collection. L'historique, la
+    durée apprise et la prévision de chaque point sont mis à jour, instances
+    comprises ; `fields` : autres champs modifiés, écrits dans le même UPDATE.
+    """
+    if not changes:
+        return
+    CollectionPointStatusChange.objects.bulk_create([
+        CollectionPointStatusChange(collection_point_id=point.id, status=point_status, changed_at=changed_at)
+        for point, point_status, changed_at in changes
+    ])
+    points = {}
+    for point, point_status, changed_at in changes:
+        if point_status == 'empty':
+            # Collecte : début d'un nouveau cycle, rien à apprendre
+            if point.last_collection is None or changed_at > point.last_collection:
+                point.last_collection = changed_at
+        else:
+            hours = learn(
+                fill_hours(point), point.last_collection or point.created_at,
+                changed_at, STATUS_LEVELS.get(point_status, 0.0),
+            )
+            point.fill_rate = round(1 / hours, 5)
+        # Un changement reçu en retard ne remplace pas un statut plus récent
+        if point.status_changed_at is None or changed_at >= point.status_changed_at:
+            point.status_changed_at = changed_at
+        points[point.id] = point
+    _refresh(
+        list(points.values()),
+        ['fill_rate', 'last_collection', 'status_changed_at', 'next_collection', *fields],
+    )
+
+
+def observe_report(report):
+    """
+    Prendre en compte un signalement de débordement rattaché à un point
+    """
+    point = report.collection_point
+    hours = learn(fill_hours(point), point.last_collection or point.created_at, report.created_at, 1.0)
+    point.fill_rate = round(1 / hours, 5)
+    _refresh([point], ['fill_rate', 'next_collection'])
+
+
+def _refresh(points, fields):
+    forecasts = _predict_rows(
+        [
+            (point.id, point.type, point.status, point.fill_rate, point.last_collection,
+             point.created_at, point.status_changed_at)
+            for point in points
+        ],
+        _last_overflows([point.id for point in points]),
+    )
+    now = timezone.now()
+    for point, result in zip(points, forecasts):
+        point.next_collection = result.next_collection
+        point.updated_at = now
+    CollectionPoint.objects.bulk_update(points, list(fields) + ['updated_at'], batch_size=SAVE_BATCH_SIZE)
+    bump(CollectionPoint)
+
+
+def learn_history(point_ids=None, dry_run=False):
+    """
+    Réapprendre la durée de remplissage depuis l'historique (HISTORY_DAYS),
+    en rejouant la moyenne glissante de tous les points en une fois :
+    durée = (1 - a)^n * a priori + somme des a * (1 - a)^(n - k) * durée_k.
+    Retourne {point_id: fill_rate}.
+    """
+    since = timezone.now() - timedelta(days=HISTORY_DAYS)
+    points = CollectionPoint.objects.all()
+    changes = CollectionPointStatusChange.objects.filter(changed_at__gte=since)
+    reports = Report.objects.filter(
+        type='overflow', created_at__gte=since, collection_point__isnull=False, duplicate_of__isnull=True
+    )
+    if point_ids is not None:
+        points = points.filter(id__in=list(point_ids))
+        changes = changes.filter(collection_point_id__in=list(point_ids))
+        reports = reports.filter(collection_point_id__in=list(point_ids))
+    rows = list(points.order_by('id').values_list('id', 'type'))
+    if not rows:
+        return {}
+    position = {row[0]: index for index, row in enumerate(rows)}
+    changes = list(changes.values_list('collection_point_id', 'changed_at', 'status'))
+    reports = list(reports.values_list('collection_point_id', 'created_at'))
+
+    point_index = np.array([position[row[0]] for row in changes] + [position[row[0]] for row in reports], dtype=np.int64)
+    moments = np.concatenate([_hours([row[1] for row in changes]), _hours([row[1] for row in reports])])
+    levels = np.array([STATUS_LEVELS.get(row[2], 0.0) for row in changes] + [1.0] * len(reports))
+    collected = np.array([row[2] == 'empty' for row in changes] + [False] * len(reports), dtype=bool)
+
+    # Tri par point puis par date, la collecte d'abord à date égale
+    order = np.lexsort((~collected, moments, point_index))
+    point_index, moments, levels, collected = point_index[order], moments[order], levels[order], collected[order]
+
+    # Dernière collecte précédant chaque observation, dans le même point
+    last = np.maximum.accumulate(np.where(collected, np.arange(len(moments)), -1))
+    anchored = (last >= 0) & (point_index[np.maximum(last, 0)] == point_index)
+    elapsed = moments - moments[np.maximum(last, 0)]
+    sample = anchored & ~collected & (levels > 0) & (elapsed >= MIN_ELAPSED_HOURS)
+
+    sample_points = point_index[sample]
+    durations = np.clip(elapsed[sample] / levels[sample], MIN_FILL_HOURS, MAX_FILL_HOURS)
+    counts = np.bincount(sample_points, minlength=len(rows))
+    # Rang de chaque observation en partant de la plus récente de son point
+    starts = np.cumsum(counts) - counts
+    rank = counts[sample_points] - 1 - (np.arange(len(sample_points)) - starts[sample_points])
+    weighted = np.bincount(
+        sample_points, FILL_SMOOTHING * (1 - FILL_SMOOTHING) ** rank * durations, minlength=len(rows)
+    )
+    prior = np.array([prior_hours(row[1]) for row in rows], dtype=float)
+    hours = (1 - FILL_SMOOTHING) ** counts * prior + weighted
+
+    rates = {row[0]: round(1 / hours[index], 5) for index, row in enumerate(rows)}
+    if not dry_run:
+        save_forecasts(
+            [Forecast(point_id, rate, None) for point_id, rate in rates.items()], fields=('fill_rate',)
+        )
+    return rates
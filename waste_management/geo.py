@@ -0,0 +1,123 @@
+"""
+Utilitaires géographiques : geohash, distances et boîtes englobantes
+"""
+import math
+
+EARTH_RADIUS_KM = 6371.0
+
+# Précision stockée sur les points de collecte (~5 m x 5 m)
+GEOHASH_PRECISION = 9
+
+# Nombre maximal de préfixes utilisés pour couvrir une zone de recherche
+MAX_COVER_CELLS = 16
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    Encoder une position en geohash
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    char_index = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                char_index = (char_index << 1) | 1
+                lon_range[0] = mid
+            else:
+                char_index <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                char_index = (char_index << 1) | 1
+                lat_range[0] = mid
+            else:
+                char_index <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(_BASE32[char_index])
+            bit = 0
+            char_index = 0
+
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """
+    Taille (hauteur en latitude, largeur en longitude) d'une cellule geohash
+    """
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def geohash_cover(min_lat, min_lon, max_lat, max_lon, max_cells=MAX_COVER_CELLS):
+    """
+    Retourner les préfixes geohash couvrant une boîte englobante.
+    La précision la plus fine donnant au plus max_cells cellules est choisie,
+    ce qui borne le nombre de parcours d'index quelle que soit la zone.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lon = geohash_cell_size(precision)
+        rows = math.floor(max_lat / cell_lat) - math.floor(min_lat / cell_lat) + 1
+        cols = math.floor(max_lon / cell_lon) - math.floor(min_lon / cell_lon) + 1
+        if rows * cols <= max_cells:
+            break
+
+    start_lat = (math.floor(min_lat / cell_lat) + 0.5) * cell_lat
+    start_lon = (math.floor(min_lon / cell_lon) + 0.5) * cell_lon
+    prefixes = set()
+    for row in range(rows):
+        for col in range(cols):
+            lat = min(start_lat + row * cell_lat, 90.0)
+            lon = min(start_lon + col * cell_lon, 180.0)
+            prefixes.add(encode_geohash(lat, lon, precision))
+    return sorted(prefixes)
+
+
+def is_valid_position(latitude, longitude):
+    """
+    Latitude et longitude finies et dans leurs bornes (NaN et infini exclus)
+    """
+    return (
+        math.isfinite(latitude) and math.isfinite(longitude)
+        and -90 <= latitude <= 90 and -180 <= longitude <= 180
+    )
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Distance orthodromique en kilomètres entre deux positions
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bbox_around(latitude, longitude, radius_km):
+    """
+    Boîte englobante (min_lat, min_lon, max_lat, max_lon) d'un cercle
+    """
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    d_lon = math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat))
+    return (
+        max(latitude - d_lat, -90.0),
+        max(longitude - d_lon, -180.0),
+        min(latitude + d_lat, 90.0),
+        min(longitude + d_lon, 180.0),
+    )
@@ -0,0 +1,483 @@
+"""
+Diffusion en temps réel des positions de camions et des statuts des points
+de collecte (Server-Sent Events, GET /api/live/ servi par dechets_ko.asgi).
+
+- Les vues publient un événement après le commit de leur écriture.
+- Le broker transmet les événements aux hubs abonnés. Le broker par défaut
+  est en mémoire du processus : API et flux doivent alors être servis par le
+  même processus ASGI (développement). DatabaseBroker passe par la base :
+  l'API tourne en WSGI avec plusieurs workers et /api/live/ dans un
+  processus ASGI séparé (voir render.yaml). Un broker externe (Redis, ...)
+  se branche via settings.LIVE_BROKER, avec les mêmes méthodes
+  publish/publish_many/subscribe/unsubscribe et la propriété active.
+- Le hub regroupe les événements par objet et par tick (une seule mise à jour
+  par camion et par tick), puis les répartit entre les abonnés : filtre par
+  zone (bbox) vectorisé avec NumPy, filtre par équipe par index.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Intervalle de regroupement des événements (secondes)
+TICK_SECONDS = 0.25
+# Messages en attente par abonné ; au-delà, les plus anciens sont abandonnés
+SUBSCRIBER_QUEUE_SIZE = 64
+# Commentaire SSE envoyé en l'absence d'événement, pour garder la connexion
+HEARTBEAT_SECONDS = 15
+# Durée maximale d'un flux : le client se reconnecte seul (retry SSE). Borne
+# les abonnements dont la déconnexion n'a pas été signalée (proxy, ...)
+STREAM_MAX_SECONDS = 30 * 60
+# Chemins servis en flux, surveillés par DisconnectMiddleware
+STREAM_PATHS = ('/api/live/',)
+
+# DatabaseBroker : marge de relecture pour les événements validés dans le
+# désordre, durée de conservation, présence des abonnés dans le cache partagé
+EVENT_LAG_SECONDS = 2
+EVENT_RETENTION_SECONDS = 60
+LISTENERS_KEY = 'live:listeners'
+LISTENERS_TTL_SECONDS = 30
+ACTIVE_CHECK_SECONDS = 5
+
+
+class InProcessBroker:
+    """
+    Broker en mémoire : les événements publiés sont remis aux abonnés du processus
+    """
+
+    def __init__(self):
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    @property
+    def active(self):
+        return bool(self.listeners)
+
+    def publish(self, event):
+        for listener in list(self.listeners):
+            listener(event)
+
+    def publish_many(self, events):
+        for event in events:
+            self.publish(event)
+
+    def subscribe(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+
+class DatabaseBroker(InProcessBroker):
+    """
+    Broker partagé par la base : les événements publiés sont enregistrés
+    (LiveEvent) et relus toutes les TICK_SECONDS par un thread du processus
+    qui a des abonnés. La présence d'abonnés est signalée dans le cache
+    partagé : sans abonné, les écritures ne publient rien.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.poller = None
+        self.remote_active = False
+        self.checked_at = None
+
+    @property
+    def active(self):
+        now = time.monotonic()
+        if self.checked_at is None or now - self.checked_at >= ACTIVE_CHECK_SECONDS:
+            self.remote_active = bool(cache.get(LISTENERS_KEY))
+            self.checked_at = now
+        return bool(self.listeners) or self.remote_active
+
+    def publish(self, event):
+        self.publish_many([event])
+
+    def publish_many(self, events):
+        from .models import LiveEvent
+        LiveEvent.objects.bulk_create([LiveEvent(payload=event) for event in events])
+
+    def subscribe(self, listener):
+        super().subscribe(listener)
+        with self.lock:
+            if self.poller is None:
+                self.poller = threading.Thread(target=self.poll, name='live-broker', daemon=True)
+                self.poller.start()
+
+    def poll(self):
+        """
+        Relire les événements récents tant qu'il reste des abonnés. Les
+        identifiants ne sont pas validés dans l'ordre : relecture par date avec
+        une marge (EVENT_LAG_SECONDS), les événements déjà remis sont ignorés.
+        """
+        from .models import LiveEvent
+        since = timezone.now()
+        seen = {}
+        last_purge = time.monotonic()
+        try:
+            while True:
+                with self.lock:
+                    if not self.listeners:
+                        self.poller = None
+                        return
+                cache.set(LISTENERS_KEY, True, LISTENERS_TTL_SECONDS)
+                horizon = since - timedelta(seconds=EVENT_LAG_SECONDS)
+                rows = LiveEvent.objects.filter(created_at__gte=horizon).order_by('created_at', 'id').values_list(
+                    'id', 'payload', 'created_at'
+                )
+                for event_id, payload, created_at in rows:
+                    if event_id not in seen:
+                        seen[event_id] = created_at
+                        for listener in list(self.listeners):
+                            listener(payload)
+                    since = max(since, created_at)
+                seen = {event_id: at for event_id, at in seen.items() if at >= horizon}
+
+                if time.monotonic() - last_purge >= EVENT_RETENTION_SECONDS:
+                    LiveEvent.objects.filter(
+                        created_at__lt=timezone.now() - timedelta(seconds=EVENT_RETENTION_SECONDS)
+                    ).delete()
+                    last_purge = time.monotonic()
+                time.sleep(TICK_SECONDS)
+        finally:
+            close_old_connections()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'LIVE_BROKER', 'waste_management.live.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(event):
+    """
+    Publier un événement une fois la transaction en cours validée
+    """
+    broker = get_broker()
+    if broker.active:
+        transaction.on_commit(lambda: broker.publish(event))
+
+
+def publish_many(events):
+    """
+    Publier un lot d'événements une fois la transaction en cours validée
+    """
+    broker = get_broker()
+    if events and broker.active:
+        transaction.on_commit(lambda: broker.publish_many(events))
+
+
+def truck_event(truck, team_id=None):
+    return {
+        'type': 'truck',
+        'id': truck.id,
+        'team_id': team_id if team_id is not None else getattr(truck.driver, 'team_id', None),
+        'latitude': truck.current_latitude,
+        'longitude': truck.current_longitude,
+        'status': truck.status,
+        'estimated_time': truck.estimated_time,
+        'at': timezone.now().isoformat(),
+    }
+
+
+def collection_point_event(point):
+    return {
+        'type': 'collection_point',
+        'id': point.id,
+        'latitude': point.latitude,
+        'longitude': point.longitude,
+        'status': point.status,
+        'last_collection': point.last_collection.isoformat() if point.last_collection else None,
+        'at': timezone.now().isoformat(),
+    }
+
+
+def publish_positions(latest):
+    """
+    Publier les positions d'un lot de télémétrie : {truck_id: (lat, lon, timestamp)}
+    """
+    if not latest or not get_broker().active:
+        return
+    from .models import Truck
+    at = timezone.now().isoformat()
+    events = []
+    for truck_id, team_id, truck_status, estimated_time in Truck.objects.filter(
+        id__in=list(latest)
+    ).values_list('id', 'driver__team_id', 'status', 'estimated_time'):
+        latitude, longitude, _ = latest[truck_id]
+        events.append({
+            'type': 'truck', 'id': truck_id, 'team_id': team_id,
+            'latitude': latitude, 'longitude': longitude,
+            'status': truck_status, 'estimated_time': estimated_time, 'at': at,
+        })
+    publish_many(events)
+
+
+class Subscriber:
+    """
+    Connexion SSE abonnée à une zone, une équipe, ou à tout
+    """
+
+    def __init__(self, bbox=None, team_id=None, point_ids=()):
+        if bbox is not None:
+            self.channel = ('bbox', tuple(bbox))
+        elif team_id is not None:
+            self.channel = ('team', team_id, frozenset(point_ids))
+        else:
+            self.channel = ('all',)
+        self.messages = deque(maxlen=SUBSCRIBER_QUEUE_SIZE)
+        self.waiter = None
+        self.dropped = 0
+
+    def push(self, message):
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped += 1
+        self.messages.append(message)
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def next_message(self, timeout):
+        """
+        Prochain message, ou None si rien n'arrive avant `timeout` secondes
+        """
+        if not self.messages:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(self.waiter, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self.waiter = None
+        return self.messages.popleft()
+
+
+class Hub:
+    """
+    Regroupement par tick et répartition des événements dans une boucle asyncio.
+    Les abonnés à une même zone ou une même équipe partagent un canal : la
+    sélection et l'encodage sont faits une fois par canal, pas par abonné.
+    """
+
+    def __init__(self, loop, broker):
+        self.loop = loop
+        self.broker = broker
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.channels = {}
+        self.boxes = None
+        self.task = None
+        self.last_fanout_ms = 0.0
+
+    def submit(self, event):
+        # Appelé depuis n'importe quel thread : seul le dernier état de chaque objet est gardé
+        key = (event['type'], event['id'])
+        with self.pending_lock:
+            if key in self.pending:
+                self.pending[key].update(event)
+            else:
+                self.pending[key] = dict(event)
+
+    def add(self, subscriber):
+        self.channels.setdefault(subscriber.channel, set()).add(subscriber)
+        self.boxes = None
+        if self.task is None:
+            self.broker.subscribe(self.submit)
+            self.task = self.loop.create_task(self.run())
+
+    def remove(self, subscriber):
+        members = self.channels.get(subscriber.channel)
+        if members is not None:
+            members.discard(subscriber)
+            if not members:
+                del self.channels[subscriber.channel]
+                self.boxes = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(TICK_SECONDS)
+            if not self.channels:
+                # Plus d'abonné : désabonnement du broker, relancé par le prochain add()
+                self.broker.unsubscribe(self.submit)
+                self.task = None
+                with self.pending_lock:
+                    self.pending = {}
+                return
+            with self.pending_lock:
+                events, self.pending = list(self.pending.values()), {}
+            if events:
+                started = time.perf_counter()
+                self.fan_out(events)
+                self.last_fanout_ms = (time.perf_counter() - started) * 1000
+
+    def index(self):
+        """
+        Canaux de zone (matrice des boîtes) et index équipe / point -> canaux
+        """
+        if self.boxes is None:
+            zones = [channel for channel in self.channels if channel[0] == 'bbox']
+            self.zones = zones
+            self.boxes = np.array([channel[1] for channel in zones], dtype=float).reshape(-1, 4)
+            self.teams = {}
+            self.points = {}
+            for channel in self.channels:
+                if channel[0] == 'team':
+                    self.teams.setdefault(channel[1], []).append(channel)
+                    for point_id in channel[2]:
+                        self.points.setdefault(point_id, []).append(channel)
+        return self.zones, self.boxes, self.teams, self.points
+
+    def fan_out(self, events):
+        encoded = [json.dumps(event, separators=(',', ':')) for event in events]
+        zones, boxes, teams, points = self.index()
+        selected = {}
+
+        # Zones : matrice canaux x événements calculée en une fois
+        if zones:
+            latitudes = np.array([_coordinate(event['latitude']) for event in events])
+            longitudes = np.array([_coordinate(event['longitude']) for event in events])
+            inside = (
+                (latitudes[None, :] >= boxes[:, 0:1]) & (latitudes[None, :] <= boxes[:, 2:3])
+                & (longitudes[None, :] >= boxes[:, 1:2]) & (longitudes[None, :] <= boxes[:, 3:4])
+            )
+            for row, channel in enumerate(zones):
+                indexes = np.flatnonzero(inside[row])
+                if len(indexes):
+                    selected[channel] = indexes.tolist()
+
+        # Équipes : camions de l'équipe et points de ses tournées du jour,
+        # regroupés une fois par équipe puis partagés entre ses canaux
+        if teams:
+            trucks_by_team = {}
+            for position, event in enumerate(events):
+                if event['type'] == 'truck':
+                    trucks_by_team.setdefault(event.get('team_id'), []).append(position)
+                else:
+                    for channel in points.get(event['id'], ()):
+                        selected.setdefault(channel, []).append(position)
+            for team_id, positions in trucks_by_team.items():
+                for channel in teams.get(team_id, ()):
+                    indexes = selected.setdefault(channel, [])
+                    indexes.extend(positions)
+                    if len(indexes) > len(positions):
+                        indexes.sort()
+
+        if ('all',) in self.channels:
+            selected[('all',)] = range(len(events))
+
+        for channel, indexes in selected.items():
+            message = '[' + ','.join([encoded[position] for position in indexes]) + ']'
+            for subscriber in self.channels[channel]:
+                subscriber.push(message)
+
+
+def _coordinate(value):
+    return np.nan if value is None else float(value)
+
+
+_hubs = {}
+
+
+def get_hub():
+    """
+    Hub de la boucle asyncio courante
+    """
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = Hub(loop, get_broker())
+    return hub
+
+
+async def stream(subscriber, max_seconds=STREAM_MAX_SECONDS):
+    """
+    Flux SSE d'un abonné : un événement 'update' par tick contenant des
+    changements, un commentaire toutes les HEARTBEAT_SECONDS sinon. Le flux
+    se termine après `max_seconds` ; la déconnexion du client l'interrompt
+    (DisconnectMiddleware). Dans tous les cas l'abonné est retiré du hub.
+    """
+    hub = get_hub()
+    hub.add(subscriber)
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            message = await subscriber.next_message(min(HEARTBEAT_SECONDS, remaining))
+            if message is None:
+                yield ': ping\n\n'
+            else:
+                yield f'event: update\ndata: {message}\n\n'
+    finally:
+        hub.remove(subscriber)
+
+
+class DisconnectMiddleware:
+    """
+    Application ASGI qui interrompt une réponse en flux quand le client se
+    déconnecte. Django 4.2 ne lit plus les messages du client une fois le
+    corps de la requête reçu, et le serveur ignore les envois vers une
+    connexion fermée : sans cela, le générateur du flux et son abonnement
+    au hub resteraient actifs indéfiniment.
+    """
+
+    def __init__(self, app, paths=STREAM_PATHS):
+        self.app = app
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(self.paths):
+            return await self.app(scope, receive, send)
+
+        body_received = asyncio.Event()
+
+        async def receive_body():
+            message = await receive()
+            if message['type'] != 'http.request' or not message.get('more_body'):
+                body_received.set()
+            return message
+
+        response = asyncio.ensure_future(self.app(scope, receive_body, send))
+        body = asyncio.ensure_future(body_received.wait())
+        await asyncio.wait({response, body}, return_when=asyncio.FIRST_COMPLETED)
+        body.cancel()
+
+        if not response.done():
+            disconnect = asyncio.ensure_future(self._wait_disconnect(receive))
+            await asyncio.wait({response, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if not response.done():
+                # Annulation : CancelledError dans le générateur, son finally se désabonne
+                response.cancel()
+            disconnect.cancel()
+            await asyncio.gather(response, disconnect, return_exceptions=True)
+            if response.cancelled():
+                return
+        response.result()
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
@@ -0,0 +1,258 @@
+import json
+import logging
+import platform
+import time
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, setup_test_environment, teardown_test_environment
+)
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from waste_management.cache import get_response_cache
+from waste_management.synthetic import seed_city
+from waste_management.urls import router
+
+User = get_user_model()
+
+# Nombre maximal de requêtes SQL par endpoint, indépendant du volume de données.
+# Les endpoints en cache ou avec ETag lisent une fois les versions partagées
+# (une requête sur la table du cache Django).
+QUERY_BUDGETS = {
+    'teams-list': 3,
+    'teams-detail': 2,
+    'collection-points-list': 3,
+    'collection-points-detail': 2,
+    'trucks-list': 5,
+    'trucks-detail': 4,
+    'reports-list': 3,
+    'reports-detail': 2,
+    'schedules-list': 4,
+    'schedules-detail': 3,
+    'schedule-routes-list': 2,
+    'schedule-routes-detail': 1,
+    'incidents-list': 3,
+    'incidents-detail': 2,
+    'statistics-list': 1,
+    'statistics-detail': 1,
+    'users-list': 2,
+    'users-detail': 1,
+    'auth-profile': 0,
+    'auth-login': 3,
+}
+
+# Listes filtrées mesurées en plus des listes brutes : (préfixe, paramètres)
+FILTERED_LISTS = [
+    ('reports', 'status=pending'),
+    ('reports', 'priority=urgent'),
+    ('reports', 'type=overflow&status=pending'),
+    ('incidents', 'status=active'),
+    ('schedules', 'status=planned'),
+    ('schedules', 'date={today}'),
+    ('schedule-routes', 'completed=false'),
+    ('collection-points', 'status=full&type=bin'),
+    ('trucks', 'status=available'),
+]
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la latence (p50/p95), le nombre de requêtes SQL et la taille "
+        "des réponses de chaque endpoint sur une ville synthétique"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=500)
+        parser.add_argument('--trucks', type=int, default=50)
+        parser.add_argument('--reports', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=7, help='Jours de plannings générés')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--label', default='', help='Nom de la branche ou de la version mesurée')
+        parser.add_argument('--output', default='benchmark.json', help='Fichier JSON de résultats')
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help="Enregistrer le plan d'exécution des requêtes et signaler les parcours complets de table",
+        )
+        parser.add_argument(
+            '--cached',
+            action='store_true',
+            help='Garder le cache de réponses entre les appels (par défaut, chaque appel est mesuré à froid)',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help=(
+                'Échouer si un endpoint dépasse son budget de requêtes SQL ou, avec --explain, '
+                'si une liste filtrée parcourt une table entière'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        # Les requêtes SQL sont capturées : ne pas les journaliser une à une
+        logging.disable(logging.WARNING)
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            counts = seed_city(
+                points=options['points'],
+                trucks=options['trucks'],
+                reports=options['reports'],
+                days=options['days'],
+                seed=options['seed'],
+            )
+            results = self.run_benchmarks(options['iterations'], options['explain'], options['cached'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            logging.disable(logging.NOTSET)
+
+        report = {
+            'label': options['label'],
+            'created_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'scale': counts,
+            'seed': options['seed'],
+            'iterations': options['iterations'],
+            'cached': options['cached'],
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+
+        violations = []
+        for result in results:
+            budget = QUERY_BUDGETS.get(result['name'])
+            flag = ''
+            if budget is not None and result['queries'] > budget:
+                flag = f'  > budget {budget}'
+                violations.append(result['name'])
+            if result.get('full_scans'):
+                flag += f"  full scan: {', '.join(result['full_scans'])}"
+                # Les listes filtrées doivent rester sur index (validateurs compris)
+                if '?' in result['name'] and result['name'] not in violations:
+                    violations.append(result['name'])
+            self.stdout.write(
+                f"{result['name']:<40} {result['status']:>3} "
+                f"p50={result['p50_ms']:>8.2f}ms p95={result['p95_ms']:>8.2f}ms "
+                f"queries={result['queries']:>3} bytes={result['bytes']:>8}{flag}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Résultats enregistrés dans {options['output']}"))
+
+        if options['check'] and violations:
+            raise CommandError(f"Budget de requêtes ou index dépassé : {', '.join(violations)}")
+
+    def targets(self, user):
+        """
+        Endpoints mesurés : liste et détail de chaque route du routeur, plus l'authentification
+        """
+        targets = []
+        basenames = {prefix: basename for prefix, _, basename in router.registry}
+        today = timezone.now().date().isoformat()
+        for prefix, viewset, basename in router.registry:
+            targets.append((f'{prefix}-list', 'get', reverse(f'{basename}-list'), None))
+            instance = viewset.queryset.model.objects.order_by('pk').first()
+            if instance is not None:
+                targets.append((
+                    f'{prefix}-detail', 'get',
+                    reverse(f'{basename}-detail', kwargs={'pk': instance.pk}), None
+                ))
+        for prefix, params in FILTERED_LISTS:
+            params = params.format(today=today)
+            targets.append((
+                f'{prefix}-list?{params}', 'get', f"{reverse(f'{basenames[prefix]}-list')}?{params}", None
+            ))
+        targets.append(('auth-profile', 'get', reverse('profile'), None))
+        targets.append(('auth-login', 'post', reverse('login'), {
+            'email': user.email, 'password': BENCHMARK_PASSWORD
+        }))
+        return targets
+
+    def explain(self, sql):
+        """
+        Plan d'exécution d'une requête SELECT et tables parcourues entièrement
+        """
+        vendor = connection.vendor
+        prefix = 'EXPLAIN QUERY PLAN ' if vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            rows = cursor.fetchall()
+
+        if vendor == 'sqlite':
+            plan = [row[-1] for row in rows]
+            full_scans = [
+                line.split()[1] for line in plan
+                if line.startswith('SCAN ') and 'USING' not in line and 'CONSTANT' not in line
+            ]
+        else:
+            plan = [row[0] for row in rows]
+            full_scans = [
+                line.split(' on ')[1].split()[0].strip('"') for line in plan
+                if 'Seq Scan on ' in line
+            ]
+        return plan, full_scans
+
+    def run_benchmarks(self, iterations, explain=False, cached=False):
+        user = User.objects.create_user(
+            username='benchmark', email='benchmark@dechetsko.com',
+            password=BENCHMARK_PASSWORD, role='coordinator'
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response_cache = get_response_cache()
+        results = []
+        for name, method, url, data in self.targets(user):
+            request = getattr(client, method)
+            # Premier appel hors mesure (caches, calculs initiaux)
+            request(url, data, format='json')
+
+            timings = []
+            for _ in range(iterations):
+                if not cached:
+                    response_cache.backend.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = request(url, data, format='json')
+                    timings.append((time.perf_counter() - started) * 1000)
+
+            results.append({
+                'name': name,
+                'method': method.upper(),
+                'url': url,
+                'status': response.status_code,
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'queries': len(queries.captured_queries),
+                'bytes': len(response.content),
+            })
+            if explain:
+                plans = []
+                full_scans = []
+                for query in queries.captured_queries:
+                    if not query['sql'].lstrip().upper().startswith('SELECT'):
+                        continue
+                    plan, scans = self.explain(query['sql'])
+                    plans.append({'sql': query['sql'], 'plan': plan})
+                    full_scans.extend(table for table in scans if table not in full_scans)
+                results[-1]['plans'] = plans
+                results[-1]['full_scans'] = full_scans
+        return results
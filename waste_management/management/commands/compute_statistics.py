@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from waste_management.aggregation import refresh_statistics
+
+
+class Command(BaseCommand):
+    help = 'Calcule les statistiques des périodes modifiées depuis le dernier calcul'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recalculer toutes les périodes',
+        )
+
+    def handle(self, *args, **options):
+        periods = refresh_statistics(full=options['full'])
+        if periods:
+            self.stdout.write(self.style.SUCCESS(f"Statistiques mises à jour : {', '.join(periods)}"))
+        else:
+            self.stdout.write('Aucune période à recalculer.')
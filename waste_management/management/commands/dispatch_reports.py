@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from waste_management.dispatch import assign_backlog
+
+
+class Command(BaseCommand):
+    help = "Affecte aux équipes tous les signalements en attente sans équipe"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Nombre maximum de signalements')
+        parser.add_argument('--dry-run', action='store_true', help='Calculer sans enregistrer')
+
+    def handle(self, *args, **options):
+        if options['limit'] is not None and options['limit'] < 0:
+            raise CommandError('--limit doit être positif ou nul')
+        started = time.perf_counter()
+        assignments = assign_backlog(limit=options['limit'], dry_run=options['dry_run'])
+        elapsed = (time.perf_counter() - started) * 1000
+        teams = len({team.team_id for _, team in assignments})
+        verb = 'seraient affectés' if options['dry_run'] else 'affectés'
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(assignments)} signalements {verb} à {teams} équipes en {elapsed:.1f} ms"
+        ))
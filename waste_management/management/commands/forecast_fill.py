@@ -0,0 +1,30 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from waste_management.forecast import forecast_points, learn_history
+
+
+class Command(BaseCommand):
+    help = "Prévoit le remplissage des points de collecte et met à jour next_collection"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Réapprendre les taux de remplissage depuis tout l'historique des statuts"
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Calculer sans enregistrer')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['rebuild']:
+            rates = learn_history(dry_run=options['dry_run'])
+            self.stdout.write(f"{len(rates)} taux de remplissage réappris")
+        forecasts = forecast_points(dry_run=options['dry_run'])
+        elapsed = (time.perf_counter() - started) * 1000
+        horizon = timezone.now() + timedelta(days=1)
+        due = sum(1 for result in forecasts if result.next_collection <= horizon)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(forecasts)} points prévus en {elapsed:.1f} ms, {due} à collecter dans les 24 h"
+        ))
@@ -0,0 +1,38 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from waste_management import planner
+
+
+class Command(BaseCommand):
+    help = "Génère les plannings d'une journée à partir des points à collecter et des camions disponibles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Date (AAAA-MM-JJ), aujourd\'hui par défaut')
+        parser.add_argument('--start', default=planner.DEFAULT_START_TIME.strftime('%H:%M'), help='Début (HH:MM)')
+        parser.add_argument('--end', default=planner.DEFAULT_END_TIME.strftime('%H:%M'), help='Fin (HH:MM)')
+        parser.add_argument('--dry-run', action='store_true', help='Calculer sans enregistrer')
+
+    def handle(self, *args, **options):
+        try:
+            day = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else timezone.now().date()
+            start_time = datetime.strptime(options['start'], '%H:%M').time()
+            end_time = datetime.strptime(options['end'], '%H:%M').time()
+        except ValueError as error:
+            raise CommandError(f"Paramètre invalide : {error}")
+
+        started = time.perf_counter()
+        plan = planner.plan_day(day, start_time, end_time)
+        planned_at = time.perf_counter()
+        if not options['dry_run']:
+            planner.save_plan(plan)
+        finished = time.perf_counter()
+
+        planned = sum(len(route.point_ids) for route in plan.routes)
+        self.stdout.write(self.style.SUCCESS(
+            f"{day} : {len(plan.routes)} tournées, {planned}/{plan.due} points planifiés, "
+            f"{len(plan.unplanned)} non planifiés "
+            f"(calcul {(planned_at - started) * 1000:.0f} ms, écriture {(finished - planned_at) * 1000:.0f} ms)"
+        ))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from waste_management.synthetic import seed_city, scaled_volumes, DEFAULT_BATCH_SIZE
 from waste_management.models import (
     Team, CollectionPoint, Truck, Report, Schedule, 
     ScheduleRoute, Incident, Statistics
@@ -7,13 +8,27 @@ from waste_management.models import (
 from django.utils import timezone
 from datetime import datetime, timedelta
 import random
+import time
 
 User = get_user_model()
 
 class Command(BaseCommand):
     help = 'Populate database with sample data'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=float,
+            help='Générer une ville synthétique (1 = 50k points, 500 camions, 1M signalements, 1 an de plannings)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Graine du générateur (données reproductibles)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
     def handle(self, *args, **options):
+        if options['scale']:
+            self.populate_scale(options['scale'], options['seed'], options['batch_size'])
+            return
+
         self.stdout.write('Creating sample data...')
         
         # Créer des utilisateurs
@@ -45,6 +60,26 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS('Sample data created successfully!'))
     
+    def populate_scale(self, scale, seed, batch_size):
+        """
+        Générer des volumes réalistes pour les tests de charge
+        """
+        volumes = scaled_volumes(scale)
+        self.stdout.write(f'Generating synthetic city (scale={scale}, seed={seed}): {volumes}')
+        started = time.perf_counter()
+        seed_city(
+            points=volumes['points'],
+            trucks=volumes['trucks'],
+            reports=volumes['reports'],
+            days=volumes['days'],
+            seed=seed,
+            batch_size=batch_size,
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Synthetic data created in {time.perf_counter() - started:.1f}s'
+        ))
+
     def create_users(self):
         users_data = [
             {
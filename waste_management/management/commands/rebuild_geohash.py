@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from waste_management.geo import encode_geohash
+from waste_management.models import CollectionPoint
+
+
+class Command(BaseCommand):
+    help = 'Recalcule le geohash (index spatial) de tous les points de collecte'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+        batch = []
+
+        queryset = CollectionPoint.objects.only('id', 'latitude', 'longitude', 'geohash')
+        for point in queryset.iterator(chunk_size=batch_size):
+            geohash = encode_geohash(point.latitude, point.longitude)
+            if point.geohash != geohash:
+                point.geohash = geohash
+                batch.append(point)
+            if len(batch) >= batch_size:
+                updated += self.flush(batch)
+                batch = []
+        updated += self.flush(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'{updated} points de collecte réindexés.'))
+
+    def flush(self, batch):
+        if not batch:
+            return 0
+        with transaction.atomic():
+            CollectionPoint.objects.bulk_update(batch, ['geohash'])
+        return len(batch)
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from waste_management.eta import refresh_etas
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule le temps estimé jusqu'au prochain point de collecte des camions "
+        "dont la position et la vitesse sont connues"
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        etas = refresh_etas()
+        elapsed = (time.perf_counter() - started) * 1000
+        active = sum(1 for value in etas.values() if value is not None)
+        self.stdout.write(self.style.SUCCESS(
+            f"{active} camions en tournée sur {len(etas)} recalculés en {elapsed:.1f} ms"
+        ))
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from .geo import encode_geohash
 
 User = get_user_model()
 
@@ -58,11 +59,32 @@ class CollectionPoint(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='empty')
     last_collection = models.DateTimeField(null=True, blank=True)
     next_collection = models.DateTimeField(null=True, blank=True)
+    fill_rate = models.FloatField(null=True, blank=True, help_text="Remplissage estimé (fraction par heure)")
+    status_changed_at = models.DateTimeField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'type'], name='point_status_type_idx'),
+            # Synchronisation incrémentale (/api/sync/)
+            models.Index(fields=['updated_at', 'id'], name='point_sync_idx'),
+            models.Index(fields=['type'], name='point_type_idx'),
+            # Points à collecter avant une date (planification)
+            models.Index(fields=['next_collection'], name='point_next_collection_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.name} - {self.get_status_display()}"
+    
+    def save(self, *args, **kwargs):
+        # Index spatial : le geohash suit toujours les coordonnées
+        self.geohash = encode_geohash(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'geohash' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['geohash']
+        super().save(*args, **kwargs)
 
 class Truck(models.Model):
     """
@@ -80,11 +102,22 @@ class Truck(models.Model):
     driver = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     current_latitude = models.FloatField(default=0)
     current_longitude = models.FloatField(default=0)
+    position_at = models.DateTimeField(null=True, blank=True, help_text="Horodatage de la position courante")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available')
     estimated_time = models.IntegerField(null=True, blank=True, help_text="Temps estimé en minutes")
+    speed_kmh = models.FloatField(null=True, blank=True, help_text="Vitesse observée récente (km/h)")
+    capacity = models.PositiveIntegerField(default=40, help_text="Capacité par tournée, en poubelles standard")
+    status_changed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='truck_status_idx'),
+            # Synchronisation incrémentale (/api/sync/)
+            models.Index(fields=['updated_at', 'id'], name='truck_sync_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.plate_number} - {self.get_status_display()}"
     
@@ -92,6 +125,37 @@ class Truck(models.Model):
     def driver_name(self):
         return self.driver.name if self.driver else ''
 
+class TruckPositionChunk(models.Model):
+    """
+    Historique des positions d'un camion, par blocs compressés.
+    Chaque bloc couvre au plus CHUNK_SIZE positions d'une même journée,
+    encodées en deltas (ms, micro-degrés) sous forme de varints.
+    """
+    CHUNK_SIZE = 720
+    
+    truck = models.ForeignKey(Truck, on_delete=models.CASCADE, related_name='position_chunks')
+    date = models.DateField()
+    start_at = models.DateTimeField()
+    end_at = models.DateTimeField()
+    point_count = models.IntegerField(default=0)
+    # Dernière position absolue, pour encoder les deltas sans relire le bloc
+    last_timestamp = models.BigIntegerField(default=0)  # en millisecondes
+    last_latitude = models.BigIntegerField(default=0)  # en micro-degrés
+    last_longitude = models.BigIntegerField(default=0)  # en micro-degrés
+    data = models.BinaryField(default=bytes)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['start_at']
+        indexes = [
+            models.Index(fields=['truck', 'date']),
+            models.Index(fields=['truck', 'start_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.truck.plate_number} - {self.date} ({self.point_count} positions)"
+
 class Report(models.Model):
     """
     Modèle pour les signalements
@@ -137,9 +201,43 @@ class Report(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='medium')
     assigned_to = models.CharField(max_length=200, blank=True)
+    # Point de collecte concerné (renseigné ou déduit de la position)
+    collection_point = models.ForeignKey(
+        CollectionPoint, on_delete=models.SET_NULL, null=True, blank=True, related_name='reports'
+    )
+    # Équipe chargée du signalement (assigned_to garde son nom pour l'affichage)
+    assigned_team = models.ForeignKey(
+        Team, on_delete=models.SET_NULL, null=True, blank=True, related_name='reports'
+    )
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    # Signalement principal auquel ce signalement a été rattaché (doublon)
+    duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates'
+    )
+    duplicate_count = models.PositiveIntegerField(default=0)  # doublons rattachés
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Pagination par clé du flux des signalements
+            models.Index(fields=['-created_at', '-id'], name='report_feed_idx'),
+            # Filtres de la liste (filterset_fields), suivis du tri du flux
+            models.Index(fields=['status', '-created_at', '-id'], name='report_status_feed_idx'),
+            models.Index(fields=['priority', '-created_at', '-id'], name='report_priority_feed_idx'),
+            models.Index(fields=['type', 'status'], name='report_type_status_idx'),
+            models.Index(fields=['reporter_type'], name='report_reporter_type_idx'),
+            # Signalements en attente : file de traitement des coordinateurs
+            models.Index(
+                fields=['-created_at', '-id'], name='report_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+            # Débordements signalés par point (prévision du remplissage)
+            models.Index(fields=['collection_point', 'type', 'created_at'], name='report_point_type_idx'),
+            # Charge ouverte par équipe (dispatch)
+            models.Index(fields=['assigned_team', 'status'], name='report_team_status_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.get_type_display()} - {self.address[:50]}"
 
@@ -163,6 +261,21 @@ class Schedule(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Synchronisation incrémentale (/api/sync/)
+            models.Index(fields=['updated_at', 'id'], name='schedule_sync_idx'),
+            # Pagination par clé du flux des plannings
+            models.Index(fields=['-date', '-start_time', '-id'], name='schedule_feed_idx'),
+            models.Index(fields=['status', '-date', '-start_time'], name='schedule_status_feed_idx'),
+            models.Index(fields=['team', '-date', '-start_time'], name='schedule_team_feed_idx'),
+            # Plannings actifs : routes du jour de chaque camion
+            models.Index(
+                fields=['truck', 'date'], name='schedule_active_idx',
+                condition=models.Q(status__in=['planned', 'in_progress']),
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.team.name} - {self.date}"
 
@@ -175,9 +288,23 @@ class ScheduleRoute(models.Model):
     order = models.IntegerField(default=0)
     completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(null=True, blank=True)
+    completion_changed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['order']
+        indexes = [
+            models.Index(fields=['schedule', 'order'], name='route_schedule_order_idx'),
+            # Synchronisation incrémentale (/api/sync/)
+            models.Index(fields=['updated_at', 'id'], name='route_sync_idx'),
+            models.Index(fields=['completed', 'completed_at'], name='route_completed_idx'),
+            # Arrêts restants d'une tournée
+            models.Index(
+                fields=['schedule', 'order'], name='route_pending_idx',
+                condition=models.Q(completed=False),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.schedule} - {self.collection_point.name} (#{self.order})"
@@ -218,6 +345,21 @@ class Incident(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Synchronisation incrémentale (/api/sync/)
+            models.Index(fields=['updated_at', 'id'], name='incident_sync_idx'),
+            # Pagination par clé du flux des incidents
+            models.Index(fields=['-created_at', '-id'], name='incident_feed_idx'),
+            models.Index(fields=['status', 'severity'], name='incident_status_severity_idx'),
+            models.Index(fields=['type'], name='incident_type_idx'),
+            # Incidents en cours : affichés sur la carte et pris en compte par les tournées
+            models.Index(
+                fields=['-created_at', '-id'], name='incident_active_idx',
+                condition=models.Q(status='active'),
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.get_type_display()} - {self.address[:50]}"
 
@@ -232,6 +374,7 @@ class Statistics(models.Model):
     efficiency = models.FloatField(default=0)  # en pourcentage
     reports_resolved = models.IntegerField(default=0)
     average_response_time = models.FloatField(default=0)  # en heures
+    computed_at = models.DateTimeField(null=True, blank=True)  # début du dernier calcul
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -239,4 +382,77 @@ class Statistics(models.Model):
         return f"Statistiques - {self.period}"
     
     class Meta:
-        verbose_name_plural = "Statistics"
\ No newline at end of file
+        verbose_name_plural = "Statistics"
+        indexes = [
+            # Dernière période (GET /api/statistics/)
+            models.Index(fields=['period'], name='statistics_period_idx'),
+        ]
+
+class StaleMonth(models.Model):
+    """
+    Mois dont les statistiques sont à recalculer, enregistré lors de
+    l'écriture des données sources (ancien et nouveau mois)
+    """
+    month = models.DateField(unique=True)  # premier jour du mois
+    marked_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}"
+
+class Tombstone(models.Model):
+    """
+    Trace d'une suppression, pour la synchronisation incrémentale des clients
+    """
+    model = models.CharField(max_length=100)  # ex. waste_management.collectionpoint
+    object_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)  # date de suppression
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='tombstone_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id}"
+
+class CollectionPointStatusChange(models.Model):
+    """
+    Historique des statuts des points de collecte (prévision du remplissage)
+    """
+    collection_point = models.ForeignKey(
+        CollectionPoint, on_delete=models.CASCADE, related_name='status_changes'
+    )
+    status = models.CharField(max_length=20, choices=CollectionPoint.STATUS_CHOICES)
+    changed_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['collection_point', 'changed_at']
+        indexes = [
+            models.Index(fields=['collection_point', 'changed_at'], name='point_status_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.collection_point_id} - {self.status} ({self.changed_at})"
+
+class AppliedOperation(models.Model):
+    """
+    Opération hors ligne déjà reçue (POST /api/oplog/) : empreinte 64 bits
+    de l'identifiant généré par le client, pour ignorer les renvois
+    """
+    key = models.BigIntegerField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key:016x}"
+
+class LiveEvent(models.Model):
+    """
+    Événement du flux temps réel en attente de diffusion (live.DatabaseBroker) :
+    publié par les processus de l'API, relu par le processus ASGI de /api/live/
+    """
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.payload.get('type')} #{self.payload.get('id')}"
@@ -0,0 +1,126 @@
+"""
+Camions disponibles les plus proches d'une position ou d'un signalement.
+
+Les positions des camions pouvant intervenir sont gardées en mémoire dans
+des tableaux NumPy. Après une écriture sur les camions (compteur de version,
+voir cache.py), seules les lignes modifiées depuis la lecture précédente
+sont relues (index updated_at), ainsi que les suppressions (Tombstone) :
+l'index suit update_location, la télémétrie et update_status sans recharger
+la flotte. Une recherche des k plus proches est un calcul vectorisé sur ces
+tableaux, sans requête SQL tant que la flotte n'a pas changé.
+"""
+import threading
+from collections import namedtuple
+
+import numpy as np
+from django.utils import timezone
+
+from .cache import get_response_cache
+from .dispatch import AVAILABLE_TRUCK_STATUSES
+from .geo import EARTH_RADIUS_KM
+from .models import Truck, Tombstone
+from .sync import SYNC_LAG
+
+# Positions traitées par bloc dans la matrice des distances
+CHUNK_SIZE = 256
+
+TRUCK_VERSION = Truck._meta.label_lower
+
+Neighbor = namedtuple('Neighbor', ['truck_id', 'plate_number', 'distance_km'])
+
+
+class TruckIndex:
+    """
+    Camions disponibles localisés : {id: (immatriculation, latitude, longitude)}
+    et tableaux NumPy dérivés, reconstruits après un changement
+    """
+
+    def __init__(self):
+        self.trucks = {}
+        self.version = None
+        self.synced_at = None
+        self.arrays = None
+        self.lock = threading.Lock()
+
+    def _apply(self, truck_id, plate_number, latitude, longitude, truck_status):
+        # Position par défaut (0, 0) : camion jamais localisé
+        if truck_status in AVAILABLE_TRUCK_STATUSES and (latitude or longitude):
+            self.trucks[truck_id] = (plate_number, latitude, longitude)
+        else:
+            self.trucks.pop(truck_id, None)
+
+    def sync(self):
+        """
+        Relire les camions modifiés depuis la dernière lecture, si leur version a changé
+        """
+        version = get_response_cache().backend.get_versions([TRUCK_VERSION])[0]
+        if version == self.version and self.synced_at is not None:
+            return
+        now = timezone.now()
+        trucks = Truck.objects.all()
+        deleted = []
+        if self.synced_at is not None:
+            # Écritures validées après la lecture précédente : marge SYNC_LAG, comme /api/sync/
+            since = self.synced_at - SYNC_LAG
+            trucks = trucks.filter(updated_at__gte=since)
+            deleted = Tombstone.objects.filter(
+                model=TRUCK_VERSION, created_at__gte=since
+            ).values_list('object_id', flat=True)
+        for row in trucks.values_list('id', 'plate_number', 'current_latitude', 'current_longitude', 'status'):
+            self._apply(*row)
+        for truck_id in deleted:
+            self.trucks.pop(truck_id, None)
+        self.version = version
+        self.synced_at = now
+        self.arrays = None
+
+    def _arrays(self):
+        if self.arrays is None:
+            ids = list(self.trucks)
+            latitudes = np.radians(np.array([self.trucks[truck_id][1] for truck_id in ids], dtype=float))
+            longitudes = np.radians(np.array([self.trucks[truck_id][2] for truck_id in ids], dtype=float))
+            plates = [self.trucks[truck_id][0] for truck_id in ids]
+            self.arrays = (ids, plates, latitudes, longitudes, np.cos(latitudes))
+        return self.arrays
+
+    def nearest(self, latitudes, longitudes, k=1):
+        """
+        k camions les plus proches de chaque position, du plus proche au plus
+        éloigné : [[Neighbor, ...], ...]
+        """
+        with self.lock:
+            self.sync()
+            ids, plates, truck_lat, truck_lon, truck_cos = self._arrays()
+
+        lat = np.radians(np.asarray(latitudes, dtype=float))
+        lon = np.radians(np.asarray(longitudes, dtype=float))
+        k = min(k, len(ids))
+        if not k:
+            return [[] for _ in range(len(lat))]
+
+        results = []
+        for start in range(0, len(lat), CHUNK_SIZE):
+            chunk_lat = lat[start:start + CHUNK_SIZE, None]
+            chunk_lon = lon[start:start + CHUNK_SIZE, None]
+            a = (
+                np.sin((truck_lat[None, :] - chunk_lat) / 2) ** 2
+                + np.cos(chunk_lat) * truck_cos[None, :] * np.sin((truck_lon[None, :] - chunk_lon) / 2) ** 2
+            )
+            distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+            # k plus petites distances de chaque ligne, puis tri de ces k seulement
+            closest = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < len(ids) else np.tile(
+                np.arange(len(ids)), (len(distances), 1)
+            )
+            closest_distances = np.take_along_axis(distances, closest, axis=1)
+            order = np.argsort(closest_distances, axis=1, kind='stable')
+            closest = np.take_along_axis(closest, order, axis=1)
+            closest_distances = np.take_along_axis(closest_distances, order, axis=1)
+            for row_indices, row_distances in zip(closest.tolist(), closest_distances.tolist()):
+                results.append([
+                    Neighbor(ids[index], plates[index], round(distance, 3))
+                    for index, distance in zip(row_indices, row_distances)
+                ])
+        return results
+
+
+index = TruckIndex()
@@ -0,0 +1,266 @@
+"""
+Relecture du journal d'opérations des appareils hors ligne (POST /api/oplog/).
+
+Sans réseau, l'application des collecteurs met ses appels en file et envoie
+le journal complet à la reconnexion. Chaque opération porte un identifiant
+généré par le client, la date à laquelle elle a été faite et le corps de
+l'appel d'origine :
+
+    {"id": "6f1c...", "op": "collection-points.update_status", "object": 5,
+     "timestamp": "2025-01-16T09:12:00Z", "data": {"status": "full"}}
+
+- Renvois : l'empreinte 64 bits de chaque identifiant est conservée
+  (AppliedOperation, index unique) ; une opération déjà reçue est ignorée.
+- Ordre : les opérations sont appliquées par date, quel que soit l'ordre
+  d'envoi.
+- Dernier écrivain gagnant : une opération plus ancienne que la dernière
+  écriture de la même donnée n'est pas appliquée. La référence est la date
+  du dernier changement de la donnée elle-même (completion_changed_at pour
+  les arrêts, status_changed_at, position_at), updated_at étant aussi
+  avancé par le serveur (optimisation, planificateur, temps estimés).
+- Le journal est appliqué dans une transaction, par lots : arrêts et points
+  de collecte via fieldwork, positions via telemetry, statuts des camions
+  en un bulk_update.
+"""
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import fieldwork, live, telemetry
+from .cache import bump
+from .models import AppliedOperation, CollectionPoint, ScheduleRoute, Truck
+
+# Nombre maximal d'opérations par journal
+MAX_OPERATIONS_PER_REQUEST = 5000
+# Empreintes par requête (nombre de paramètres SQL borné)
+LOOKUP_BATCH_SIZE = 500
+
+MARK_COMPLETED = 'schedule-routes.mark_completed'
+MARK_INCOMPLETE = 'schedule-routes.mark_incomplete'
+POINT_STATUS = 'collection-points.update_status'
+TRUCK_STATUS = 'trucks.update_status'
+TRUCK_LOCATION = 'trucks.update_location'
+
+# Codes de résultat par opération (en plus de ceux de fieldwork)
+DUPLICATE = 'duplicate'
+
+
+class OplogError(ValueError):
+    """
+    Journal invalide (refusé en entier)
+    """
+
+
+class OplogConflict(OplogError):
+    """
+    Opérations reçues en même temps par une autre requête
+    """
+
+
+def operation_key(op_id):
+    """
+    Empreinte 64 bits (signée, pour un BigIntegerField) d'un identifiant client
+    """
+    digest = hashlib.blake2b(op_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def _status(data, choices):
+    if data.get('status') not in choices:
+        raise ValueError(data.get('status'))
+    return data['status']
+
+
+def _location(data):
+    location = data['current_location']
+    latitude, longitude = float(location['latitude']), float(location['longitude'])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(location)
+    return latitude, longitude
+
+
+# Validation du corps de chaque opération : valeur à appliquer
+OPERATIONS = {
+    MARK_COMPLETED: lambda data: True,
+    MARK_INCOMPLETE: lambda data: False,
+    POINT_STATUS: lambda data: _status(data, dict(CollectionPoint.STATUS_CHOICES)),
+    TRUCK_STATUS: lambda data: _status(data, dict(Truck.STATUS_CHOICES)),
+    TRUCK_LOCATION: _location,
+}
+
+
+def parse_operation(operation):
+    """
+    Valider une opération et retourner (empreinte, op, objet, date, valeur)
+    """
+    op_id = operation['id']
+    if not isinstance(op_id, str) or not op_id:
+        raise ValueError(op_id)
+    data = operation.get('data') or {}
+    if not isinstance(data, dict):
+        raise ValueError(data)
+    # Sans date, l'ordre des opérations est inconnu
+    if operation['timestamp'] is None:
+        raise ValueError(operation['timestamp'])
+    return (
+        operation_key(op_id),
+        operation['op'],
+        int(operation['object']),
+        telemetry.parse_timestamp(operation['timestamp']),
+        OPERATIONS[operation['op']](data),
+    )
+
+
+def replay(operations):
+    """
+    Appliquer un journal d'opérations.
+    Retourne {'results': [code, ...], 'applied': n}, codes dans l'ordre reçu :
+    ok, duplicate, stale, not_found, invalid.
+    """
+    if not isinstance(operations, list):
+        raise OplogError('Une liste d\'opérations est attendue')
+    if len(operations) > MAX_OPERATIONS_PER_REQUEST:
+        raise OplogError(f'Au plus {MAX_OPERATIONS_PER_REQUEST} opérations par journal')
+
+    results = [None] * len(operations)
+    parsed = {}
+    for position, operation in enumerate(operations):
+        try:
+            if not isinstance(operation, dict):
+                raise ValueError(operation)
+            parsed[position] = parse_operation(operation)
+        except (KeyError, TypeError, ValueError):
+            results[position] = fieldwork.INVALID
+
+    # Renvois dans le journal lui-même : seule la première occurrence compte
+    first = {}
+    for position, (key, *_) in parsed.items():
+        if key in first:
+            results[position] = DUPLICATE
+        else:
+            first[key] = position
+    keys = list(first)
+
+    with transaction.atomic():
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            for key in AppliedOperation.objects.filter(
+                key__in=keys[start:start + LOOKUP_BATCH_SIZE]
+            ).values_list('key', flat=True):
+                results[first.pop(key)] = DUPLICATE
+        try:
+            AppliedOperation.objects.bulk_create(
+                [AppliedOperation(key=key) for key in first], batch_size=LOOKUP_BATCH_SIZE
+            )
+        except IntegrityError as exc:
+            raise OplogConflict('Journal en cours de traitement par une autre requête, réessayer') from exc
+
+        fresh = sorted(first.values(), key=lambda position: parsed[position][3])
+        applied = _apply([(position, *parsed[position][1:]) for position in fresh], results)
+
+    return {'results': results, 'applied': applied}
+
+
+def _apply(operations, results):
+    """
+    operations = [(position, op, objet, date, valeur), ...] par date croissante
+    """
+    by_op = {}
+    for operation in operations:
+        by_op.setdefault(operation[1], []).append(operation)
+    stop_operations = by_op.get(MARK_COMPLETED, []) + by_op.get(MARK_INCOMPLETE, [])
+    stop_operations.sort(key=lambda operation: operation[3])
+    return (
+        _apply_field_updates(stop_operations, by_op.get(POINT_STATUS, []), results)
+        + _apply_truck_statuses(by_op.get(TRUCK_STATUS, []), results)
+        + _apply_locations(by_op.get(TRUCK_LOCATION, []), results)
+    )
+
+
+def _apply_field_updates(stop_operations, point_operations, results):
+    """
+    Arrêts (plus récents que leur dernier changement d'état) et statuts des
+    points, via fieldwork
+    """
+    versions = dict(ScheduleRoute.objects.filter(
+        id__in={operation[2] for operation in stop_operations}
+    ).values_list('id', 'completion_changed_at'))
+    stops, stop_positions = [], []
+    for position, _, route_id, at, completed in stop_operations:
+        if route_id not in versions:
+            results[position] = fieldwork.NOT_FOUND
+        elif versions[route_id] is not None and at < versions[route_id]:
+            results[position] = fieldwork.STALE
+        else:
+            stops.append({'id': route_id, 'completed': completed, 'at': at.isoformat()})
+            stop_positions.append(position)
+
+    points = [
+        {'id': point_id, 'status': point_status, 'at': at.isoformat()}
+        for _, _, point_id, at, point_status in point_operations
+    ]
+    if not stops and not points:
+        return 0
+    outcome = fieldwork.apply_updates(stops, points, limit=None)
+    for position, code in zip(stop_positions, outcome['stops']):
+        results[position] = code
+    for operation, code in zip(point_operations, outcome['points']):
+        results[operation[0]] = code
+    return outcome['applied']
+
+
+def _apply_truck_statuses(operations, results):
+    """
+    Statut final de chaque camion, en un bulk_update
+    """
+    if not operations:
+        return 0
+    trucks = Truck.objects.select_related('driver').in_bulk({operation[2] for operation in operations})
+    changed = {}
+    for position, _, truck_id, at, truck_status in operations:
+        truck = trucks.get(truck_id)
+        if truck is None:
+            results[position] = fieldwork.NOT_FOUND
+        elif truck.status_changed_at is not None and at < truck.status_changed_at:
+            results[position] = fieldwork.STALE
+        else:
+            truck.status = truck_status
+            truck.status_changed_at = at
+            changed[truck_id] = truck
+            results[position] = fieldwork.OK
+
+    if changed:
+        now = timezone.now()
+        for truck in changed.values():
+            truck.updated_at = now
+        Truck.objects.bulk_update(list(changed.values()), ['status', 'status_changed_at', 'updated_at'])
+        bump(Truck)
+        for truck in changed.values():
+            live.publish(live.truck_event(truck))
+    return len(changed)
+
+
+def _apply_locations(operations, results):
+    """
+    Positions plus récentes que la dernière position connue, via telemetry.ingest
+    """
+    if not operations:
+        return 0
+    truck_ids = {operation[2] for operation in operations}
+    last_seen = dict(Truck.objects.filter(id__in=truck_ids).values_list('id', 'position_at'))
+
+    samples = []
+    for position, _, truck_id, at, (latitude, longitude) in operations:
+        if truck_id not in last_seen:
+            results[position] = fieldwork.NOT_FOUND
+        elif last_seen[truck_id] is not None and at < last_seen[truck_id]:
+            results[position] = fieldwork.STALE
+        else:
+            samples.append({
+                'truck_id': truck_id, 'latitude': latitude, 'longitude': longitude,
+                'timestamp': at.isoformat(),
+            })
+            results[position] = fieldwork.OK
+    if samples:
+        telemetry.ingest(samples)
+    return len(samples)
@@ -0,0 +1,142 @@
+"""
+Pagination par clé (keyset) pour les flux volumineux
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par curseur sur un tri composite (ex. -created_at, -id).
+    Chaque page filtre sur la dernière ligne vue au lieu d'un OFFSET : une
+    page profonde coûte autant que la première.
+
+    - ?cursor=... : page suivante ou précédente (liens next / previous)
+    - ?count=false : ne pas calculer le total (évite le COUNT(*))
+    - ?page=N : ancienne pagination par numéro, conservée pour les clients existants
+
+    La vue déclare son tri avec `keyset_ordering`, qui doit se terminer par
+    une colonne unique (id) et correspondre à un index composite.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.legacy = None
+        if 'page' in request.query_params:
+            self.legacy = PageNumberPagination()
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        self.ordering = tuple(getattr(view, 'keyset_ordering', ('-created_at', '-id')))
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering
+        ]
+        self.page_size_value = self.get_page_size(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, 'true').lower() not in ('false', '0', 'no'):
+            self.count = queryset.count()
+
+        values, reverse = self.decode_cursor(request)
+        ordering = self.reversed_ordering() if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, values))
+
+        rows = list(queryset[:self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = values is not None, has_more
+
+        self.rows = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+
+        payload = OrderedDict()
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def reversed_ordering(self):
+        return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering)
+
+    def keyset_filter(self, ordering, values):
+        """
+        Lignes strictement après `values` dans l'ordre donné :
+        a <= va AND ((a < va) OR (a = va AND b < vb) OR ...)
+        La borne redondante sur la première colonne donne à la base un
+        point de départ dans l'index : une page profonde ne parcourt pas
+        l'index depuis le début.
+        """
+        condition = Q()
+        for index, name in enumerate(ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            clause = Q(**{f'{name.lstrip("-")}__{lookup}': values[index]})
+            for previous_name, previous_value in zip(ordering[:index], values[:index]):
+                clause &= Q(**{previous_name.lstrip('-'): previous_value})
+            condition |= clause
+        first = ordering[0]
+        bound = Q(**{f'{first.lstrip("-")}__{"lte" if first.startswith("-") else "gte"}': values[0]})
+        return bound & condition
+
+    def encode_cursor(self, instance, reverse):
+        values = [field.value_to_string(instance) for field in self.fields]
+        raw = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+        return replace_query_param(
+            remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param),
+            self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            values = [field.to_python(value) for field, value in zip(self.fields, data['v'])]
+            if len(values) != len(self.fields) or any(value is None for value in values):
+                raise ValueError
+            return values, bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError, ValidationError):
+            raise NotFound('Curseur invalide')
+
+    def get_next_link(self):
+        if not self.has_next or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[0], reverse=True)
@@ -0,0 +1,267 @@
+"""
+Génération automatique des plannings d'une journée à partir des prévisions
+de remplissage (next_collection, voir forecast.py).
+
+1. Points à collecter : prévus pleins avant la fin de la journée, ou déjà
+   pleins, et absents des tournées actives du jour. Si la flotte ne suffit
+   pas, les plus urgents passent en premier.
+2. Regroupement : k-moyennes sur les positions (NumPy), puis affectation
+   de chaque groupe au camion disponible le plus proche et répartition des
+   points sous la contrainte de capacité du camion.
+3. Ordonnancement de chaque groupe (routing.optimize_path) depuis la
+   position du camion, et coupe de la tournée à la fin de la plage horaire
+   (trajet à vitesse moyenne plus temps de service par point).
+4. Écriture : plannings et points de route en insertions groupées, dans une
+   transaction.
+"""
+import math
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .aggregation import mark_months
+from .cache import bump
+from .eta import DEFAULT_SPEED_KMH, DETOUR_FACTOR
+from .geo import EARTH_RADIUS_KM
+from .models import CollectionPoint, Schedule, ScheduleRoute, Truck
+from .routing import optimize_path
+
+DEFAULT_START_TIME = time(7, 0)
+DEFAULT_END_TIME = time(15, 0)
+
+# Charge d'un point (en poubelles standard) et temps de service (minutes) par type
+LOAD_UNITS = {'bin': 1, 'container': 4, 'recycling': 2}
+SERVICE_MINUTES = {'bin': 3, 'container': 8, 'recycling': 5}
+
+AVAILABLE_TRUCK_STATUSES = ('available',)
+ACTIVE_SCHEDULE_STATUSES = ('planned', 'in_progress')
+
+KMEANS_ITERATIONS = 15
+# Budget 2-opt par tournée : 100 tournées tiennent dans le temps imparti
+TWO_OPT_BUDGET = 0.2
+
+PlannedRoute = namedtuple('PlannedRoute', [
+    'truck_id', 'team_id', 'start_time', 'estimated_end_time', 'point_ids', 'distance_km', 'load',
+])
+Plan = namedtuple('Plan', ['date', 'routes', 'unplanned', 'due'])
+
+
+def due_points(day, end_time):
+    """
+    Points à collecter le jour `day`, du plus urgent au moins urgent :
+    [(id, latitude, longitude, type), ...]
+    """
+    deadline = timezone.make_aware(datetime.combine(day, end_time))
+    planned = ScheduleRoute.objects.filter(
+        schedule__date=day, schedule__status__in=ACTIVE_SCHEDULE_STATUSES, completed=False
+    ).values('collection_point_id')
+    return list(CollectionPoint.objects.filter(
+        Q(next_collection__lte=deadline) | Q(status__in=('full', 'overflow'))
+    ).exclude(id__in=planned).order_by('next_collection', 'id').values_list(
+        'id', 'latitude', 'longitude', 'type'
+    ))
+
+
+def available_trucks(day):
+    """
+    Camions disponibles avec une équipe (celle du chauffeur), sans tournée active ce jour :
+    [(id, équipe, latitude, longitude, capacité), ...]
+    """
+    busy = Schedule.objects.filter(date=day, status__in=ACTIVE_SCHEDULE_STATUSES).values('truck_id')
+    return list(Truck.objects.filter(
+        status__in=AVAILABLE_TRUCK_STATUSES,
+        driver__team__isnull=False,
+        driver__team__status='active',
+    ).exclude(id__in=busy).order_by('id').values_list(
+        'id', 'driver__team_id', 'current_latitude', 'current_longitude', 'capacity'
+    ))
+
+
+def _project(latitudes, longitudes, origin):
+    """
+    Projection équirectangulaire locale (km) autour de `origin`
+    """
+    km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+    x = (np.asarray(longitudes, dtype=float) - origin[1]) * km_per_degree * math.cos(math.radians(origin[0]))
+    y = (np.asarray(latitudes, dtype=float) - origin[0]) * km_per_degree
+    return np.column_stack([x, y])
+
+
+def kmeans(points, count, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    Centres de `count` groupes (k-moyennes, initialisation k-means++)
+    """
+    rng = np.random.default_rng(seed)
+    centers = [points[rng.integers(len(points))]]
+    closest = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, count):
+        total = closest.sum()
+        index = rng.choice(len(points), p=closest / total) if total > 0 else rng.integers(len(points))
+        centers.append(points[index])
+        closest = np.minimum(closest, ((points - points[index]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        labels = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        sizes = np.bincount(labels, minlength=count)
+        moved = np.column_stack([
+            np.bincount(labels, points[:, 0], minlength=count),
+            np.bincount(labels, points[:, 1], minlength=count),
+        ])
+        occupied = sizes > 0
+        updated = centers.copy()
+        updated[occupied] = moved[occupied] / sizes[occupied, None]
+        if np.allclose(updated, centers):
+            break
+        centers = updated
+    return centers
+
+
+def match_trucks(centers, truck_positions):
+    """
+    Associer chaque centre au camion libre le plus proche (plus courtes distances d'abord)
+    """
+    distances = np.sqrt(((centers[:, None, :] - truck_positions[None, :, :]) ** 2).sum(axis=2))
+    matches = {}
+    used_trucks = set()
+    for flat in np.argsort(distances, axis=None):
+        center, truck = divmod(int(flat), distances.shape[1])
+        if center in matches or truck in used_trucks:
+            continue
+        matches[center] = truck
+        used_trucks.add(truck)
+        if len(matches) == len(centers):
+            break
+    return [matches[center] for center in range(len(centers))]
+
+
+def assign_with_capacity(points, loads, centers, capacities):
+    """
+    Répartir les points entre les groupes sans dépasser leur capacité.
+    Les points pour lesquels le choix coûte le plus (écart entre le groupe
+    le plus proche et le suivant) sont placés en premier. -1 : non placé.
+    """
+    distances = np.sqrt(((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2))
+    preferences = np.argsort(distances, axis=1)
+    ranked = np.sort(distances, axis=1)
+    regret = ranked[:, 1] - ranked[:, 0] if len(centers) > 1 else -ranked[:, 0]
+
+    remaining = np.asarray(capacities, dtype=float).copy()
+    labels = np.full(len(points), -1)
+    for index in np.argsort(-regret, kind='stable'):
+        for group in preferences[index]:
+            if remaining[group] >= loads[index]:
+                labels[index] = group
+                remaining[group] -= loads[index]
+                break
+    return labels
+
+
+def order_route(start, stops, types, start_time, end_time, day):
+    """
+    Ordonner les arrêts et couper la tournée à la fin de la plage horaire.
+    Retourne (indices des arrêts gardés dans l'ordre, distance km, fin estimée).
+    """
+    order, _, _ = optimize_path(start, stops, time_budget=TWO_OPT_BUDGET)
+    path = ([start] if start is not None else []) + [stops[index] for index in order]
+    latitudes, longitudes = zip(*path)
+    lat = np.radians(latitudes)
+    lon = np.radians(longitudes)
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    legs = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1))) * DETOUR_FACTOR
+    if start is None:
+        legs = np.concatenate([[0.0], legs])
+
+    minutes = legs / DEFAULT_SPEED_KMH * 60 + np.array([SERVICE_MINUTES.get(types[index], 5) for index in order])
+    elapsed = np.cumsum(minutes)
+    available = (
+        datetime.combine(day, end_time) - datetime.combine(day, start_time)
+    ).total_seconds() / 60
+    kept = int(np.searchsorted(elapsed, available, side='right'))
+    if not kept:
+        return [], 0.0, start_time
+    end = datetime.combine(day, start_time) + timedelta(minutes=math.ceil(float(elapsed[kept - 1])))
+    return order[:kept], float(legs[:kept].sum()), end.time()
+
+
+def plan_day(day, start_time=DEFAULT_START_TIME, end_time=DEFAULT_END_TIME):
+    """
+    Calculer les tournées du jour sans rien écrire
+    """
+    points = due_points(day, end_time)
+    trucks = available_trucks(day)
+    if not points or not trucks:
+        return Plan(day, [], [point[0] for point in points], len(points))
+
+    loads = np.array([LOAD_UNITS.get(point[3], 1) for point in points], dtype=float)
+    origin = (float(np.mean([point[1] for point in points])), float(np.mean([point[2] for point in points])))
+    positions = _project([point[1] for point in points], [point[2] for point in points], origin)
+
+    # Autant de groupes que de camions nécessaires pour la charge totale
+    capacities = np.array([truck[4] for truck in trucks], dtype=float)
+    needed = int(np.searchsorted(np.cumsum(np.sort(capacities)[::-1]), loads.sum())) + 1
+    count = max(1, min(len(trucks), needed, len(points)))
+    centers = kmeans(positions, count)
+
+    # Un camion jamais localisé (0, 0) est placé au centre de la zone
+    truck_positions = _project(
+        [truck[2] if truck[2] or truck[3] else origin[0] for truck in trucks],
+        [truck[3] if truck[2] or truck[3] else origin[1] for truck in trucks],
+        origin,
+    )
+    matched = match_trucks(centers, truck_positions)
+    labels = assign_with_capacity(positions, loads, centers, capacities[matched])
+
+    routes = []
+    unplanned = [points[index][0] for index in np.flatnonzero(labels < 0)]
+    for group, truck_index in enumerate(matched):
+        members = np.flatnonzero(labels == group)
+        if not len(members):
+            continue
+        truck_id, team_id, latitude, longitude, _ = trucks[truck_index]
+        start = (latitude, longitude) if latitude or longitude else None
+        kept, distance, estimated_end = order_route(
+            start,
+            [(points[index][1], points[index][2]) for index in members],
+            [points[index][3] for index in members],
+            start_time, end_time, day,
+        )
+        kept_members = [members[index] for index in kept]
+        unplanned.extend(points[index][0] for index in set(members.tolist()) - set(kept_members))
+        if kept_members:
+            routes.append(PlannedRoute(
+                truck_id=truck_id,
+                team_id=team_id,
+                start_time=start_time,
+                estimated_end_time=estimated_end,
+                point_ids=[points[index][0] for index in kept_members],
+                distance_km=round(distance, 2),
+                load=int(loads[kept_members].sum()),
+            ))
+    return Plan(day, routes, unplanned, len(points))
+
+
+def save_plan(plan):
+    """
+    Écrire les plannings et leurs points de route (deux insertions groupées)
+    """
+    with transaction.atomic():
+        schedules = Schedule.objects.bulk_create([
+            Schedule(
+                team_id=route.team_id, truck_id=route.truck_id, date=plan.date,
+                start_time=route.start_time, estimated_end_time=route.estimated_end_time,
+            )
+            for route in plan.routes
+        ])
+        ScheduleRoute.objects.bulk_create([
+            ScheduleRoute(schedule=schedule, collection_point_id=point_id, order=order)
+            for schedule, route in zip(schedules, plan.routes)
+            for order, point_id in enumerate(route.point_ids, start=1)
+        ], batch_size=1000)
+        mark_months([plan.date])
+    bump(Schedule, ScheduleRoute)
+    return schedules
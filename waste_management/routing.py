@@ -0,0 +1,107 @@
+"""
+Optimisation de l'ordre de passage des tournées
+"""
+import time
+
+import numpy as np
+
+from .geo import EARTH_RADIUS_KM
+
+# Budget de temps pour l'amélioration 2-opt (secondes)
+TWO_OPT_TIME_BUDGET = 0.8
+
+
+def haversine_matrix(latitudes, longitudes):
+    """
+    Matrice des distances (km) entre toutes les positions, calculée en bloc
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    d_lat = lat[:, None] - lat[None, :]
+    d_lon = lon[:, None] - lon[None, :]
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def path_length(tour, distances):
+    tour = np.asarray(tour)
+    return float(distances[tour[:-1], tour[1:]].sum())
+
+
+def nearest_neighbour(distances, start=0):
+    """
+    Tournée gloutonne : toujours aller au point non visité le plus proche
+    """
+    size = len(distances)
+    visited = np.zeros(size, dtype=bool)
+    tour = [start]
+    visited[start] = True
+    current = start
+    for _ in range(size - 1):
+        candidates = np.where(visited, np.inf, distances[current])
+        current = int(np.argmin(candidates))
+        visited[current] = True
+        tour.append(current)
+    return tour
+
+
+def two_opt(tour, distances, time_budget=TWO_OPT_TIME_BUDGET):
+    """
+    Amélioration 2-opt d'un chemin dont le premier et le dernier nœud sont fixes.
+    Pour chaque position, tous les renversements candidats sont évalués en bloc.
+    """
+    tour = np.asarray(tour)
+    size = len(tour)
+    deadline = time.perf_counter() + time_budget
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, size - 2):
+            j = np.arange(i + 1, size - 1)
+            a, b = tour[i - 1], tour[i]
+            c, d = tour[j], tour[j + 1]
+            delta = distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                end = j[best]
+                tour[i:end + 1] = tour[i:end + 1][::-1].copy()
+                improved = True
+    return tour.tolist()
+
+
+def optimize_path(start, stops, time_budget=TWO_OPT_TIME_BUDGET):
+    """
+    Ordonner des arrêts depuis une position de départ.
+    start : (latitude, longitude) ou None pour partir du premier arrêt
+    stops : [(latitude, longitude), ...]
+    time_budget : durée maximale de l'amélioration 2-opt (secondes)
+    Retourne (ordre des arrêts, distance initiale, distance optimisée) en km.
+    """
+    count = len(stops)
+    if count < 2:
+        distance = 0.0
+        if count == 1 and start is not None:
+            distance = float(haversine_matrix([start[0], stops[0][0]], [start[1], stops[0][1]])[0, 1])
+        return list(range(count)), distance, distance
+
+    points = ([start] if start is not None else []) + list(stops)
+    offset = 1 if start is not None else 0
+    latitudes, longitudes = zip(*points)
+    distances = haversine_matrix(latitudes, longitudes)
+
+    # Nœud fictif à distance nulle de tous les autres : le chemin reste ouvert
+    size = len(points)
+    padded = np.zeros((size + 1, size + 1))
+    padded[:size, :size] = distances
+
+    initial = list(range(size)) + [size]
+    initial_length = path_length(initial, padded)
+
+    tour = nearest_neighbour(padded[:size, :size], start=0) + [size]
+    tour = two_opt(tour, padded, time_budget)
+    optimized_length = path_length(tour, padded)
+    if optimized_length > initial_length:
+        tour, optimized_length = initial, initial_length
+
+    order = [node - offset for node in tour if offset <= node < size]
+    return order, initial_length, optimized_length
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from django.conf import settings
+from django.db import transaction
 from django.contrib.auth import get_user_model
 User = get_user_model()
 from .models import (
@@ -6,6 +8,10 @@ from .models import (
     ScheduleRoute, Incident, Statistics
 )
 from accounts.serializers import UserSerializer
+from .aggregation import mark_months
+from .cache import bump
+from .dedup import create_report
+from .filters import nearest_point
 
 class TeamSerializer(serializers.ModelSerializer):
     leader_name = serializers.ReadOnlyField()
@@ -20,8 +26,9 @@ class CollectionPointSerializer(serializers.ModelSerializer):
         model = CollectionPoint
         fields = [
             'id', 'name', 'address', 'latitude', 'longitude', 
-            'type', 'status', 'last_collection', 'next_collection'
+            'type', 'status', 'last_collection', 'next_collection', 'fill_rate'
         ]
+        read_only_fields = ['fill_rate']
 
 class TruckSerializer(serializers.ModelSerializer):
     driver_name = serializers.ReadOnlyField()
@@ -41,7 +48,7 @@ class TruckSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'plate_number', 'driver', 'driver_name', 'current_location',
             'status', 'estimated_time', 'route',
-            'current_latitude', 'current_longitude'
+            'current_latitude', 'current_longitude', 'capacity'
         ]
         extra_kwargs = {
             'driver': {'required': True, 'allow_null': False},
@@ -76,22 +83,48 @@ class TruckSerializer(serializers.ModelSerializer):
         }
 
     def get_route(self, obj):
-        # Récupérer les points de collecte assignés à ce camion aujourd'hui
-        from django.utils import timezone
-        today = timezone.now().date()
-        
-        schedules = Schedule.objects.filter(
-            truck=obj,
-            date=today,
-            status__in=['planned', 'in_progress']
-        ).prefetch_related('route_points__collection_point')
-        
-        route_points = []
-        for schedule in schedules:
-            for route_point in schedule.route_points.all():
-                route_points.append(CollectionPointSerializer(route_point.collection_point).data)
-        
-        return route_points
+        # Routes du jour préchargées par la vue (liste de camions)
+        todays_routes = self.context.get('todays_routes')
+        if todays_routes is not None:
+            return todays_routes.get(obj.id, [])
+
+        return load_todays_routes([obj]).get(obj.id, [])
+
+def load_todays_routes(trucks):
+    """
+    Charger en un nombre fixe de requêtes les points de collecte assignés
+    aujourd'hui à chaque camion. Retourne {truck_id: [point sérialisé, ...]}
+    """
+    from django.db.models import Prefetch
+    from django.utils import timezone
+    today = timezone.now().date()
+
+    truck_ids = [truck.id for truck in trucks]
+    routes = {truck_id: [] for truck_id in truck_ids}
+    if not truck_ids:
+        return routes
+
+    schedules = Schedule.objects.filter(
+        truck_id__in=truck_ids,
+        date=today,
+        status__in=['planned', 'in_progress']
+    ).order_by('id').prefetch_related(
+        Prefetch(
+            'route_points',
+            queryset=ScheduleRoute.objects.select_related('collection_point')
+        )
+    )
+
+    # Chaque point n'est sérialisé qu'une seule fois, même s'il apparaît dans plusieurs routes
+    serialized_points = {}
+    for schedule in schedules:
+        for route_point in schedule.route_points.all():
+            point = route_point.collection_point
+            if point.id not in serialized_points:
+                serialized_points[point.id] = CollectionPointSerializer(point).data
+            routes[schedule.truck_id].append(serialized_points[point.id])
+
+    return routes
 
 class ReportSerializer(serializers.ModelSerializer):
     location = serializers.SerializerMethodField()
@@ -102,7 +135,7 @@ class ReportSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'type', 'description', 'location', 'reported_by',
             'reporter_contact', 'reporter_type', 'status', 'priority',
-            'assigned_to', 'created_at'
+            'assigned_to', 'assigned_team', 'collection_point', 'duplicate_of', 'duplicate_count', 'created_at'
         ]
     
     def get_location(self, obj):
@@ -121,22 +154,37 @@ class ReportSerializer(serializers.ModelSerializer):
             }
         return None
 
+class ReportLocationSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    address = serializers.CharField()
+
 class ReportCreateSerializer(serializers.ModelSerializer):
-    location = serializers.DictField(write_only=True)
+    # Coordonnées converties en float : la grille de dedup.py calcule dessus
+    location = ReportLocationSerializer(write_only=True)
     reporter_contact = serializers.DictField(write_only=True, required=False)
     
     class Meta:
         model = Report
         fields = [
             'type', 'description', 'location', 'reported_by',
-            'reporter_contact', 'reporter_type', 'priority'
+            'reporter_contact', 'reporter_type', 'priority', 'collection_point'
         ]
     
     def create(self, validated_data):
         location = validated_data.pop('location')
         reporter_contact = validated_data.pop('reporter_contact', {})
+        if validated_data.get('collection_point') is None and validated_data.get('type') == 'overflow':
+            # Débordement : rattaché au point de collecte le plus proche, s'il est
+            # assez près, pour l'apprentissage du remplissage (forecast.py)
+            validated_data['collection_point_id'] = nearest_point(
+                CollectionPoint.objects.all(), location['latitude'], location['longitude'],
+                getattr(settings, 'REPORT_POINT_RADIUS_M', 30) / 1000,
+            )
+            validated_data.pop('collection_point', None)
         
-        report = Report.objects.create(
+        # Rattaché à un signalement ouvert proche du même type s'il en existe un
+        report = create_report(
             latitude=location['latitude'],
             longitude=location['longitude'],
             address=location['address'],
@@ -169,31 +217,101 @@ class ScheduleSerializer(serializers.ModelSerializer):
             'estimated_end_time', 'status', 'route'
         ]
 
+def create_route_points(routes_by_schedule):
+    """
+    Créer les points de route de plusieurs plannings en une insertion groupée.
+    Les identifiants de points inconnus sont ignorés.
+    routes_by_schedule : [(planning, [id de point, ...]), ...]
+    """
+    point_ids = {str(point_id) for _, route in routes_by_schedule for point_id in route}
+    existing_ids = {
+        str(point_id) for point_id in
+        CollectionPoint.objects.filter(id__in=_valid_ids(point_ids)).values_list('id', flat=True)
+    }
+
+    route_points = []
+    for schedule, route in routes_by_schedule:
+        for index, point_id in enumerate(route):
+            if str(point_id) not in existing_ids:
+                continue
+            route_points.append(ScheduleRoute(
+                schedule=schedule,
+                collection_point_id=int(point_id),
+                order=index + 1
+            ))
+    created = ScheduleRoute.objects.bulk_create(route_points)
+    mark_months(schedule.date for schedule, _ in routes_by_schedule)
+    bump(ScheduleRoute)
+    return created
+
+def _valid_ids(values):
+    return [int(value) for value in values if str(value).isdigit()]
+
+class ScheduleBulkCreateSerializer(serializers.ListSerializer):
+    """
+    Création de plusieurs plannings : une requête pour valider les points
+    de collecte, puis des insertions groupées dans une transaction.
+    """
+
+    def validate(self, attrs):
+        point_ids = {str(point_id) for item in attrs for point_id in item['route']}
+        existing_ids = {
+            str(point_id) for point_id in
+            CollectionPoint.objects.filter(id__in=_valid_ids(point_ids)).values_list('id', flat=True)
+        }
+        unknown_ids = sorted(point_ids - existing_ids)
+        if unknown_ids:
+            raise serializers.ValidationError(
+                f"Points de collecte introuvables : {', '.join(unknown_ids)}"
+            )
+        return attrs
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            routes = [item.pop('route') for item in validated_data]
+            schedules = Schedule.objects.bulk_create([Schedule(**item) for item in validated_data])
+            create_route_points(list(zip(schedules, routes)))
+            bump(Schedule)
+        return schedules
+
 class ScheduleCreateSerializer(serializers.ModelSerializer):
     route = serializers.ListField(child=serializers.CharField(), write_only=True)
     
     class Meta:
         model = Schedule
         fields = ['team', 'truck', 'date', 'start_time', 'estimated_end_time', 'route']
+        list_serializer_class = ScheduleBulkCreateSerializer
     
     def create(self, validated_data):
         route_points = validated_data.pop('route')
-        schedule = Schedule.objects.create(**validated_data)
-        
-        # Créer les points de route
-        for index, point_id in enumerate(route_points):
-            try:
-                collection_point = CollectionPoint.objects.get(id=point_id)
-                ScheduleRoute.objects.create(
-                    schedule=schedule,
-                    collection_point=collection_point,
-                    order=index + 1
-                )
-            except CollectionPoint.DoesNotExist:
-                continue
+        with transaction.atomic():
+            schedule = Schedule.objects.create(**validated_data)
+            # Créer les points de route
+            create_route_points([(schedule, route_points)])
         
         return schedule
 
+class TruckSyncSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Truck
+        fields = [
+            'id', 'plate_number', 'driver', 'current_latitude', 'current_longitude',
+            'status', 'estimated_time', 'capacity', 'updated_at'
+        ]
+
+class ScheduleSyncSerializer(serializers.ModelSerializer):
+    start_time = serializers.TimeField(format='%H:%M')
+    estimated_end_time = serializers.TimeField(format='%H:%M')
+
+    class Meta:
+        model = Schedule
+        fields = ['id', 'team', 'truck', 'date', 'start_time', 'estimated_end_time', 'status', 'updated_at']
+
+class ScheduleRouteSyncSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScheduleRoute
+        fields = ['id', 'schedule', 'collection_point', 'order', 'completed', 'completed_at', 'updated_at']
+
 class IncidentSerializer(serializers.ModelSerializer):
     location = serializers.SerializerMethodField()
     
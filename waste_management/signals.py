@@ -0,0 +1,113 @@
+"""
+Réactions aux écritures : invalidation du cache de réponses, traces de
+suppression pour la synchronisation incrémentale et mois de statistiques
+à recalculer
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+
+from .aggregation import RESOLVED_STATUSES, SOURCE_FIELDS, mark_months, source_months, stored_months
+from .cache import bump
+from .models import CollectionPoint, Report, Schedule, ScheduleRoute, Team, Truck, Incident
+from .sync import SYNCED_MODELS, record_deletion
+
+# Modèles versionnés : cache de réponses et géométrie des tournées (eta.py)
+CACHED_MODELS = (CollectionPoint, Truck, Report, Schedule, ScheduleRoute, Team, Incident)
+
+
+def invalidate(sender, **kwargs):
+    bump(sender)
+
+
+def tombstone(sender, instance, **kwargs):
+    record_deletion(instance)
+
+
+# Champs de l'instance dont dépendent les mois de statistiques (voir SOURCE_FIELDS)
+TRACKED_FIELDS = {
+    Report: ('status', 'duplicate_of_id', 'resolved_at'),
+    Schedule: ('date',),
+    ScheduleRoute: ('completed_at', 'schedule_id'),
+}
+
+
+def _snapshot(sender, instance):
+    # Valeurs déjà chargées uniquement : pas de requête pour un champ différé
+    values = instance.__dict__
+    fields = TRACKED_FIELDS[sender]
+    if instance.pk is None or any(field not in values for field in fields):
+        return None
+    return tuple(values[field] for field in fields)
+
+
+def _follows_save_time(sender, instance):
+    # Signalement résolu sans resolved_at : son mois suit updated_at, avancé à chaque save()
+    return (
+        sender is Report and instance.status in RESOLVED_STATUSES
+        and instance.resolved_at is None and instance.duplicate_of_id is None
+    )
+
+
+def _instance_months(sender, instance):
+    """
+    Mois du nouvel état, lus sur l'instance ; une requête seulement pour un
+    point de route dont le planning n'est pas chargé
+    """
+    if sender is Report:
+        values = {
+            'status': instance.status, 'duplicate_of_id': instance.duplicate_of_id,
+            'resolved_at': instance.resolved_at, 'updated_at': instance.updated_at,
+        }
+    elif sender is Schedule:
+        values = {'date': instance.date}
+    elif ScheduleRoute.schedule.is_cached(instance):
+        values = {'completed_at': instance.completed_at, 'schedule__date': instance.schedule.date}
+    else:
+        return stored_months(sender, instance.pk)
+    return source_months(sender, values)
+
+
+def remember_state(sender, instance, **kwargs):
+    instance._statistics_state = _snapshot(sender, instance)
+
+
+def remember_months(sender, instance, update_fields=None, **kwargs):
+    """
+    Mois de l'état avant écriture (le mois quitté doit aussi être recalculé),
+    seulement si un champ source change : None sinon, rien à marquer
+    """
+    instance._statistics_months = None
+    if update_fields is not None:
+        attnames = {sender._meta.get_field(name).attname for name in update_fields}
+        if attnames.isdisjoint(TRACKED_FIELDS[sender] + ('updated_at',)):
+            return
+    state = getattr(instance, '_statistics_state', None)
+    if state is not None and state == _snapshot(sender, instance) and not _follows_save_time(sender, instance):
+        return
+    instance._statistics_months = set() if instance._state.adding else stored_months(sender, instance.pk)
+
+
+def mark_saved_months(sender, instance, **kwargs):
+    months = getattr(instance, '_statistics_months', None)
+    if months is not None:
+        mark_months(months | _instance_months(sender, instance))
+    instance._statistics_months = None
+    instance._statistics_state = _snapshot(sender, instance)
+
+
+def mark_deleted_months(sender, instance, **kwargs):
+    mark_months(stored_months(sender, instance.pk))
+
+
+def connect():
+    for model in CACHED_MODELS + (get_user_model(),):
+        post_save.connect(invalidate, sender=model, dispatch_uid=f'cache-{model._meta.label_lower}-save')
+        post_delete.connect(invalidate, sender=model, dispatch_uid=f'cache-{model._meta.label_lower}-delete')
+    for _, model, _ in SYNCED_MODELS:
+        post_delete.connect(tombstone, sender=model, dispatch_uid=f'sync-{model._meta.label_lower}-delete')
+    for model in SOURCE_FIELDS:
+        label = model._meta.label_lower
+        post_init.connect(remember_state, sender=model, dispatch_uid=f'statistics-{label}-init')
+        pre_save.connect(remember_months, sender=model, dispatch_uid=f'statistics-{label}-pre-save')
+        post_save.connect(mark_saved_months, sender=model, dispatch_uid=f'statistics-{label}-save')
+        pre_delete.connect(mark_deleted_months, sender=model, dispatch_uid=f'statistics-{label}-delete')
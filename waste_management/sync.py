@@ -0,0 +1,156 @@
+"""
+Synchronisation incrémentale des clients mobiles (GET /api/sync/?since=<jeton>).
+
+Chaque réponse contient les lignes créées ou modifiées depuis le jeton, les
+suppressions (Tombstone) et un nouveau jeton. Le jeton est opaque pour le
+client : il contient, pour chaque modèle, la dernière position lue
+(updated_at, id). La taille de la réponse dépend donc du nombre de changements,
+pas de la taille de la base.
+"""
+import base64
+import json
+from collections import OrderedDict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CollectionPoint, Schedule, ScheduleRoute, Truck, Incident, Tombstone
+from .serializers import (
+    CollectionPointSerializer, ScheduleSyncSerializer, ScheduleRouteSyncSerializer,
+    TruckSyncSerializer, IncidentSerializer
+)
+
+# (clé de la réponse, modèle, sérialiseur)
+SYNCED_MODELS = [
+    ('collection_points', CollectionPoint, CollectionPointSerializer),
+    ('schedules', Schedule, ScheduleSyncSerializer),
+    ('schedule_routes', ScheduleRoute, ScheduleRouteSyncSerializer),
+    ('trucks', Truck, TruckSyncSerializer),
+    ('incidents', Incident, IncidentSerializer),
+]
+TOMBSTONES = 'deleted'
+
+# Lignes maximum par modèle et par réponse : au-delà, has_more indique de rappeler
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+# Une écriture peut être validée (commit) après une lecture plus récente :
+# le jeton ne dépasse jamais now - SYNC_LAG, les dernières lignes sont renvoyées
+# au prochain appel (les clients appliquent les changements par id).
+SYNC_LAG = timedelta(seconds=5)
+
+# Durée de conservation des suppressions ; un jeton plus ancien impose une resynchronisation complète
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+
+class SyncTokenError(ValueError):
+    """
+    Jeton de synchronisation invalide
+    """
+
+
+def encode_token(positions):
+    raw = json.dumps({
+        key: [moment.isoformat(), last_id] for key, (moment, last_id) in positions.items()
+    }, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_token(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        positions = {}
+        for key, (moment, last_id) in data.items():
+            moment = parse_datetime(moment)
+            if moment is None:
+                raise ValueError
+            if timezone.is_naive(moment):
+                # Comme telemetry.parse_timestamp : sans fuseau, UTC
+                moment = timezone.make_aware(moment, dt_timezone.utc)
+            positions[key] = (moment, int(last_id))
+        return positions
+    except (TypeError, ValueError, UnicodeDecodeError, AttributeError):
+        raise SyncTokenError('Jeton de synchronisation invalide')
+
+
+def _changes(queryset, field, position, limit):
+    """
+    Lignes après `position` dans l'ordre (field, id), limitées à `limit`.
+    Retourne (lignes, has_more).
+    """
+    if position is not None:
+        moment, last_id = position
+        queryset = queryset.filter(
+            Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': last_id})
+        )
+    rows = list(queryset.order_by(field, 'id')[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def _next_position(rows, has_more, field, position, watermark):
+    if has_more:
+        last = rows[-1]
+        return (getattr(last, field), last.id)
+    # Tout a été lu : repartir du filigrane, sans reculer en deçà de la position lue
+    if position is not None and position[0] > watermark:
+        return position
+    return (watermark, 0)
+
+
+def changes_since(token=None, limit=DEFAULT_LIMIT):
+    """
+    Changements depuis `token` (None : synchronisation complète).
+    Retourne le contenu de la réponse : lignes par modèle, suppressions,
+    nouveau jeton, has_more et reset (le client doit vider ses données).
+    """
+    now = timezone.now()
+    watermark = now - SYNC_LAG
+    positions = decode_token(token) if token else {}
+
+    reset = not positions
+    tombstone_position = positions.get(TOMBSTONES)
+    if tombstone_position is not None and tombstone_position[0] < now - TOMBSTONE_RETENTION:
+        # Des suppressions plus anciennes ont pu être purgées
+        positions, reset = {}, True
+
+    payload = OrderedDict()
+    new_positions = {}
+    has_more = False
+    for key, model, serializer_class in SYNCED_MODELS:
+        rows, more = _changes(model.objects.all(), 'updated_at', positions.get(key), limit)
+        payload[key] = serializer_class(rows, many=True).data
+        new_positions[key] = _next_position(rows, more, 'updated_at', positions.get(key), watermark)
+        has_more = has_more or more
+
+    deleted = OrderedDict((key, []) for key, _, _ in SYNCED_MODELS)
+    if not reset:
+        labels = {model._meta.label_lower: key for key, model, _ in SYNCED_MODELS}
+        rows, more = _changes(
+            Tombstone.objects.filter(model__in=list(labels)), 'created_at', tombstone_position, limit
+        )
+        for tombstone in rows:
+            deleted[labels[tombstone.model]].append(tombstone.object_id)
+        new_positions[TOMBSTONES] = _next_position(rows, more, 'created_at', tombstone_position, watermark)
+        has_more = has_more or more
+    else:
+        new_positions[TOMBSTONES] = (watermark, 0)
+    payload[TOMBSTONES] = deleted
+
+    payload['token'] = encode_token(new_positions)
+    payload['has_more'] = has_more
+    payload['reset'] = reset
+    payload['server_time'] = now.isoformat()
+    return payload
+
+
+def record_deletion(instance):
+    Tombstone.objects.create(model=instance._meta.label_lower, object_id=instance.pk)
+
+
+def record_deletions(model, pks):
+    """
+    Traces d'un lot supprimé sans signaux (clean_data)
+    """
+    Tombstone.objects.bulk_create([Tombstone(model=model._meta.label_lower, object_id=pk) for pk in pks])
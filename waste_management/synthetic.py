@@ -0,0 +1,260 @@
+"""
+Génération d'une ville synthétique pour les tests de charge et benchmarks.
+Les données sont déterministes pour une graine donnée et écrites par lots
+(bulk_create) dans des transactions, sans garder toute la ville en mémoire.
+"""
+import random
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .geo import encode_geohash
+from .models import (
+    Team, CollectionPoint, Truck, Report, Schedule,
+    ScheduleRoute, Incident
+)
+
+User = get_user_model()
+
+# Quartiers de Dakar : (nom, latitude, longitude, poids)
+NEIGHBOURHOODS = [
+    ('Yoff', 14.7395, -17.4734, 3),
+    ('Ouest Foire', 14.7167, -17.4833, 2),
+    ('Grand Yoff', 14.7500, -17.4667, 4),
+    ('Point E', 14.6928, -17.4467, 2),
+    ('Ouakam', 14.7167, -17.5000, 2),
+    ('Ngor', 14.7500, -17.5167, 1),
+    ('Guédiawaye', 14.7667, -17.4167, 5),
+    ('Pikine', 14.7547, -17.3928, 6),
+    ('Dakar Plateau', 14.6700, -17.4380, 3),
+    ('Médina', 14.6800, -17.4500, 3),
+    ('Parcelles Assainies', 14.7650, -17.4400, 4),
+    ('Mbao', 14.7297, -17.3436, 2),
+]
+NEIGHBOURHOOD_WEIGHTS = [weight for _, _, _, weight in NEIGHBOURHOODS]
+CLUSTER_SPREAD = 0.008  # écart type en degrés (~900 m)
+
+# Volumes d'une ville complète (--scale 1)
+FULL_SCALE = {
+    'points': 50_000,
+    'trucks': 500,
+    'reports': 1_000_000,
+    'days': 365,
+}
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def scaled_volumes(scale):
+    return {name: max(1, int(volume * scale)) for name, volume in FULL_SCALE.items()}
+
+
+def _position(rng):
+    name, latitude, longitude, _ = rng.choices(NEIGHBOURHOODS, weights=NEIGHBOURHOOD_WEIGHTS)[0]
+    return (
+        name,
+        rng.gauss(latitude, CLUSTER_SPREAD),
+        rng.gauss(longitude, CLUSTER_SPREAD),
+    )
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_insert(model, rows, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    """
+    Insérer un flux d'instances par lots, chaque lot dans sa transaction.
+    Retourne les instances créées si on_batch est None, sinon appelle
+    on_batch(lot) et ne garde rien en mémoire.
+    """
+    created = []
+    for chunk in _chunks(rows, batch_size):
+        with transaction.atomic():
+            chunk = model.objects.bulk_create(chunk, batch_size=batch_size)
+        if on_batch is None:
+            created.extend(chunk)
+        else:
+            on_batch(chunk)
+    return created
+
+
+def seed_city(points=200, trucks=20, reports=500, days=7, seed=0, route_length=10,
+              batch_size=DEFAULT_BATCH_SIZE, log=None):
+    """
+    Créer une ville synthétique : points de collecte regroupés par quartier,
+    flotte, équipes, signalements et `days` jours de plannings centrés sur
+    aujourd'hui. Retourne le nombre de lignes créées par modèle.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    team_count = max(1, trucks // 2)
+    counts = {}
+
+    def progress(name, count):
+        counts[name] = count
+        if log:
+            log(f'{count} {name} créés')
+
+    drivers = bulk_insert(User, (
+        User(
+            username=f'synthetic_{seed}_collector_{index}',
+            email=f'collector{index}.{seed}@synthetic.dechetsko.com',
+            first_name='Collecteur',
+            last_name=str(index),
+            role='collector',
+            password='!',
+        )
+        for index in range(max(trucks, team_count))
+    ), batch_size)
+    progress('users', len(drivers))
+
+    teams = bulk_insert(Team, (
+        Team(
+            name=f'Équipe {seed}-{index + 1}',
+            leader=drivers[index],
+            specialization=rng.choice(Team.SPECIALIZATION_CHOICES)[0],
+        )
+        for index in range(team_count)
+    ), batch_size)
+    for index, driver in enumerate(drivers):
+        driver.team = teams[index % team_count]
+    with transaction.atomic():
+        User.objects.bulk_update(drivers, ['team'], batch_size=batch_size)
+    progress('teams', len(teams))
+
+    def collection_points():
+        for index in range(points):
+            neighbourhood, latitude, longitude = _position(rng)
+            yield CollectionPoint(
+                name=f'{neighbourhood} #{index + 1}',
+                address=f'Rue {index + 1}, {neighbourhood}, Dakar',
+                latitude=latitude,
+                longitude=longitude,
+                # bulk_create n'appelle pas save() : l'index spatial est calculé ici
+                geohash=encode_geohash(latitude, longitude),
+                type=rng.choice(CollectionPoint.TYPE_CHOICES)[0],
+                status=rng.choice(CollectionPoint.STATUS_CHOICES)[0],
+                last_collection=now - timedelta(hours=rng.randint(1, 96)),
+                next_collection=now + timedelta(hours=rng.randint(1, 96)),
+            )
+
+    # Seuls les identifiants et positions sont gardés pour les signalements et tournées
+    point_refs = []
+    bulk_insert(CollectionPoint, collection_points(), batch_size, on_batch=lambda chunk: point_refs.extend(
+        (point.id, point.latitude, point.longitude, point.address) for point in chunk
+    ))
+    progress('collection_points', len(point_refs))
+
+    def fleet():
+        for index in range(trucks):
+            _, latitude, longitude = _position(rng)
+            yield Truck(
+                plate_number=f'DK-{seed:03d}-{index:05d}',
+                driver=drivers[index],
+                current_latitude=latitude,
+                current_longitude=longitude,
+                status=rng.choice(Truck.STATUS_CHOICES)[0],
+            )
+
+    fleet_created = bulk_insert(Truck, fleet(), batch_size)
+    progress('trucks', len(fleet_created))
+
+    def citizen_reports():
+        for index in range(reports):
+            _, latitude, longitude, address = rng.choice(point_refs)
+            yield Report(
+                type=rng.choice(Report.TYPE_CHOICES)[0],
+                description=f'Signalement synthétique {index + 1}',
+                latitude=latitude + rng.gauss(0, 0.0002),
+                longitude=longitude + rng.gauss(0, 0.0002),
+                address=address,
+                reported_by=f'citoyen{index}@synthetic.sn',
+                reporter_type=rng.choice(Report.REPORTER_TYPE_CHOICES)[0],
+                status=rng.choice(Report.STATUS_CHOICES)[0],
+                priority=rng.choice(Report.PRIORITY_CHOICES)[0],
+            )
+
+    report_count = 0
+
+    def count_reports(chunk):
+        nonlocal report_count
+        report_count += len(chunk)
+
+    bulk_insert(Report, citizen_reports(), batch_size, on_batch=count_reports)
+    progress('reports', report_count)
+
+    # Plannings : chaque équipe a une tournée par jour, du passé vers le futur
+    schedule_count = 0
+    route_count = 0
+    today = now.date()
+    first_day = today - timedelta(days=days // 2)
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        if day < today:
+            statuses = ['completed'] * 9 + ['cancelled']
+        elif day == today:
+            statuses = ['in_progress', 'planned']
+        else:
+            statuses = ['planned']
+
+        with transaction.atomic():
+            schedules = Schedule.objects.bulk_create([
+                Schedule(
+                    team=team,
+                    truck=fleet_created[index % len(fleet_created)],
+                    date=day,
+                    start_time='08:00',
+                    estimated_end_time='12:00',
+                    status=rng.choice(statuses),
+                )
+                for index, team in enumerate(teams)
+            ], batch_size=batch_size)
+
+            routes = []
+            for schedule in schedules:
+                stops = rng.sample(point_refs, min(route_length, len(point_refs)))
+                done = schedule.status == 'completed'
+                for order, (point_id, _, _, _) in enumerate(stops, start=1):
+                    completed_at = timezone.make_aware(
+                        datetime.combine(day, time(8)) + timedelta(minutes=15 * order)
+                    ) if done else None
+                    routes.append(ScheduleRoute(
+                        schedule=schedule,
+                        collection_point_id=point_id,
+                        order=order,
+                        completed=done,
+                        completed_at=completed_at,
+                        completion_changed_at=completed_at,
+                    ))
+            ScheduleRoute.objects.bulk_create(routes, batch_size=batch_size)
+        schedule_count += len(schedules)
+        route_count += len(routes)
+    progress('schedules', schedule_count)
+    progress('schedule_routes', route_count)
+
+    def incidents():
+        for index in range(max(1, trucks // 4)):
+            _, latitude, longitude = _position(rng)
+            yield Incident(
+                type=rng.choice(Incident.TYPE_CHOICES)[0],
+                description=f'Incident synthétique {index + 1}',
+                latitude=latitude,
+                longitude=longitude,
+                address='Dakar',
+                reported_by='synthetic',
+                severity=rng.choice(Incident.SEVERITY_CHOICES)[0],
+                impact='Retard sur la collecte',
+                estimated_delay=rng.randint(5, 120),
+            )
+
+    progress('incidents', len(bulk_insert(Incident, incidents(), batch_size)))
+    return counts
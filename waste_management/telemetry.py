@@ -0,0 +1,149 @@
+"""
+Ingestion de la télémétrie GPS des camions
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Case, When, Value, DateTimeField, FloatField
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Truck
+from . import eta, live, tracking
+from .cache import bump
+
+# Nombre maximal d'échantillons acceptés par requête
+MAX_SAMPLES_PER_REQUEST = 5000
+
+
+class TelemetryError(ValueError):
+    """
+    Échantillon de télémétrie invalide
+    """
+
+
+def parse_timestamp(value):
+    """
+    Accepter un horodatage ISO 8601 ou un epoch Unix (secondes)
+    """
+    if value is None:
+        return timezone.now()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if not math.isfinite(value):
+            raise TelemetryError(f'Horodatage invalide : {value!r}')
+        try:
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise TelemetryError(f'Horodatage invalide : {value!r}')
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is not None:
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed, dt_timezone.utc)
+            return parsed
+    raise TelemetryError(f'Horodatage invalide : {value!r}')
+
+
+def parse_sample(sample):
+    """
+    Valider un échantillon et retourner (truck_id, latitude, longitude, timestamp)
+    """
+    if not isinstance(sample, dict):
+        raise TelemetryError('Chaque échantillon doit être un objet')
+    try:
+        truck_id = int(sample.get('truck_id', sample.get('truckId')))
+        latitude = float(sample['latitude'])
+        longitude = float(sample['longitude'])
+    except (KeyError, TypeError, ValueError):
+        raise TelemetryError('truck_id, latitude et longitude sont requis')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise TelemetryError(f'Coordonnées hors limites pour le camion {truck_id}')
+    return truck_id, latitude, longitude, parse_timestamp(sample.get('timestamp'))
+
+
+def group_samples(samples):
+    """
+    Regrouper les échantillons par camion.
+    Retourne {truck_id: [(timestamp, latitude, longitude), ...]}
+    """
+    points_by_truck = {}
+    for sample in samples:
+        truck_id, latitude, longitude, timestamp = parse_sample(sample)
+        points_by_truck.setdefault(truck_id, []).append((timestamp, latitude, longitude))
+    return points_by_truck
+
+
+def coalesce_samples(points_by_truck):
+    """
+    Ne garder que l'échantillon le plus récent de chaque camion.
+    Retourne {truck_id: (latitude, longitude, timestamp)}
+    """
+    latest = {}
+    for truck_id, points in points_by_truck.items():
+        timestamp, latitude, longitude = max(points, key=lambda point: point[0])
+        latest[truck_id] = (latitude, longitude, timestamp)
+    return latest
+
+
+def flush_positions(latest):
+    """
+    Écrire la dernière position de chaque camion en un seul UPDATE.
+    Un échantillon plus ancien que la position enregistrée (lot arrivé en
+    retard) est ignoré : le camion ne recule pas.
+    Retourne {truck_id: (latitude, longitude, timestamp)} des positions écrites.
+    """
+    if not latest:
+        return {}
+
+    stored = dict(
+        Truck.objects.select_for_update().filter(id__in=list(latest)).values_list('id', 'position_at')
+    )
+    latest = {
+        truck_id: sample for truck_id, sample in latest.items()
+        if truck_id in stored and (stored[truck_id] is None or sample[2] > stored[truck_id])
+    }
+    if not latest:
+        return {}
+
+    latitude_cases = [When(id=truck_id, then=Value(lat)) for truck_id, (lat, _, _) in latest.items()]
+    longitude_cases = [When(id=truck_id, then=Value(lon)) for truck_id, (_, lon, _) in latest.items()]
+    timestamp_cases = [When(id=truck_id, then=Value(at)) for truck_id, (_, _, at) in latest.items()]
+
+    Truck.objects.filter(id__in=list(latest)).update(
+        current_latitude=Case(*latitude_cases, output_field=FloatField()),
+        current_longitude=Case(*longitude_cases, output_field=FloatField()),
+        position_at=Case(*timestamp_cases, output_field=DateTimeField()),
+        updated_at=timezone.now(),
+    )
+    bump(Truck)
+    return latest
+
+
+def ingest(samples):
+    """
+    Valider, regrouper puis écrire un lot d'échantillons : dernière position
+    de chaque camion et historique complet.
+    Retourne (nombre d'échantillons, nombre de camions mis à jour)
+    """
+    if not isinstance(samples, list):
+        raise TelemetryError('Une liste d\'échantillons est attendue')
+    if len(samples) > MAX_SAMPLES_PER_REQUEST:
+        raise TelemetryError(f'Au plus {MAX_SAMPLES_PER_REQUEST} échantillons par requête')
+
+    points_by_truck = group_samples(samples)
+    known_ids = set(Truck.objects.filter(id__in=list(points_by_truck)).values_list('id', flat=True))
+    points_by_truck = {
+        truck_id: points for truck_id, points in points_by_truck.items() if truck_id in known_ids
+    }
+
+    latest = coalesce_samples(points_by_truck)
+    with transaction.atomic():
+        latest = flush_positions(latest)
+        tracking.append_positions(points_by_truck)
+        for truck_id, points in points_by_truck.items():
+            for timestamp, latitude, longitude in sorted(points):
+                eta.speeds.observe(truck_id, timestamp, latitude, longitude)
+        eta.refresh_etas(latest)
+        live.publish_positions(latest)
+    return len(samples), len(latest)
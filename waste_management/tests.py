@@ -0,0 +1,768 @@
+"""
+Nombre de requêtes SQL des endpoints de lecture : il ne doit pas dépendre
+du volume de données (pas de N+1). Chaque liste et chaque détail est mesuré
+sur deux villes synthétiques de tailles différentes, avec les budgets de
+benchmark_api.
+
+Comportements : pagination par curseur, historique des positions,
+télémétrie, journal hors ligne, doublons, synchronisation, mises à jour de
+terrain, filtres spatiaux, affectation, validateurs HTTP, ETA, statistiques,
+planification et temps réel, entrées invalides comprises.
+"""
+import base64
+import json
+import time as time_module
+import uuid
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import parse_http_date
+from rest_framework.test import APIClient
+
+from . import checks, dedup, dispatch, eta, fieldwork, live, nearest, oplog, planner, sync, telemetry, tracking
+from .aggregation import period_label, refresh_statistics
+from .cache import get_response_cache
+from .management.commands.benchmark_api import QUERY_BUDGETS
+from .models import (
+    CollectionPoint, LiveEvent, Report, Schedule, ScheduleRoute, StaleMonth, Statistics, Team, Truck,
+    TruckPositionChunk
+)
+from .routing import optimize_path
+from .synthetic import seed_city
+from .urls import router
+
+User = get_user_model()
+
+
+class QueryCountMixin:
+    """
+    Listes et détails du routeur : autant de requêtes que le budget, quel
+    que soit le volume
+    """
+    volumes = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_city(**cls.volumes)
+        cls.user = User.objects.create_user(
+            username='queries', email='queries@dechetsko.com', password='queries-password', role='coordinator'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertQueries(self, name, url):
+        # Premier appel hors mesure (index en mémoire, calculs initiaux)
+        self.client.get(url)
+        get_response_cache().backend.clear()
+        with self.subTest(endpoint=name), self.assertNumQueries(QUERY_BUDGETS[name]):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, name)
+
+    def test_list_queries(self):
+        for prefix, _, basename in router.registry:
+            self.assertQueries(f'{prefix}-list', reverse(f'{basename}-list'))
+
+    def test_detail_queries(self):
+        for prefix, viewset, basename in router.registry:
+            instance = viewset.queryset.model.objects.order_by('pk').first()
+            if instance is None:
+                continue
+            self.assertQueries(f'{prefix}-detail', reverse(f'{basename}-detail', kwargs={'pk': instance.pk}))
+
+
+class SmallCityQueryCountTests(QueryCountMixin, TestCase):
+    volumes = {'points': 20, 'trucks': 4, 'reports': 30, 'days': 2}
+
+
+class LargeCityQueryCountTests(QueryCountMixin, TestCase):
+    volumes = {'points': 300, 'trucks': 30, 'reports': 1500, 'days': 7}
+
+
+def reset_memory():
+    """
+    Index et caches en mémoire du processus : les identifiants sont
+    réutilisés d'un test à l'autre (rollback), rien ne doit survivre
+    """
+    dedup._index = None
+    nearest.index = nearest.TruckIndex()
+    eta.speeds.last.clear()
+    eta.speeds.speeds.clear()
+    eta.geometry.key = None
+    get_response_cache().backend.clear()
+
+
+def encode(payload):
+    raw = payload if isinstance(payload, str) else json.dumps(payload)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def new_report(**fields):
+    return Report.objects.create(**{
+        'type': 'overflow', 'description': 'Bac plein', 'latitude': 14.6928, 'longitude': -17.4467,
+        'address': 'Dakar', 'reported_by': 'test', **fields,
+    })
+
+
+class CityMixin:
+    """
+    Une équipe, son camion en tournée aujourd'hui et trois points de collecte
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.team = Team.objects.create(name='Plateau')
+        cls.user = User.objects.create_user(
+            username='coordinator', password='coordinator-password', role='coordinator', team=cls.team
+        )
+        cls.truck = Truck.objects.create(
+            plate_number='DK-0001', driver=cls.user, current_latitude=14.69, current_longitude=-17.44
+        )
+        cls.points = [
+            CollectionPoint.objects.create(
+                name=f'Point {index}', address='Dakar', type='bin',
+                latitude=14.69 + index * 0.01, longitude=-17.44,
+            )
+            for index in range(3)
+        ]
+        cls.schedule = Schedule.objects.create(
+            team=cls.team, truck=cls.truck, date=timezone.localdate(),
+            start_time=time(7), estimated_end_time=time(15), status='in_progress',
+        )
+        cls.routes = [
+            ScheduleRoute.objects.create(schedule=cls.schedule, collection_point=point, order=order)
+            for order, point in enumerate(cls.points, start=1)
+        ]
+
+    def setUp(self):
+        reset_memory()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Flux des signalements par curseur
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        reports = [new_report(description=f'Signalement {index}') for index in range(7)]
+        # Dates égales : l'id départage
+        Report.objects.filter(id__in=[report.id for report in reports[:4]]).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+        cls.expected = list(Report.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        reset_memory()
+        self.client = APIClient()
+
+    def test_next_links_walk_the_feed(self):
+        url, ids, pages = reverse('report-list') + '?page_size=3&count=false', [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(pages, 3)
+
+    def test_previous_link_returns_the_previous_page(self):
+        first = self.client.get(reverse('report-list'), {'page_size': 3})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(first.data['count'], 7)
+        self.assertIsNone(first.data['previous'])
+        self.assertEqual([item['id'] for item in second.data['results']], self.expected[3:6])
+        self.assertEqual([item['id'] for item in back.data['results']], self.expected[:3])
+
+    def test_malformed_cursors_are_not_found(self):
+        for cursor in (
+            '%%%', encode('pas du json'), encode([1, 2]), encode({'v': [None, None]}),
+            encode({'v': ['2025-01-16T08:00:00Z']}), encode({'v': ['pas une date', 1]}),
+            encode({'v': ['2025-01-16T08:00:00Z', 'x']}),
+        ):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(reverse('report-list'), {'cursor': cursor}).status_code, 404)
+
+
+class PositionHistoryTests(TestCase):
+    """
+    Historique compressé des positions (deltas en varint)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.truck = Truck.objects.create(plate_number='DK-0002')
+
+    def assertTrack(self, track, points):
+        self.assertEqual([point[0] for point in track], [point[0] for point in points])
+        for (_, latitude, longitude), (_, expected_lat, expected_lon) in zip(track, points):
+            self.assertAlmostEqual(latitude, expected_lat, places=6)
+            self.assertAlmostEqual(longitude, expected_lon, places=6)
+
+    def test_round_trip_across_midnight_and_signs(self):
+        start = datetime(2025, 1, 16, 23, 58, tzinfo=dt_timezone.utc)
+        points = [
+            (start + timedelta(seconds=30 * index, milliseconds=index), latitude, longitude)
+            for index, (latitude, longitude) in enumerate([
+                (14.716543, -17.467891), (-33.918861, 18.4233), (89.999999, -179.999999),
+                (-89.999999, 179.999999), (0.0, 0.0), (14.716544, -17.467892),
+            ])
+        ]
+        # Deux envois, le premier dans le désordre
+        tracking.append_positions({self.truck.id: points[3:][::-1]})
+        tracking.append_positions({self.truck.id: points[:3]})
+
+        track = list(tracking.iter_track(self.truck.id, start - timedelta(days=1), start + timedelta(days=1)))
+        self.assertTrack(track, points)
+
+    def test_chunks_are_capped_and_windowed(self):
+        start = datetime(2025, 1, 16, 8, tzinfo=dt_timezone.utc)
+        size = TruckPositionChunk.CHUNK_SIZE + 5
+        points = [(start + timedelta(seconds=index), 14.7 + index * 1e-5, -17.4) for index in range(size)]
+        tracking.append_positions({self.truck.id: points})
+
+        self.assertEqual(TruckPositionChunk.objects.filter(truck=self.truck).count(), 2)
+        self.assertTrack(list(tracking.iter_track(self.truck.id, start, start + timedelta(hours=1))), points)
+        window = tracking.iter_track(self.truck.id, start + timedelta(seconds=10), start + timedelta(seconds=19))
+        self.assertTrack(list(window), points[10:20])
+
+
+class TelemetryTests(CityMixin, TestCase):
+    """
+    Ingestion groupée des positions GPS
+    """
+
+    def sample(self, latitude=14.70, longitude=-17.45, at=None, **fields):
+        return {
+            'truck_id': self.truck.id, 'latitude': latitude, 'longitude': longitude,
+            'timestamp': (at or timezone.now()).isoformat(), **fields,
+        }
+
+    def test_invalid_timestamps(self):
+        for value in (1e20, -1e20, float('nan'), float('inf'), True, 'pas une date', []):
+            with self.subTest(value=value), self.assertRaises(telemetry.TelemetryError):
+                telemetry.parse_timestamp(value)
+
+    def test_malformed_batches_are_rejected(self):
+        for samples in (
+            [self.sample(timestamp=1e20)], [self.sample(timestamp='nan')], [self.sample(latitude=95)],
+            [self.sample(longitude='inf')], [{'truck_id': self.truck.id}], ['pas un objet'], 'pas une liste',
+        ):
+            with self.subTest(samples=samples):
+                response = self.client.post(reverse('truck-telemetry'), {'samples': samples}, format='json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_late_batches_only_extend_the_history(self):
+        now = timezone.now()
+        received, updated = telemetry.ingest([
+            self.sample(14.71, at=now - timedelta(minutes=1)), self.sample(14.72, at=now),
+        ])
+        self.assertEqual((received, updated), (2, 1))
+
+        received, updated = telemetry.ingest([self.sample(14.60, at=now - timedelta(minutes=5))])
+        self.assertEqual((received, updated), (1, 0))
+        self.truck.refresh_from_db()
+        self.assertEqual((self.truck.current_latitude, self.truck.position_at), (14.72, now))
+        self.assertEqual(len(list(tracking.iter_track(self.truck.id, now - timedelta(hours=1), now))), 3)
+
+    def test_unknown_trucks_are_skipped(self):
+        self.assertEqual(telemetry.ingest([self.sample(truck_id=999999)]), (1, 0))
+
+
+class OplogTests(CityMixin, TestCase):
+    """
+    Relecture du journal hors ligne : renvois et dernier écrivain gagnant
+    """
+
+    def operation(self, name, target, at, data=None):
+        return {'id': uuid.uuid4().hex, 'op': name, 'object': target.id, 'timestamp': at.isoformat(), 'data': data}
+
+    def test_resent_operations_are_applied_once(self):
+        operation = self.operation(oplog.POINT_STATUS, self.points[0], timezone.now(), {'status': 'full'})
+        self.assertEqual(oplog.replay([operation, operation])['results'], [fieldwork.OK, oplog.DUPLICATE])
+        self.assertEqual(oplog.replay([operation]), {'results': [oplog.DUPLICATE], 'applied': 0})
+
+    def test_operations_are_applied_by_date(self):
+        now, point = timezone.now(), self.points[0]
+        oplog.replay([
+            self.operation(oplog.POINT_STATUS, point, now, {'status': 'full'}),
+            self.operation(oplog.POINT_STATUS, point, now - timedelta(minutes=10), {'status': 'half'}),
+        ])
+        point.refresh_from_db()
+        self.assertEqual((point.status, point.status_changed_at), ('full', now))
+
+        late = self.operation(oplog.POINT_STATUS, point, now - timedelta(minutes=5), {'status': 'overflow'})
+        self.assertEqual(oplog.replay([late])['results'], [fieldwork.STALE])
+        point.refresh_from_db()
+        self.assertEqual(point.status, 'full')
+
+    def test_server_writes_do_not_make_stops_stale(self):
+        route, done_at = self.routes[0], timezone.now() - timedelta(minutes=30)
+        # Réordonnancement par le serveur après la collecte hors ligne
+        route.order = 10
+        route.save()
+        self.assertEqual(oplog.replay([self.operation(oplog.MARK_COMPLETED, route, done_at)])['results'], ['ok'])
+        route.refresh_from_db()
+        self.assertEqual((route.completed, route.completed_at, route.completion_changed_at), (True, done_at, done_at))
+
+        undo = self.operation(oplog.MARK_INCOMPLETE, route, done_at - timedelta(minutes=1))
+        self.assertEqual(oplog.replay([undo])['results'], [fieldwork.STALE])
+
+    def test_older_locations_are_stale(self):
+        now = timezone.now()
+        moved = self.operation(oplog.TRUCK_LOCATION, self.truck, now, {
+            'current_location': {'latitude': 14.75, 'longitude': -17.45}
+        })
+        older = self.operation(oplog.TRUCK_LOCATION, self.truck, now - timedelta(minutes=1), {
+            'current_location': {'latitude': 14.60, 'longitude': -17.45}
+        })
+        self.assertEqual(oplog.replay([moved])['results'], ['ok'])
+        self.assertEqual(oplog.replay([older])['results'], [fieldwork.STALE])
+        self.truck.refresh_from_db()
+        self.assertEqual((self.truck.current_latitude, self.truck.position_at), (14.75, now))
+
+    def test_malformed_operations_are_invalid(self):
+        now, point = timezone.now(), self.points[0]
+        valid = self.operation(oplog.POINT_STATUS, point, now, {'status': 'full'})
+        result = oplog.replay([
+            {**valid, 'id': ''}, {**valid, 'id': 12}, {**valid, 'op': 'inconnu'}, {**valid, 'timestamp': None},
+            {**valid, 'timestamp': 1e20}, {**valid, 'object': 'x'}, {**valid, 'data': {'status': 'inconnu'}},
+            {**valid, 'data': []}, 'pas un objet',
+            self.operation(oplog.TRUCK_LOCATION, self.truck, now, {'current_location': {'latitude': 'nan'}}),
+            self.operation(oplog.MARK_COMPLETED, self.truck, now) | {'object': 999999},
+        ])
+        self.assertEqual(result['results'], [fieldwork.INVALID] * 10 + [fieldwork.NOT_FOUND])
+        self.assertEqual(result['applied'], 0)
+
+        response = self.client.post(reverse('oplog'), {'operations': 'pas une liste'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DuplicateReportTests(TestCase):
+    """
+    Regroupement des signalements proches à la réception
+    """
+    fields = {
+        'type': 'overflow', 'description': 'Bac plein', 'latitude': 14.6928, 'longitude': -17.4467,
+        'address': 'Dakar', 'reported_by': 'test',
+    }
+
+    def setUp(self):
+        reset_memory()
+
+    def test_nearby_report_of_the_same_type_is_attached(self):
+        primary = dedup.create_report(**self.fields)
+        duplicate = dedup.create_report(**{**self.fields, 'latitude': 14.6929})
+        third = dedup.create_report(**{**self.fields, 'longitude': -17.4466})
+        self.assertIsNone(primary.duplicate_of_id)
+        self.assertEqual((duplicate.duplicate_of_id, duplicate.status), (primary.id, dedup.DUPLICATE_STATUS))
+        self.assertEqual((third.duplicate_of_id, third.cluster_count), (primary.id, 3))
+
+    def test_other_type_distance_or_status_starts_a_cluster(self):
+        primary = dedup.create_report(**self.fields)
+        self.assertIsNone(dedup.create_report(**{**self.fields, 'type': 'damage'}).duplicate_of_id)
+        self.assertIsNone(dedup.create_report(**{**self.fields, 'latitude': 14.70}).duplicate_of_id)
+        Report.objects.filter(id=primary.id).update(status='resolved')
+        self.assertIsNone(dedup.create_report(**self.fields).duplicate_of_id)
+
+    def test_report_committed_after_the_index_read_is_found(self):
+        dedup.get_index().sync(timezone.now())
+        # Validé après la lecture de l'index, avec une date antérieure
+        late = new_report()
+        Report.objects.filter(id=late.id).update(created_at=timezone.now() - timedelta(seconds=2))
+        self.assertEqual(dedup.create_report(**self.fields).duplicate_of_id, late.id)
+
+
+@mock.patch('waste_management.sync.SYNC_LAG', timedelta(0))
+class SyncTests(CityMixin, TestCase):
+    """
+    Synchronisation incrémentale et traces de suppression
+    """
+
+    def changes(self, token=None):
+        response = self.client.get(reverse('sync'), {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_changes_and_deletions_since_the_token(self):
+        full = self.changes()
+        self.assertTrue(full['reset'])
+        self.assertEqual(sorted(row['id'] for row in full['collection_points']), [point.id for point in self.points])
+        self.assertEqual(self.changes(full['token'])['collection_points'], [])
+
+        changed, deleted = self.points[0], self.points[1]
+        changed.status = 'full'
+        changed.save()
+        deleted_id = deleted.id
+        deleted.delete()
+        delta = self.changes(full['token'])
+        self.assertFalse(delta['reset'])
+        self.assertEqual([row['id'] for row in delta['collection_points']], [changed.id])
+        self.assertEqual(delta['deleted']['collection_points'], [deleted_id])
+        self.assertEqual(delta['deleted']['schedule_routes'], [self.routes[1].id])
+
+        self.assertEqual(self.changes(delta['token'])['deleted']['collection_points'], [])
+
+    def test_limit_pages_through_changes(self):
+        first = self.changes()
+        response = self.client.get(reverse('sync'), {'limit': 2})
+        self.assertTrue(response.data['data']['has_more'])
+        rest = self.changes(response.data['data']['token'])
+        ids = [row['id'] for row in response.data['data']['collection_points'] + rest['collection_points']]
+        self.assertEqual(ids, [row['id'] for row in first['collection_points']])
+
+    def test_naive_token_dates_are_utc(self):
+        token = encode({'collection_points': ['2025-01-16T08:00:00', 0]})
+        self.assertEqual(len(self.changes(token)['collection_points']), 3)
+
+    def test_expired_deletion_position_forces_a_reset(self):
+        expired = timezone.now() - sync.TOMBSTONE_RETENTION - timedelta(days=1)
+        self.assertTrue(self.changes(sync.encode_token({sync.TOMBSTONES: (expired, 0)}))['reset'])
+
+    def test_malformed_tokens_are_rejected(self):
+        for token in (
+            'xyz', encode('[]'), encode('pas du json'), encode({'collection_points': ['pas une date', 0]}),
+            encode({'trucks': [None, 1]}), encode({'trucks': ['2025-01-16T08:00:00Z']}),
+            encode({'trucks': ['2025-01-16T08:00:00Z', 'x']}),
+        ):
+            with self.subTest(token=token):
+                self.assertEqual(self.client.get(reverse('sync'), {'since': token}).status_code, 400)
+
+
+class FieldUpdateTests(CityMixin, TestCase):
+    """
+    Arrêts complétés et statuts des points en une requête
+    """
+
+    def post(self, stops=(), points=()):
+        response = self.client.post(
+            reverse('field-updates'), {'stops': list(stops), 'points': list(points)}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_one_code_per_item(self):
+        now = timezone.now().isoformat()
+        data = self.post(
+            stops=[
+                {'id': self.routes[0].id, 'at': now}, {'id': 999999, 'at': now}, {'id': 'x'},
+                {'id': self.routes[1].id, 'completed': 'oui'}, 'pas un objet',
+            ],
+            points=[
+                {'id': self.points[1].id, 'status': 'full', 'at': now}, {'id': self.points[1].id, 'status': 'inconnu'},
+                {'id': self.points[2].id, 'status': 'full', 'at': 1e20}, {'id': 999999, 'status': 'full'},
+            ],
+        )
+        self.assertEqual(data['stops'], ['ok', 'not_found', 'invalid', 'invalid', 'invalid'])
+        self.assertEqual(data['points'], ['ok', 'invalid', 'invalid', 'not_found'])
+
+    def test_completed_stop_empties_its_point_once(self):
+        point = self.points[0]
+        CollectionPoint.objects.filter(id=point.id).update(status='full')
+        at = timezone.now()
+        item = {'id': self.routes[0].id, 'completed': True, 'at': at.isoformat()}
+        self.assertEqual(self.post(stops=[item])['applied'], 2)
+        point.refresh_from_db()
+        self.assertEqual((point.status, point.last_collection), ('empty', at))
+
+        # Rejoué à l'identique (réseau instable) : rien de plus
+        replayed = self.post(stops=[item])
+        self.assertEqual((replayed['stops'], replayed['applied']), (['ok'], 0))
+
+    def test_older_status_is_stale(self):
+        point, now = self.points[0], timezone.now()
+        self.post(points=[{'id': point.id, 'status': 'full', 'at': now.isoformat()}])
+        data = self.post(points=[{'id': point.id, 'status': 'half', 'at': (now - timedelta(hours=1)).isoformat()}])
+        self.assertEqual(data['points'], [fieldwork.STALE])
+        point.refresh_from_db()
+        self.assertEqual(point.status, 'full')
+
+    def test_body_must_hold_lists(self):
+        for body in ({'stops': 'x'}, {'points': {'id': 1}}):
+            with self.subTest(body=body):
+                self.assertEqual(self.client.post(reverse('field-updates'), body, format='json').status_code, 400)
+
+
+class SpatialFilterTests(CityMixin, TestCase):
+    """
+    Filtres bbox et near des points de collecte
+    """
+
+    def ids(self, params):
+        response = self.client.get(reverse('collectionpoint-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(item['id'] for item in response.data['results'])
+
+    def test_bbox_and_radius(self):
+        self.assertEqual(self.ids({'bbox': '14.685,-17.45,14.705,-17.43'}), [self.points[0].id, self.points[1].id])
+        self.assertEqual(self.ids({'near': '14.69,-17.44', 'radius': '0.5'}), [self.points[0].id])
+        self.assertEqual(self.ids({'near': '14.69,-17.44', 'radius': '2.5'}), [point.id for point in self.points])
+
+    def test_malformed_values_are_rejected(self):
+        for params in (
+            {'bbox': '14,-18,15'}, {'bbox': 'nan,-18,15,-17'}, {'bbox': '14,-18,inf,-17'}, {'bbox': '15,-18,14,-17'},
+            {'bbox': '-91,-18,14,-17'}, {'bbox': '14,-181,15,-17'}, {'near': 'inf,-17.4'}, {'near': '14.7,nan'},
+            {'near': '91,-17.4'}, {'near': '14.7'}, {'near': '14.7,-17.4', 'radius': '0'},
+            {'near': '14.7,-17.4', 'radius': '500'}, {'near': '14.7,-17.4', 'radius': 'nan'},
+            {'near': '14.7,-17.4', 'radius': 'x'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('collectionpoint-list'), params).status_code, 400)
+
+
+class NearestTruckTests(CityMixin, TestCase):
+    """
+    Camions disponibles les plus proches
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.far = Truck.objects.create(plate_number='DK-0003', current_latitude=14.80, current_longitude=-17.44)
+        Truck.objects.create(plate_number='DK-0004')  # jamais localisé
+        Truck.objects.create(plate_number='DK-0005', status='maintenance', current_latitude=14.69, current_longitude=-17.44)
+
+    def test_closest_available_trucks_first(self):
+        response = self.client.get(reverse('truck-nearest-trucks'), {'latitude': 14.70, 'longitude': -17.44, 'k': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['truck_id'] for row in response.data['data']], [self.truck.id, self.far.id])
+
+        report = new_report(latitude=14.79, longitude=-17.44)
+        response = self.client.get(reverse('truck-nearest-trucks'), {'reports': f'{report.id},999999', 'k': 1})
+        self.assertEqual(response.data['data'], [
+            {'report': report.id, 'trucks': [{'truck_id': self.far.id, 'plate_number': 'DK-0003',
+                                              'distance_km': response.data['data'][0]['trucks'][0]['distance_km']}]},
+        ])
+
+    def test_malformed_positions_are_rejected(self):
+        for params in (
+            {'latitude': 'nan', 'longitude': '-17.4'}, {'latitude': '14.7', 'longitude': 'inf'},
+            {'latitude': '91', 'longitude': '-17.4'}, {'latitude': '14.7', 'longitude': '181'},
+            {'latitude': '14.7'}, {'latitude': 'x', 'longitude': '-17.4'}, {'report': 'x'},
+            {'latitude': '14.7', 'longitude': '-17.4', 'k': 'x'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('truck-nearest-trucks'), params).status_code, 400)
+        self.assertEqual(self.client.get(reverse('truck-nearest-trucks'), {'report': 999999}).status_code, 404)
+
+
+class DispatchTests(CityMixin, TestCase):
+    """
+    Affectation en une passe des signalements en attente
+    """
+
+    def test_negative_or_malformed_limits_are_rejected(self):
+        for limit in (-1, 'x'):
+            with self.subTest(limit=limit):
+                response = self.client.post(reverse('report-dispatch-backlog'), {'limit': limit}, format='json')
+                self.assertEqual(response.status_code, 400)
+        with self.assertRaises(ValueError):
+            dispatch.assign_backlog(limit=-1)
+        with self.assertRaises(CommandError):
+            call_command('dispatch_reports', limit=-1, stdout=StringIO())
+
+    def test_backlog_is_assigned_within_the_limit(self):
+        for index in range(3):
+            new_report(latitude=14.69 + index * 0.01)
+        response = self.client.post(reverse('report-dispatch-backlog'), {'limit': 2, 'dry_run': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['assigned'], 2)
+        self.assertFalse(Report.objects.filter(assigned_team__isnull=False).exists())
+
+        response = self.client.post(reverse('report-dispatch-backlog'), {'limit': 0}, format='json')
+        self.assertEqual((response.status_code, response.data['data']['assigned']), (200, 0))
+
+        self.client.post(reverse('report-dispatch-backlog'), {}, format='json')
+        self.assertEqual(Report.objects.filter(assigned_team=self.team).count(), 3)
+
+
+class ConditionalGetTests(CityMixin, TestCase):
+    """
+    ETag et Last-Modified tirés des versions du cache de réponses
+    """
+
+    def test_etag_changes_after_a_write(self):
+        url = reverse('collectionpoint-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('collectionpoint-update-status', kwargs={'pk': self.points[0].pk}), {'status': 'full'}
+            )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified_waits_for_the_second_to_pass(self):
+        url = reverse('collectionpoint-list')
+        response = self.client.get(url)
+        if response.has_header('Last-Modified'):
+            self.assertLessEqual(parse_http_date(response['Last-Modified']), time_module.time())
+
+        # Réponse mise en cache avec ses validateurs : recalculés après expiration
+        get_response_cache().backend.clear()
+        with mock.patch('waste_management.conditional.time.time', return_value=time_module.time() + 2):
+            last_modified = self.client.get(url)['Last-Modified']
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_process_local_versions_fail_the_system_check(self):
+        versions = get_response_cache().backend.versions
+        self.assertEqual(checks.check_shared_cache_versions(None), [])
+        with mock.patch.object(versions, 'cache', LocMemCache('versions', {})):
+            errors = checks.check_shared_cache_versions(None)
+        self.assertEqual([error.id for error in errors], ['waste_management.E001'])
+
+
+class EtaTests(CityMixin, TestCase):
+    """
+    Temps estimés : vitesse observée enregistrée, camions sans données ignorés
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.idle = Truck.objects.create(plate_number='DK-0006', speed_kmh=20)
+        Schedule.objects.create(
+            team=cls.team, truck=cls.idle, date=timezone.localdate(),
+            start_time=time(7), estimated_end_time=time(15), status='in_progress',
+        ).route_points.create(collection_point=cls.points[0], order=1)
+
+    def test_fleet_refresh_needs_a_position_and_a_speed(self):
+        self.assertEqual(eta.refresh_etas(), {})
+
+        now = timezone.now()
+        eta.speeds.observe(self.truck.id, now - timedelta(minutes=1), 14.685, -17.44)
+        eta.speeds.observe(self.truck.id, now, 14.69, -17.44)
+        etas = eta.refresh_etas()
+        self.assertEqual(list(etas), [self.truck.id])
+        self.truck.refresh_from_db()
+        self.assertEqual(self.truck.speed_kmh, etas[self.truck.id].speed_kmh)
+        self.assertEqual(self.truck.estimated_time, etas[self.truck.id].minutes)
+
+        # Autre processus (tâche planifiée) : la vitesse enregistrée est reprise
+        reset_memory()
+        self.assertEqual(eta.refresh_etas()[self.truck.id].speed_kmh, self.truck.speed_kmh)
+
+    def test_explicit_trucks_without_position_are_skipped(self):
+        etas = eta.refresh_etas([self.idle.id, self.truck.id])
+        self.assertEqual(list(etas), [self.truck.id])
+        self.assertEqual(etas[self.truck.id].speed_kmh, eta.DEFAULT_SPEED_KMH)
+        self.assertIsNone(Truck.objects.get(id=self.idle.id).estimated_time)
+
+
+class StatisticsTests(CityMixin, TestCase):
+    """
+    Statistiques mensuelles : lecture seule, mois marqués par les écritures
+    """
+
+    def test_list_does_not_compute(self):
+        response = self.client.get(reverse('statistics-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['data'])
+        self.assertFalse(Statistics.objects.exists())
+
+    @mock.patch('waste_management.aggregation.STALE_MONTH_LAG', timedelta(0))
+    def test_only_source_changes_mark_months(self):
+        report = new_report()
+        StaleMonth.objects.all().delete()
+        report.description = 'Bac plein depuis hier'
+        report.save()
+        route = self.routes[0]
+        route.order = 5
+        route.save(update_fields=['order'])
+        self.assertFalse(StaleMonth.objects.exists())
+
+        report.status = 'resolved'
+        report.resolved_at = timezone.now()
+        report.save()
+        self.assertEqual(StaleMonth.objects.count(), 1)
+
+        refresh_statistics()
+        stats = Statistics.objects.get(period=period_label(timezone.localdate()))
+        self.assertEqual(stats.reports_resolved, 1)
+        self.assertFalse(StaleMonth.objects.exists())
+
+
+class RoutePlanningTests(CityMixin, TestCase):
+    """
+    Optimisation des tournées et planification du jour
+    """
+
+    def test_optimized_path_is_a_shorter_permutation(self):
+        stops = [(14.6 + lat, -17.5 + lon) for lat, lon in np.random.default_rng(0).random((30, 2)) * 0.1]
+        order, initial, optimized = optimize_path((14.6, -17.5), stops)
+        self.assertEqual(sorted(order), list(range(30)))
+        self.assertLessEqual(optimized, initial)
+        self.assertEqual(optimize_path(None, []), ([], 0.0, 0.0))
+        self.assertEqual(optimize_path(None, [(14.7, -17.4)]), ([0], 0.0, 0.0))
+
+    def test_plan_respects_capacity_and_busy_trucks(self):
+        CollectionPoint.objects.bulk_create([
+            CollectionPoint(
+                name=f'Plein {index}', address='Dakar', type='container', status='full',
+                latitude=14.70 + (index % 5) * 0.002, longitude=-17.46 + (index // 5) * 0.002,
+            )
+            for index in range(20)
+        ])
+        free = Truck.objects.create(
+            plate_number='DK-0007', driver=User.objects.create_user(username='driver', team=self.team),
+            current_latitude=14.70, current_longitude=-17.46,
+        )
+        plan = planner.plan_day(timezone.localdate())
+
+        # Le camion déjà en tournée n'est pas replanifié
+        self.assertEqual([route.truck_id for route in plan.routes], [free.id])
+        planned = plan.routes[0].point_ids
+        self.assertEqual(len(planned), len(set(planned)))
+        self.assertEqual(sorted(planned + plan.unplanned), sorted(set(planned + plan.unplanned)))
+        self.assertEqual((len(planned) + len(plan.unplanned), plan.due), (20, 20))
+        self.assertLessEqual(plan.routes[0].load, free.capacity)
+        self.assertEqual(len(planned), free.capacity // planner.LOAD_UNITS['container'])
+
+
+class LiveHubTests(TestCase):
+    """
+    Répartition des événements temps réel par zone et par équipe
+    """
+
+    def test_fan_out_by_zone_and_team(self):
+        hub = live.Hub(None, live.InProcessBroker())
+        zone = live.Subscriber(bbox=(14.6, -17.5, 14.8, -17.3))
+        team = live.Subscriber(team_id=1, point_ids=[5])
+        everyone = live.Subscriber()
+        for subscriber in (zone, team, everyone):
+            hub.channels.setdefault(subscriber.channel, set()).add(subscriber)
+
+        hub.fan_out([
+            {'type': 'truck', 'id': 1, 'team_id': 1, 'latitude': 14.7, 'longitude': -17.4},
+            {'type': 'truck', 'id': 2, 'team_id': 2, 'latitude': 10.0, 'longitude': -17.4},
+            {'type': 'collection_point', 'id': 5, 'latitude': None, 'longitude': None},
+        ])
+
+        def received(subscriber):
+            return [(event['type'], event['id']) for event in json.loads(subscriber.messages[0])]
+
+        self.assertEqual(received(zone), [('truck', 1)])
+        self.assertEqual(received(team), [('truck', 1), ('collection_point', 5)])
+        self.assertEqual(len(received(everyone)), 3)
+
+    def test_database_broker_stores_events_for_other_processes(self):
+        live.DatabaseBroker().publish_many([{'type': 'truck', 'id': 1}, {'type': 'truck', 'id': 2}])
+        self.assertEqual(sorted(event['id'] for event in LiveEvent.objects.values_list('payload', flat=True)), [1, 2])
@@ -0,0 +1,173 @@
+"""
+Historique compressé des positions des camions
+"""
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from .models import TruckPositionChunk
+
+COORDINATE_SCALE = 1_000_000  # micro-degrés
+# Morceaux d'un flux lus par appel dans le thread synchrone (ASGI)
+STREAM_BATCH_SIZE = 500
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _write_varint(buffer, value):
+    value = _zigzag(value)
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varints(data):
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield _unzigzag(value)
+            value = 0
+            shift = 0
+
+
+def to_millis(timestamp):
+    return int(timestamp.timestamp() * 1000)
+
+
+def from_millis(millis):
+    return datetime.fromtimestamp(millis / 1000, tz=dt_timezone.utc)
+
+
+def _append_to_chunk(chunk, buffer, timestamp, latitude, longitude):
+    millis = to_millis(timestamp)
+    lat = round(latitude * COORDINATE_SCALE)
+    lon = round(longitude * COORDINATE_SCALE)
+
+    _write_varint(buffer, millis - chunk.last_timestamp)
+    _write_varint(buffer, lat - chunk.last_latitude)
+    _write_varint(buffer, lon - chunk.last_longitude)
+
+    chunk.last_timestamp = millis
+    chunk.last_latitude = lat
+    chunk.last_longitude = lon
+    chunk.point_count += 1
+    if chunk.start_at is None or timestamp < chunk.start_at:
+        chunk.start_at = timestamp
+    if chunk.end_at is None or timestamp > chunk.end_at:
+        chunk.end_at = timestamp
+
+
+def decode_chunk(chunk):
+    """
+    Décoder un bloc en une suite de (timestamp, latitude, longitude)
+    """
+    millis = lat = lon = 0
+    values = _read_varints(bytes(chunk.data))
+    for d_millis, d_lat, d_lon in zip(values, values, values):
+        millis += d_millis
+        lat += d_lat
+        lon += d_lon
+        yield from_millis(millis), lat / COORDINATE_SCALE, lon / COORDINATE_SCALE
+
+
+def append_positions(points_by_truck):
+    """
+    Ajouter des positions à l'historique.
+    points_by_truck : {truck_id: [(timestamp, latitude, longitude), ...]}
+    Les blocs ouverts sont chargés en une requête puis écrits en lot.
+    """
+    groups = defaultdict(list)
+    for truck_id, points in points_by_truck.items():
+        for timestamp, latitude, longitude in points:
+            day = timestamp.astimezone(dt_timezone.utc).date()
+            groups[(truck_id, day)].append((timestamp, latitude, longitude))
+    if not groups:
+        return 0
+
+    truck_ids = {truck_id for truck_id, _ in groups}
+    days = {day for _, day in groups}
+
+    with transaction.atomic():
+        open_chunks = {}
+        queryset = TruckPositionChunk.objects.select_for_update().filter(
+            truck_id__in=truck_ids,
+            date__in=days,
+            point_count__lt=TruckPositionChunk.CHUNK_SIZE,
+        ).order_by('id')
+        for chunk in queryset:
+            open_chunks[(chunk.truck_id, chunk.date)] = chunk
+
+        buffers = {}
+        to_create = []
+        to_update = []
+        for (truck_id, day), points in groups.items():
+            points.sort(key=lambda point: point[0])
+            chunk = open_chunks.get((truck_id, day))
+            if chunk is not None:
+                to_update.append(chunk)
+                buffers[id(chunk)] = bytearray(bytes(chunk.data))
+
+            for timestamp, latitude, longitude in points:
+                if chunk is None or chunk.point_count >= TruckPositionChunk.CHUNK_SIZE:
+                    chunk = TruckPositionChunk(truck_id=truck_id, date=day)
+                    to_create.append(chunk)
+                    buffers[id(chunk)] = bytearray()
+                _append_to_chunk(chunk, buffers[id(chunk)], timestamp, latitude, longitude)
+
+        for chunk in to_create + to_update:
+            chunk.data = bytes(buffers[id(chunk)])
+
+        if to_create:
+            TruckPositionChunk.objects.bulk_create(to_create)
+        if to_update:
+            TruckPositionChunk.objects.bulk_update(to_update, [
+                'start_at', 'end_at', 'point_count', 'last_timestamp',
+                'last_latitude', 'last_longitude', 'data',
+            ])
+
+    return sum(len(points) for points in groups.values())
+
+
+def iter_track(truck_id, start, end):
+    """
+    Parcourir les positions d'un camion entre start et end, dans l'ordre
+    chronologique. Seuls les blocs chevauchant l'intervalle sont lus.
+    """
+    chunks = TruckPositionChunk.objects.filter(
+        truck_id=truck_id,
+        start_at__lte=end,
+        end_at__gte=start,
+    ).order_by('start_at', 'id').only('data')
+
+    for chunk in chunks.iterator(chunk_size=50):
+        points = sorted(decode_chunk(chunk), key=lambda point: point[0])
+        for point in points:
+            if start <= point[0] <= end:
+                yield point
+
+
+async def iterate_async(iterator, batch_size=STREAM_BATCH_SIZE):
+    """
+    Itérateur asynchrone sur un générateur synchrone qui lit la base (réponse
+    en flux sous ASGI) : les morceaux sont lus par lots dans le thread
+    synchrone de Django, sans bloquer la boucle.
+    """
+    while True:
+        batch = await sync_to_async(lambda: list(islice(iterator, batch_size)))()
+        if not batch:
+            return
+        yield ''.join(batch)
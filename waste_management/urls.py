@@ -17,12 +17,17 @@ router.register(r'incidents', views.IncidentViewSet)
 router.register(r'statistics', views.StatisticsViewSet)
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('team')
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
 
 router.register(r'users', UserViewSet, basename='user')
 
 urlpatterns = [
+    path('cache/stats/', views.cache_stats, name='cache-stats'),
+    path('sync/', views.sync, name='sync'),
+    path('field-updates/', views.field_updates, name='field-updates'),
+    path('oplog/', views.replay_oplog, name='oplog'),
+    path('live/', views.live_stream, name='live'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
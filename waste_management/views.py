@@ -1,9 +1,17 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated ,AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timezone as dt_timezone
+import json
 from .models import (
     Team, CollectionPoint, Truck, Report, Schedule, 
     ScheduleRoute, Incident, Statistics
@@ -12,11 +20,51 @@ from .serializers import (
     TeamSerializer, CollectionPointSerializer, TruckSerializer,
     ReportSerializer, ReportCreateSerializer, ScheduleSerializer,
     ScheduleCreateSerializer, ScheduleRouteSerializer, IncidentSerializer, IncidentCreateSerializer,
-    StatisticsSerializer
+    StatisticsSerializer, load_todays_routes
 )
+from .filters import SpatialFilterBackend
+from .geo import is_valid_position
+from .pagination import KeysetPagination
+from . import dispatch, eta, fieldwork, forecast, live, nearest, oplog, planner, telemetry, tracking
+from .aggregation import period_label
+from .routing import optimize_path
+from .cache import CachedResponseMixin, bump, get_response_cache
+from .conditional import ConditionalGetMixin
+from .sync import changes_since, SyncTokenError, DEFAULT_LIMIT, MAX_LIMIT
+
+User = get_user_model()
+
+# Recherche des camions les plus proches (GET /api/trucks/nearest/)
+NEAREST_DEFAULT_K = 3
+NEAREST_MAX_K = 50
+NEAREST_MAX_REPORTS = 1000
+
+def parse_clock(value, default):
+    """
+    Convertir une heure "HH:MM" en time (ValueError si invalide)
+    """
+    if not value:
+        return default
+    return datetime.strptime(str(value), '%H:%M').time()
+
+def parse_time_bound(value, default):
+    """
+    Convertir un paramètre de requête (date ou date-heure ISO 8601) en datetime
+    """
+    if not value:
+        return default
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
 
 class TeamViewSet(viewsets.ModelViewSet):
-    queryset = Team.objects.all()
+    queryset = Team.objects.select_related('leader').prefetch_related('user_set')
     serializer_class = TeamSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -48,12 +96,17 @@ class TeamViewSet(viewsets.ModelViewSet):
                 leader.team = team
                 leader.save()
 
-class CollectionPointViewSet(viewsets.ModelViewSet):
+class CollectionPointViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CollectionPoint.objects.all()
     serializer_class = CollectionPointSerializer
     permission_classes = [AllowAny]  # Public access for collection points
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['status', 'type']
+    filter_backends = [DjangoFilterBackend, SpatialFilterBackend]
+    filterset_fields = {
+        'status': ['exact'],
+        'type': ['exact'],
+        # ?next_collection__lte=<date> : points prévus pleins avant cette date
+        'next_collection': ['lte', 'gte'],
+    }
 
     def get_permissions(self):
         """
@@ -66,7 +119,16 @@ class CollectionPointViewSet(viewsets.ModelViewSet):
         else:
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
-    
+
+    def perform_create(self, serializer):
+        point = serializer.save()
+        forecast.observe([(point, point.status, timezone.now())])
+
+    def perform_update(self, serializer):
+        previous_status = serializer.instance.status
+        point = serializer.save()
+        if point.status != previous_status:
+            forecast.observe([(point, point.status, timezone.now())])
     
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
@@ -77,10 +139,14 @@ class CollectionPointViewSet(viewsets.ModelViewSet):
         new_status = request.data.get('status')
         
         if new_status in dict(CollectionPoint.STATUS_CHOICES):
+            now = timezone.now()
             collection_point.status = new_status
             if new_status == 'empty':
-                collection_point.last_collection = timezone.now()
+                collection_point.last_collection = now
             collection_point.save()
+            # Historique des statuts et nouvelle prévision de remplissage
+            forecast.observe([(collection_point, new_status, now)])
+            live.publish(live.collection_point_event(collection_point))
             
             serializer = self.get_serializer(collection_point)
             return Response({
@@ -94,12 +160,17 @@ class CollectionPointViewSet(viewsets.ModelViewSet):
             'message': 'Statut invalide'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-class TruckViewSet(viewsets.ModelViewSet):
-    queryset = Truck.objects.all()
+class TruckViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Truck.objects.select_related('driver')
     serializer_class = TruckSerializer
     permission_classes = [AllowAny]  # Public access for trucks
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status']
+    cache_models = (Truck, User, Schedule, ScheduleRoute, CollectionPoint)
+
+    def get_cache_key_extra(self):
+        # La route affichée est celle du jour
+        return timezone.now().date().isoformat()
 
     def get_permissions(self):
         """
@@ -113,6 +184,22 @@ class TruckViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def list(self, request, *args, **kwargs):
+        """
+        Lister les camions en préchargeant les routes du jour de toute la page
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        trucks = page if page is not None else list(queryset)
+
+        context = self.get_serializer_context()
+        context['todays_routes'] = load_todays_routes(trucks)
+        serializer = self.get_serializer(trucks, many=True, context=context)
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
     def create(self, request, *args, **kwargs):
         """
         Créer un nouveau camion
@@ -143,7 +230,16 @@ class TruckViewSet(viewsets.ModelViewSet):
         if 'latitude' in location and 'longitude' in location:
             truck.current_latitude = location['latitude']
             truck.current_longitude = location['longitude']
+            now = timezone.now()
+            truck.position_at = now
             truck.save()
+            tracking.append_positions({
+                truck.id: [(now, float(truck.current_latitude), float(truck.current_longitude))]
+            })
+            eta.speeds.observe(truck.id, now, float(truck.current_latitude), float(truck.current_longitude))
+            truck_eta = eta.refresh_etas([truck.id]).get(truck.id)
+            truck.estimated_time = truck_eta.minutes if truck_eta else None
+            live.publish(live.truck_event(truck))
             
             serializer = self.get_serializer(truck)
             return Response({
@@ -157,6 +253,141 @@ class TruckViewSet(viewsets.ModelViewSet):
             'message': 'Coordonnées invalides'
         }, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def telemetry(self, request):
+        """
+        Ingestion groupée des positions GPS
+        POST /api/trucks/telemetry/
+        Body: {"samples": [{"truck_id": 1, "latitude": 14.7, "longitude": -17.4, "timestamp": "..."}]}
+        """
+        samples = request.data.get('samples') if isinstance(request.data, dict) else request.data
+
+        try:
+            received, updated = telemetry.ingest(samples)
+        except telemetry.TelemetryError as exc:
+            return Response({
+                'success': False,
+                'message': str(exc)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'success': True,
+            'received': received,
+            'updated': updated
+        })
+
+    @action(detail=True, methods=['get'])
+    def track(self, request, pk=None):
+        """
+        Historique des positions d'un camion
+        GET /api/trucks/{id}/track/?from=2025-01-16T08:00:00Z&to=2025-01-16T12:00:00Z
+        """
+        truck = self.get_object()
+        try:
+            start = parse_time_bound(request.query_params.get('from'), default=timezone.now().replace(
+                hour=0, minute=0, second=0, microsecond=0))
+            end = parse_time_bound(request.query_params.get('to'), default=timezone.now())
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Intervalle invalide. Utilisez des dates ISO 8601.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        def stream():
+            yield '{"success":true,"truck_id":%d,"points":[' % truck.id
+            separator = ''
+            for timestamp, latitude, longitude in tracking.iter_track(truck.id, start, end):
+                yield separator + json.dumps({
+                    'timestamp': timestamp.isoformat(),
+                    'latitude': latitude,
+                    'longitude': longitude
+                })
+                separator = ','
+            yield ']}'
+
+        content = stream()
+        if isinstance(request._request, ASGIRequest):
+            content = tracking.iterate_async(content)
+        return StreamingHttpResponse(content, content_type='application/json')
+
+    @action(detail=True, methods=['get'])
+    def eta(self, request, pk=None):
+        """
+        Détail du temps estimé jusqu'au prochain point de collecte
+        GET /api/trucks/{id}/eta/
+        """
+        truck = self.get_object()
+        truck_eta = eta.compute_etas(
+            {truck.id: (truck.current_latitude, truck.current_longitude)}, {truck.id: truck.speed_kmh}
+        )[truck.id]
+        if truck_eta is None:
+            return Response({
+                'success': True,
+                'data': None,
+                'message': "Aucun point de collecte restant aujourd'hui"
+            })
+
+        return Response({
+            'success': True,
+            'data': truck_eta._asdict()
+        })
+
+    @action(detail=False, methods=['get'], url_path='nearest')
+    def nearest_trucks(self, request):
+        """
+        Camions disponibles les plus proches, du plus proche au plus éloigné
+        GET /api/trucks/nearest/?latitude=14.7&longitude=-17.4&k=3
+        GET /api/trucks/nearest/?report=12 (position d'un signalement)
+        GET /api/trucks/nearest/?reports=12,13,14&k=1 (plusieurs signalements en un appel)
+        """
+        params = request.query_params
+        try:
+            k = max(1, min(int(params.get('k', NEAREST_DEFAULT_K)), NEAREST_MAX_K))
+            report_ids = [
+                int(value) for value in (params.get('reports') or params.get('report') or '').split(',') if value
+            ]
+            if not report_ids:
+                positions = {None: (float(params['latitude']), float(params['longitude']))}
+                if not is_valid_position(*positions[None]):
+                    raise ValueError(positions[None])
+        except (KeyError, ValueError):
+            return Response({
+                'success': False,
+                'message': 'latitude et longitude, report ou reports requis'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(report_ids) > NEAREST_MAX_REPORTS:
+            return Response({
+                'success': False,
+                'message': f'Au plus {NEAREST_MAX_REPORTS} signalements par requête'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if report_ids:
+            positions = {
+                report_id: (latitude, longitude) for report_id, latitude, longitude in
+                Report.objects.filter(id__in=report_ids).values_list('id', 'latitude', 'longitude')
+            }
+            if 'reports' not in params and not positions:
+                return Response({
+                    'success': False,
+                    'message': 'Signalement introuvable'
+                }, status=status.HTTP_404_NOT_FOUND)
+
+        found = [key for key in dict.fromkeys(report_ids or [None]) if key in positions]
+        matches = nearest.index.nearest(
+            [positions[key][0] for key in found], [positions[key][1] for key in found], k
+        )
+        if 'reports' in params:
+            data = [
+                {'report': report_id, 'trucks': [neighbor._asdict() for neighbor in neighbors]}
+                for report_id, neighbors in zip(found, matches)
+            ]
+        else:
+            data = [neighbor._asdict() for neighbor in matches[0]]
+        return Response({
+            'success': True,
+            'data': data
+        })
+
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         """
@@ -167,7 +398,9 @@ class TruckViewSet(viewsets.ModelViewSet):
         
         if new_status in dict(Truck.STATUS_CHOICES):
             truck.status = new_status
+            truck.status_changed_at = timezone.now()
             truck.save()
+            live.publish(live.truck_event(truck))
             
             serializer = self.get_serializer(truck)
             return Response({
@@ -185,6 +418,7 @@ class TruckViewSet(viewsets.ModelViewSet):
     def update_estimated_time(self, request, pk=None):
         """
         Mettre à jour le temps estimé pour atteindre le prochain point de collecte
+        (valeur manuelle, recalculée automatiquement à la prochaine position)
         PATCH /api/trucks/{id}/estimated-time/
         Body: {"estimated_time": 15}
         """
@@ -202,6 +436,7 @@ class TruckViewSet(viewsets.ModelViewSet):
                 
                 truck.estimated_time = estimated_time
                 truck.save()
+                live.publish(live.truck_event(truck))
                 
                 serializer = self.get_serializer(truck)
                 return Response({
@@ -220,11 +455,20 @@ class TruckViewSet(viewsets.ModelViewSet):
             'message': 'Le champ estimated_time est requis'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-class ReportViewSet(viewsets.ModelViewSet):
-    queryset = Report.objects.all().order_by('-created_at')
+class ReportViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Report.objects.all().order_by('-created_at', '-id')
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['status', 'priority', 'type', 'reporter_type']
+    filterset_fields = {
+        'status': ['exact'],
+        'priority': ['exact'],
+        'type': ['exact'],
+        'reporter_type': ['exact'],
+        # ?duplicate_of__isnull=true : uniquement les signalements principaux
+        'duplicate_of': ['exact', 'isnull'],
+    }
     def get_permissions(self):
         """
         Permissions spécifiques par action:
@@ -249,7 +493,19 @@ class ReportViewSet(viewsets.ModelViewSet):
         print("Creating report with data:", request.data)
         if serializer.is_valid():
             report = serializer.save()
+            if report.type == 'overflow' and report.collection_point_id and not report.duplicate_of_id:
+                forecast.observe_report(report)
             response_serializer = ReportSerializer(report)
+            if report.duplicate_of_id:
+                return Response({
+                    'success': True,
+                    'data': response_serializer.data,
+                    'cluster': {
+                        'id': report.duplicate_of_id,
+                        'count': report.cluster_count
+                    },
+                    'message': 'Signalement rattaché à un signalement existant'
+                }, status=status.HTTP_201_CREATED)
             return Response({
                 'success': True,
                 'data': response_serializer.data,
@@ -265,13 +521,34 @@ class ReportViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['patch'])
     def assign(self, request, pk=None):
         """
-        Assigner un signalement à une équipe
+        Assigner un signalement à une équipe : `team` (id), `assigned_to`
+        (texte libre) ou `auto: true` (meilleure équipe selon le dispatch)
         """
         report = self.get_object()
         assigned_to = request.data.get('assigned_to')
-        
-        if assigned_to:
-            report.assigned_to = assigned_to
+        team_id = request.data.get('team')
+        team = None
+
+        if request.data.get('auto') in (True, 'true', '1'):
+            suggestions = dispatch.suggest(report, limit=1)
+            if not suggestions:
+                return Response({
+                    'success': False,
+                    'message': 'Aucune équipe active disponible'
+                }, status=status.HTTP_409_CONFLICT)
+            team = Team.objects.get(id=suggestions[0].team_id)
+        elif team_id:
+            try:
+                team = Team.objects.get(id=team_id)
+            except (Team.DoesNotExist, ValueError, TypeError):
+                return Response({
+                    'success': False,
+                    'message': 'Équipe introuvable'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        if team is not None or assigned_to:
+            report.assigned_team = team
+            report.assigned_to = team.name if team is not None else assigned_to
             report.status = 'in_progress'
             report.save()
             
@@ -286,6 +563,54 @@ class ReportViewSet(viewsets.ModelViewSet):
             'success': False,
             'message': 'Équipe non spécifiée'
         }, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'])
+    def suggestions(self, request, pk=None):
+        """
+        Équipes classées par score (spécialisation, distance, charge) pour ce signalement
+        """
+        report = self.get_object()
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 5)), 50))
+        except ValueError:
+            limit = 5
+        return Response({
+            'success': True,
+            'data': [suggestion._asdict() for suggestion in dispatch.suggest(report, limit=limit)],
+            'message': 'Suggestions d\'équipes calculées'
+        })
+
+    @action(detail=False, methods=['post'], url_path='dispatch')
+    def dispatch_backlog(self, request):
+        """
+        Affecter en une passe tous les signalements en attente sans équipe
+        (`limit` optionnel, `dry_run: true` pour simuler)
+        """
+        limit = request.data.get('limit')
+        try:
+            limit = int(limit) if limit is not None else None
+        except (TypeError, ValueError):
+            limit = -1
+        if limit is not None and limit < 0:
+            return Response({
+                'success': False,
+                'message': 'Le paramètre limit doit être un entier positif ou nul'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = request.data.get('dry_run') in (True, 'true', '1')
+
+        assignments = dispatch.assign_backlog(limit=limit, dry_run=dry_run)
+        return Response({
+            'success': True,
+            'data': {
+                'assigned': len(assignments),
+                'dry_run': dry_run,
+                'assignments': [
+                    {'report': report_id, 'team': team.team_id, 'score': team.score}
+                    for report_id, team in assignments
+                ],
+            },
+            'message': f'{len(assignments)} signalements affectés'
+        })
     
     @action(detail=True, methods=['patch'])
     def resolve(self, request, pk=None):
@@ -294,6 +619,7 @@ class ReportViewSet(viewsets.ModelViewSet):
         """
         report = self.get_object()
         report.status = 'resolved'
+        report.resolved_at = timezone.now()
         report.save()
         
         serializer = self.get_serializer(report)
@@ -303,11 +629,16 @@ class ReportViewSet(viewsets.ModelViewSet):
             'message': 'Signalement marqué comme résolu'
         })
 
-class ScheduleViewSet(viewsets.ModelViewSet):
-    queryset = Schedule.objects.all().order_by('-date', '-start_time')
+class ScheduleViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Schedule.objects.select_related('team', 'truck').prefetch_related(
+        Prefetch('route_points', queryset=ScheduleRoute.objects.select_related('collection_point'))
+    ).order_by('-date', '-start_time', '-id')
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date', '-start_time', '-id')
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'team', 'date']
+    cache_models = (Schedule, ScheduleRoute, CollectionPoint, Team, Truck)
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -343,6 +674,127 @@ class ScheduleViewSet(viewsets.ModelViewSet):
             'message': 'Erreur lors de la création du planning'
         }, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Créer plusieurs plannings en une seule requête
+        POST /api/schedules/bulk/
+        Body: {"schedules": [{"team": 1, "truck": 1, "date": "2025-01-16", "start_time": "08:00",
+               "estimated_end_time": "12:00", "route": ["1", "2"]}, ...]}
+        ou directement la liste des plannings
+        """
+        data = request.data.get('schedules', []) if isinstance(request.data, dict) else request.data
+        serializer = ScheduleCreateSerializer(data=data, many=True)
+        if serializer.is_valid():
+            schedules = serializer.save()
+            return Response({
+                'success': True,
+                'data': {
+                    'created': len(schedules),
+                    'ids': [schedule.id for schedule in schedules]
+                },
+                'message': 'Plannings créés avec succès'
+            }, status=status.HTTP_201_CREATED)
+
+        return Response({
+            'success': False,
+            'errors': serializer.errors,
+            'message': 'Erreur lors de la création des plannings'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def plan(self, request):
+        """
+        Générer les plannings d'une journée à partir des points à collecter
+        POST /api/schedules/plan/
+        Body: {"date": "2025-01-16", "start_time": "07:00", "end_time": "15:00", "dry_run": false}
+        """
+        try:
+            day = parse_date(str(request.data['date'])) if request.data.get('date') else timezone.now().date()
+            start_time = parse_clock(request.data.get('start_time'), planner.DEFAULT_START_TIME)
+            end_time = parse_clock(request.data.get('end_time'), planner.DEFAULT_END_TIME)
+        except ValueError:
+            day = start_time = end_time = None
+        if day is None or start_time is None or end_time is None or start_time >= end_time:
+            return Response({
+                'success': False,
+                'message': 'Date ou plage horaire invalide'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        plan = planner.plan_day(day, start_time, end_time)
+        dry_run = request.data.get('dry_run') in (True, 'true', '1')
+        ids = []
+        if not dry_run and plan.routes:
+            ids = [schedule.id for schedule in planner.save_plan(plan)]
+            if day == timezone.now().date():
+                eta.refresh_etas([route.truck_id for route in plan.routes])
+
+        return Response({
+            'success': True,
+            'data': {
+                'date': day.isoformat(),
+                'dry_run': dry_run,
+                'due': plan.due,
+                'planned': sum(len(route.point_ids) for route in plan.routes),
+                'unplanned': plan.unplanned,
+                'schedules': [
+                    {
+                        'id': ids[index] if ids else None,
+                        'truck': route.truck_id,
+                        'team': route.team_id,
+                        'start_time': route.start_time.strftime('%H:%M'),
+                        'estimated_end_time': route.estimated_end_time.strftime('%H:%M'),
+                        'route': route.point_ids,
+                        'distance_km': route.distance_km,
+                        'load': route.load,
+                    }
+                    for index, route in enumerate(plan.routes)
+                ],
+            },
+            'message': f'{len(plan.routes)} plannings générés'
+        }, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['patch'])
+    def optimize(self, request, pk=None):
+        """
+        Optimiser l'ordre des points de route restants depuis la position du camion
+        """
+        schedule = self.get_object()
+        route_points = list(schedule.route_points.all())
+        completed = [point for point in route_points if point.completed]
+        remaining = [point for point in route_points if not point.completed]
+
+        truck = schedule.truck
+        start = None
+        if truck.current_latitude or truck.current_longitude:
+            start = (truck.current_latitude, truck.current_longitude)
+
+        order, distance_before, distance_after = optimize_path(start, [
+            (point.collection_point.latitude, point.collection_point.longitude)
+            for point in remaining
+        ])
+
+        # Les points déjà collectés gardent leur place en tête de tournée
+        now = timezone.now()
+        for index, point in enumerate(completed + [remaining[i] for i in order], start=1):
+            point.order = index
+            point.updated_at = now
+        ScheduleRoute.objects.bulk_update(route_points, ['order', 'updated_at'])
+        bump(ScheduleRoute)
+        eta.refresh_etas([schedule.truck_id])
+
+        serializer = self.get_serializer(self.get_object())
+        return Response({
+            'success': True,
+            'data': serializer.data,
+            'optimization': {
+                'distance_before_km': round(distance_before, 3),
+                'distance_after_km': round(distance_after, 3),
+                'distance_saved_km': round(distance_before - distance_after, 3)
+            },
+            'message': 'Tournée optimisée'
+        })
+
     @action(detail=True, methods=['patch'])
     def start(self, request, pk=None):
         """
@@ -351,6 +803,7 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         schedule = self.get_object()
         schedule.status = 'in_progress'
         schedule.save()
+        eta.refresh_etas([schedule.truck_id])
         
         serializer = self.get_serializer(schedule)
         return Response({
@@ -367,6 +820,7 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         schedule = self.get_object()
         schedule.status = 'completed'
         schedule.save()
+        eta.refresh_etas([schedule.truck_id])
         
         serializer = self.get_serializer(schedule)
         return Response({
@@ -375,9 +829,11 @@ class ScheduleViewSet(viewsets.ModelViewSet):
             'message': 'Planning terminé'
         })
 
-class IncidentViewSet(viewsets.ModelViewSet):
-    queryset = Incident.objects.all().order_by('-created_at')
+class IncidentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Incident.objects.all().order_by('-created_at', '-id')
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'severity', 'type']
     
@@ -422,7 +878,7 @@ class IncidentViewSet(viewsets.ModelViewSet):
         })
 
 class StatisticsViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Statistics.objects.all().order_by('-created_at')
+    queryset = Statistics.objects.all().order_by('-period')
     serializer_class = StatisticsSerializer
     permission_classes = [IsAuthenticated]
     
@@ -444,36 +900,27 @@ class StatisticsViewSet(viewsets.ReadOnlyModelViewSet):
             except Statistics.DoesNotExist:
                 pass
         
-        # Retourner les statistiques les plus récentes
-        latest_stats = self.queryset.first()
-        if latest_stats:
-            serializer = self.get_serializer(latest_stats)
+        # Retourner les statistiques du mois le plus récent (hors mois futurs déjà planifiés)
+        latest_stats = self.get_queryset().filter(period__lte=period_label(timezone.now())).first()
+        if latest_stats is None:
+            # Lecture seule : le calcul est fait par python manage.py compute_statistics
             return Response({
                 'success': True,
-                'data': serializer.data
+                'data': None,
+                'message': 'Aucune statistique calculée pour le moment'
             })
-        
-        # Retourner des statistiques par défaut si aucune n'existe
-        default_stats = {
-            'period': 'Janvier 2025',
-            'total_collections': 1247,
-            'total_waste': 8435,
-            'recycling_rate': 67.8,
-            'efficiency': 89.2,
-            'reports_resolved': 156,
-            'average_response_time': 4.2
-        }
-        
+
+        serializer = self.get_serializer(latest_stats)
         return Response({
             'success': True,
-            'data': default_stats
+            'data': serializer.data
         })
 
 class ScheduleRouteViewSet(viewsets.ModelViewSet):
     """
     ViewSet pour gérer les points de route des plannings
     """
-    queryset = ScheduleRoute.objects.all()
+    queryset = ScheduleRoute.objects.select_related('collection_point')
     serializer_class = ScheduleRouteSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -487,7 +934,9 @@ class ScheduleRouteViewSet(viewsets.ModelViewSet):
         route_point = self.get_object()
         route_point.completed = True
         route_point.completed_at = timezone.now()
+        route_point.completion_changed_at = route_point.completed_at
         route_point.save()
+        eta.refresh_etas([route_point.schedule.truck_id])
         
         serializer = self.get_serializer(route_point)
         return Response({
@@ -503,10 +952,164 @@ class ScheduleRouteViewSet(viewsets.ModelViewSet):
         route_point = self.get_object()
         route_point.completed = False
         route_point.completed_at = None
+        route_point.completion_changed_at = timezone.now()
         route_point.save()
+        eta.refresh_etas([route_point.schedule.truck_id])
         
         serializer = self.get_serializer(route_point)
         return Response({
             'success': True,
             'data': serializer.data
-        })
\ No newline at end of file
+        })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cache_stats(request):
+    """
+    Taux de succès du cache de réponses, global et par endpoint
+    GET /api/cache/stats/
+    """
+    return Response({
+        'success': True,
+        'data': get_response_cache().metrics(),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync(request):
+    """
+    Changements depuis le dernier jeton (points de collecte, plannings,
+    points de route, camions, incidents), suppressions comprises
+    GET /api/sync/?since=<jeton>&limit=500
+    """
+    try:
+        limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    try:
+        data = changes_since(request.query_params.get('since') or None, limit)
+    except SyncTokenError as exc:
+        return Response({
+            'success': False,
+            'message': str(exc)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'success': True,
+        'data': data,
+    })
+
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def field_updates(request):
+    """
+    Arrêts complétés et statuts des points de collecte en une requête
+    POST /api/field-updates/
+    Body: {"stops": [{"id": 12, "completed": true, "at": "..."}],
+           "points": [{"id": 5, "status": "full", "at": "..."}]}
+    Un code par élément, dans l'ordre reçu : ok, not_found, invalid, stale.
+    """
+    payload = request.data if isinstance(request.data, dict) else {}
+    try:
+        data = fieldwork.apply_updates(payload.get('stops', []), payload.get('points', []))
+    except fieldwork.FieldworkError as exc:
+        return Response({
+            'success': False,
+            'message': str(exc)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'success': True,
+        'data': data,
+        'message': 'Mises à jour enregistrées'
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def replay_oplog(request):
+    """
+    Journal d'opérations d'un appareil resté hors ligne, rejoué par date
+    POST /api/oplog/
+    Body: {"operations": [{"id": "<uuid client>", "op": "schedule-routes.mark_completed",
+           "object": 12, "timestamp": "...", "data": {}}, ...]}
+    Un code par opération, dans l'ordre reçu : ok, duplicate, stale, not_found, invalid.
+    """
+    operations = request.data.get('operations') if isinstance(request.data, dict) else request.data
+
+    try:
+        data = oplog.replay(operations)
+    except oplog.OplogConflict as exc:
+        return Response({
+            'success': False,
+            'message': str(exc)
+        }, status=status.HTTP_409_CONFLICT)
+    except oplog.OplogError as exc:
+        return Response({
+            'success': False,
+            'message': str(exc)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'success': True,
+        'data': data,
+        'message': 'Journal appliqué'
+    })
+
+async def live_stream(request):
+    """
+    Flux Server-Sent Events des positions de camions et statuts des points de collecte
+    GET /api/live/ (tout), ?bbox=min_lat,min_lon,max_lat,max_lon (zone) ou ?team=<id> (équipe)
+    Chaque événement 'update' contient la liste des objets modifiés depuis le tick précédent.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'success': False,
+            'message': 'Flux disponible uniquement via le serveur ASGI (dechets_ko.asgi)'
+        }, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    bbox = request.GET.get('bbox')
+    team = request.GET.get('team')
+    if bbox and team:
+        return JsonResponse({
+            'success': False,
+            'message': "Choisir une zone (bbox) ou une équipe (team), pas les deux"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    subscriber_kwargs = {}
+    if bbox:
+        try:
+            min_lat, min_lon, max_lat, max_lon = [float(part) for part in bbox.split(',')]
+        except ValueError:
+            min_lat = max_lat = min_lon = max_lon = None
+        if min_lat is None or min_lat > max_lat or min_lon > max_lon:
+            return JsonResponse({
+                'success': False,
+                'message': 'Boîte englobante invalide'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        subscriber_kwargs['bbox'] = (min_lat, min_lon, max_lat, max_lon)
+    elif team:
+        if not team.isdigit():
+            return JsonResponse({
+                'success': False,
+                'message': 'Équipe invalide'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        subscriber_kwargs['team_id'] = int(team)
+        subscriber_kwargs['point_ids'] = await sync_to_async(list)(
+            ScheduleRoute.objects.filter(
+                schedule__team_id=int(team), schedule__date=timezone.now().date()
+            ).values_list('collection_point_id', flat=True)
+        )
+
+    response = StreamingHttpResponse(
+        live.stream(live.Subscriber(**subscriber_kwargs)), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response